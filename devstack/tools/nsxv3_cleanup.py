@@ -14,13 +14,18 @@
 #    under the License.
 
 import base64
+import logging
 import optparse
+
+import eventlet
+eventlet.monkey_patch()
 import requests
 import sqlalchemy as sa
 
 from oslo_serialization import jsonutils
 import six.moves.urllib.parse as urlparse
 from vmware_nsx.db import nsx_models
+from vmware_nsx.shell import cleanup_engine
 
 
 requests.packages.urllib3.disable_warnings()
@@ -65,7 +70,8 @@ class NSXClient(object):
     API_VERSION = "v1"
     NULL_CURSOR_PREFIX = '0000'
 
-    def __init__(self, host, username, password, db_connection):
+    def __init__(self, host, username, password, db_connection,
+                 threads=cleanup_engine.DEFAULT_THREADS):
         self.host = host
         self.username = username
         self.password = password
@@ -81,6 +87,10 @@ class NSXClient(object):
         self.api_version = NSXClient.API_VERSION
         self.neutron_db = (NeutronNsxDB(db_connection)
                            if db_connection else None)
+        self.threads = threads
+        # A single keep-alive session is shared by all the requests
+        self.session = cleanup_engine.get_session(threads)
+        self.engine = cleanup_engine.CleanupEngine(threads)
 
         self.__set_headers()
 
@@ -115,6 +125,8 @@ class NSXClient(object):
         endpoint = self.endpoint if endpoint is None else endpoint
         http_type = 'https' if secure else 'http'
         self.url = '%s://%s/api/%s%s' % (http_type, host, api, endpoint)
+        # Return the url as well, as requests may run concurrently
+        return self.url
 
     def get_url(self):
         return self.url
@@ -123,7 +135,7 @@ class NSXClient(object):
         content_type = self.content_type if content is None else content
         accept_type = self.accept_type if accept is None else accept
         auth_cred = self.username + ":" + self.password
-        auth = base64.b64encode(auth_cred)
+        auth = base64.b64encode(auth_cred.encode('utf-8')).decode('utf-8')
         headers = {}
         headers['Authorization'] = "Basic %s" % auth
         headers['Content-Type'] = content_type
@@ -137,8 +149,8 @@ class NSXClient(object):
         """
         Basic query method for json API request
         """
-        self.__set_url(endpoint=endpoint)
-        response = requests.get(self.url, headers=self.headers,
+        url = self.__set_url(endpoint=endpoint)
+        response = self.session.get(url, headers=self.headers,
                                 verify=self.verify, params=params)
         return response
 
@@ -146,20 +158,21 @@ class NSXClient(object):
         """
         Query method for json API get for list (takes care of pagination)
         """
-        self.__set_url(endpoint=endpoint)
-        response = requests.get(self.url, headers=self.headers,
-                                verify=self.verify, params=params).json()
+        url = self.__set_url(endpoint=endpoint)
+        response = self.session.get(url, headers=self.headers,
+                                    verify=self.verify, params=params).json()
         results = response['results']
         missing = response['result_count'] - len(results)
         cursor = response.get('cursor', self.NULL_CURSOR_PREFIX)
 
-        op = '&' if urlparse.urlparse(self.url).query else '?'
-        url = self.url + op + 'cursor='
+        op = '&' if urlparse.urlparse(url).query else '?'
+        url = url + op + 'cursor='
 
         # we will enter the loop if response does not fit into single page
         while missing > 0 and not cursor.startswith(self.NULL_CURSOR_PREFIX):
-            response = requests.get(url + cursor, headers=self.headers,
-                                verify=self.verify, params=params).json()
+            response = self.session.get(
+                url + cursor, headers=self.headers,
+                verify=self.verify, params=params).json()
             cursor = response['cursor']
             missing -= len(response['results'])
             results += response['results']
@@ -170,17 +183,18 @@ class NSXClient(object):
         """
         Basic put API method on endpoint
         """
-        self.__set_url(endpoint=endpoint)
-        response = requests.put(self.url, headers=self.headers,
-                                verify=self.verify, data=jsonutils.dumps(body))
+        url = self.__set_url(endpoint=endpoint)
+        response = self.session.put(url, headers=self.headers,
+                                    verify=self.verify,
+                                    data=jsonutils.dumps(body))
         return response
 
     def delete(self, endpoint=None, params=None):
         """
         Basic delete API method on endpoint
         """
-        self.__set_url(endpoint=endpoint)
-        response = requests.delete(self.url, headers=self.headers,
+        url = self.__set_url(endpoint=endpoint)
+        response = self.session.delete(url, headers=self.headers,
                                    verify=self.verify, params=params)
         return response
 
@@ -188,10 +202,10 @@ class NSXClient(object):
         """
         Basic post API method on endpoint
         """
-        self.__set_url(endpoint=endpoint)
-        response = requests.post(self.url, headers=self.headers,
-                                 verify=self.verify,
-                                 data=jsonutils.dumps(body))
+        url = self.__set_url(endpoint=endpoint)
+        response = self.session.post(url, headers=self.headers,
+                                     verify=self.verify,
+                                     data=jsonutils.dumps(body))
         return response
 
     def get_transport_zones(self):
@@ -217,34 +231,42 @@ class NSXClient(object):
             lports = [lp for lp in lports if lp['id'] in db_lports]
         return lports
 
+    def _detach_logical_port(self, lport):
+        lport['attachment'] = None
+        endpoint = "/logical-ports/%s" % lport['id']
+        response = self.put(endpoint=endpoint, body=lport)
+        if response.status_code != requests.codes.ok:
+            print("ERROR: Failed to update lport %s" % lport['id'])
+            return False
+        return True
+
     def update_logical_port_attachment(self, lports):
         """
         In order to delete logical ports, we need to detach
         the VIF attachment on the ports first.
         """
         for p in lports:
-            p['attachment'] = None
-            endpoint = "/logical-ports/%s" % p['id']
-            response = self.put(endpoint=endpoint, body=p)
-            if response.status_code != requests.codes.ok:
-                print("ERROR: Failed to update lport %s" % p['id'])
+            self._detach_logical_port(p)
+
+    def delete_logical_port(self, lport):
+        """
+        Detach the VIF attachment of a logical port and delete it
+        """
+        self._detach_logical_port(lport)
+        endpoint = '/logical-ports/%s' % lport['id']
+        response = self.delete(endpoint=endpoint)
+        if response.status_code != requests.codes.ok:
+            print("ERROR: Failed to delete lport %s, response code %s" %
+                  (lport['id'], response.status_code))
+            return False
+        return True
 
     def cleanup_os_logical_ports(self):
         """
         Delete all logical ports created by OpenStack
         """
-        os_lports = self.get_os_logical_ports()
-        print("Number of OS Logical Ports to be deleted: %s" % len(os_lports))
-        # logical port vif detachment
-        self.update_logical_port_attachment(os_lports)
-        for p in os_lports:
-            endpoint = '/logical-ports/%s' % p['id']
-            response = self.delete(endpoint=endpoint)
-            if response.status_code == requests.codes.ok:
-                print("Successfully deleted logical port %s" % p['id'])
-            else:
-                print("ERROR: Failed to delete lport %s, response code %s" %
-                      (p['id'], response.status_code))
+        self.engine.run([[('OS Logical Ports', self.get_os_logical_ports,
+                           self.delete_logical_port)]])
 
     def get_os_resources(self, resources):
         """
@@ -281,22 +303,22 @@ class NSXClient(object):
         lports = self.get_logical_ports()
         return [p for p in lports if p['logical_switch_id'] is ls_id]
 
+    def delete_logical_switch(self, ls):
+        endpoint = '/logical-switches/%s' % ls['id']
+        response = self.delete(endpoint=endpoint)
+        if response.status_code != requests.codes.ok:
+            print("Failed to delete lswitch %s-%s, and response is %s" %
+                  (ls['display_name'], ls['id'], response.status_code))
+            return False
+        return True
+
     def cleanup_os_logical_switches(self):
         """
         Delete all logical switches created from OpenStack
         """
-        lswitches = self.get_os_logical_switches()
-        print("Number of OS Logical Switches to be deleted: %s" %
-              len(lswitches))
-        for ls in lswitches:
-            endpoint = '/logical-switches/%s' % ls['id']
-            response = self.delete(endpoint=endpoint)
-            if response.status_code == requests.codes.ok:
-                print("Successfully deleted logical switch %s-%s" %
-                      (ls['display_name'], ls['id']))
-            else:
-                print("Failed to delete lswitch %s-%s, and response is %s" %
-                      (ls['display_name'], ls['id'], response.status_code))
+        self.engine.run([[('OS Logical Switches',
+                           self.get_os_logical_switches,
+                           self.delete_logical_switch)]])
 
     def get_firewall_sections(self):
         """
@@ -316,22 +338,22 @@ class NSXClient(object):
                            if fws['id'] in db_sections]
         return fw_sections
 
+    def delete_firewall_section(self, fw):
+        endpoint = "/firewall/sections/%s?cascade=true" % fw['id']
+        response = self.delete(endpoint=endpoint)
+        if response.status_code != requests.codes.ok:
+            print("Failed to delete firewall section %s" %
+                  fw['display_name'])
+            return False
+        return True
+
     def cleanup_os_firewall_sections(self):
         """
         Cleanup all firewall sections created from OpenStack
         """
-        fw_sections = self.get_os_firewall_sections()
-        print("Number of OS Firewall Sections to be deleted: %s" %
-              len(fw_sections))
-        for fw in fw_sections:
-            endpoint = "/firewall/sections/%s?cascade=true" % fw['id']
-            response = self.delete(endpoint=endpoint)
-            if response.status_code == requests.codes.ok:
-                print("Successfully deleted firewall section %s" %
-                      fw['display_name'])
-            else:
-                print("Failed to delete firewall section %s" %
-                      fw['display_name'])
+        self.engine.run([[('OS Firewall Sections',
+                           self.get_os_firewall_sections,
+                           self.delete_firewall_section)]])
 
     def get_ns_groups(self):
         """
@@ -345,19 +367,20 @@ class NSXClient(object):
                          if nsg['id'] in db_nsgroups]
         return ns_groups
 
+    def delete_ns_group(self, nsg):
+        endpoint = "/ns-groups/%s?force=true" % nsg['id']
+        response = self.delete(endpoint=endpoint)
+        if response.status_code != requests.codes.ok:
+            print("Failed to delete NSGroup: %s" % nsg['display_name'])
+            return False
+        return True
+
     def cleanup_os_ns_groups(self):
         """
         Cleanup all NSGroups created from OpenStack plugin
         """
-        ns_groups = self.get_ns_groups()
-        print("Number of OS NSGroups to be deleted: %s" % len(ns_groups))
-        for nsg in ns_groups:
-            endpoint = "/ns-groups/%s?force=true" % nsg['id']
-            response = self.delete(endpoint=endpoint)
-            if response.status_code == requests.codes.ok:
-                print("Successfully deleted NSGroup: %s" % nsg['display_name'])
-            else:
-                print("Failed to delete NSGroup: %s" % nsg['display_name'])
+        self.engine.run([[('OS NSGroups', self.get_ns_groups,
+                           self.delete_ns_group)]])
 
     def get_switching_profiles(self):
         """
@@ -375,22 +398,22 @@ class NSXClient(object):
             sw_profiles = []
         return sw_profiles
 
+    def delete_switching_profile(self, swp):
+        endpoint = "/switching-profiles/%s" % swp['id']
+        response = self.delete(endpoint=endpoint)
+        if response.status_code != requests.codes.ok:
+            print("Failed to delete Switching Profile: %s" %
+                  swp['display_name'])
+            return False
+        return True
+
     def cleanup_os_switching_profiles(self):
         """
         Cleanup all Switching Profiles created from OpenStack plugin
         """
-        sw_profiles = self.get_os_switching_profiles()
-        print("Number of OS SwitchingProfiles to be deleted: %s" %
-              len(sw_profiles))
-        for swp in sw_profiles:
-            endpoint = "/switching-profiles/%s" % swp['id']
-            response = self.delete(endpoint=endpoint)
-            if response.status_code == requests.codes.ok:
-                print("Successfully deleted Switching Profile: %s" %
-                      swp['display_name'])
-            else:
-                print("Failed to delete Switching Profile: %s" %
-                      swp['display_name'])
+        self.engine.run([[('OS SwitchingProfiles',
+                           self.get_os_switching_profiles,
+                           self.delete_switching_profile)]])
 
     def get_logical_routers(self, tier=None):
         """
@@ -430,20 +453,41 @@ class NSXClient(object):
         lports = self.get_logical_router_ports(lrouter)
         return self.get_os_resources(lports)
 
+    def get_os_routers_ports(self, lrouters):
+        """
+        Retrieve the logical router ports created from Neutron NSXv3 plugin
+        on all the given logical routers
+        """
+        pool = eventlet.GreenPool(self.threads)
+        return [lp for lports in pool.imap(self.get_os_logical_router_ports,
+                                           lrouters)
+                for lp in lports]
+
+    def delete_logical_router_port(self, lp):
+        endpoint = "/logical-router-ports/%s" % lp['id']
+        response = self.delete(endpoint=endpoint)
+        if response.status_code != requests.codes.ok:
+            print("Failed to delete lr port %s-%s, and response is %s" %
+                  (lp['display_name'], lp['id'], response))
+            return False
+        return True
+
     def cleanup_logical_router_ports(self, lrouter):
         """
         Cleanup all logical ports on a logical router
         """
-        lports = self.get_os_logical_router_ports(lrouter)
-        for lp in lports:
-            endpoint = "/logical-router-ports/%s" % lp['id']
-            response = self.delete(endpoint=endpoint)
-            if response.status_code == requests.codes.ok:
-                print("Successfully deleted logical router port %s-%s" %
-                      (lp['display_name'], lp['id']))
-            else:
-                print("Failed to delete lr port %s-%s, and response is %s" %
-                      (lp['display_name'], lp['id'], response))
+        self.engine.run([[('OS Logical Router Ports',
+                           lambda: self.get_os_logical_router_ports(lrouter),
+                           self.delete_logical_router_port)]])
+
+    def delete_logical_router(self, lr):
+        endpoint = "/logical-routers/%s" % lr['id']
+        response = self.delete(endpoint=endpoint)
+        if response.status_code != requests.codes.ok:
+            print("Failed to delete lrouter %s-%s, and response is %s" %
+                  (lr['display_name'], lr['id'], response))
+            return False
+        return True
 
     def cleanup_os_logical_routers(self):
         """
@@ -451,27 +495,22 @@ class NSXClient(object):
         To delete a logical router, we need to delete all logical
         ports on the router first.
         """
-        lrouters = self.get_os_logical_routers()
-        print("Number of OS Logical Routers to be deleted: %s" %
-              len(lrouters))
-        for lr in lrouters:
-            self.cleanup_logical_router_ports(lr)
-            endpoint = "/logical-routers/%s" % lr['id']
-            response = self.delete(endpoint=endpoint)
-            if response.status_code == requests.codes.ok:
-                print("Successfully deleted logical router %s-%s" %
-                      (lr['display_name'], lr['id']))
-            else:
-                print("Failed to delete lrouter %s-%s, and response is %s" %
-                      (lr['display_name'], lr['id'], response))
+        self.engine.run([
+            [('OS Logical Router Ports',
+              lambda: self.get_os_routers_ports(
+                  self.get_os_logical_routers()),
+              self.delete_logical_router_port)],
+            [('OS Logical Routers', self.get_os_logical_routers,
+              self.delete_logical_router)]])
 
     def cleanup_os_tier0_logical_ports(self):
         """
         Delete all TIER0 logical router ports created from OpenStack
         """
-        tier0_routers = self.get_logical_routers(tier='TIER0')
-        for lr in tier0_routers:
-            self.cleanup_logical_router_ports(lr)
+        self.engine.run([[('OS TIER0 Logical Router Ports',
+                           lambda: self.get_os_routers_ports(
+                               self.get_logical_routers(tier='TIER0')),
+                           self.delete_logical_router_port)]])
 
     def get_logical_dhcp_servers(self):
         """
@@ -492,42 +531,55 @@ class NSXClient(object):
                             if srv['id'] in db_dhcp_servers]
         return dhcp_servers
 
+    def delete_logical_dhcp_server(self, server):
+        endpoint = "/dhcp/servers/%s" % server['id']
+        response = self.delete(endpoint=endpoint)
+        if response.status_code != requests.codes.ok:
+            print("Failed to delete logical DHCP server: %s" %
+                  server['display_name'])
+            return False
+        return True
+
     def cleanup_os_logical_dhcp_servers(self):
         """
         Cleanup all logical DHCP servers created from OpenStack plugin
         """
-        dhcp_servers = self.get_os_logical_dhcp_servers()
-        print("Number of OS Logical DHCP Servers to be deleted: %s" %
-              len(dhcp_servers))
-        for server in dhcp_servers:
-            endpoint = "/dhcp/servers/%s" % server['id']
-            response = self.delete(endpoint=endpoint)
-            if response.status_code == requests.codes.ok:
-                print("Successfully deleted logical DHCP server: %s" %
-                      server['display_name'])
-            else:
-                print("Failed to delete logical DHCP server: %s" %
-                      server['display_name'])
+        self.engine.run([[('OS Logical DHCP Servers',
+                           self.get_os_logical_dhcp_servers,
+                           self.delete_logical_dhcp_server)]])
 
     def cleanup_all(self):
         """
-        Cleanup steps:
+        Cleanup steps, the resources of each step are deleted concurrently:
             1. Cleanup firewall sections
-            2. Cleanup NSGroups
-            3. Cleanup logical router ports
-            4. Cleanup logical routers
-            5. Cleanup logical switch ports
-            6. Cleanup logical switches
-            7. Cleanup switching profiles
-        """
-        self.cleanup_os_firewall_sections()
-        self.cleanup_os_ns_groups()
-        self.cleanup_os_logical_routers()
-        self.cleanup_os_tier0_logical_ports()
-        self.cleanup_os_logical_ports()
-        self.cleanup_os_logical_switches()
-        self.cleanup_os_logical_dhcp_servers()
-        self.cleanup_os_switching_profiles()
+            2. Cleanup NSGroups, and the logical router ports of the
+               OpenStack and TIER0 logical routers
+            3. Cleanup logical routers
+            4. Cleanup logical switch ports
+            5. Cleanup logical switches
+            6. Cleanup logical DHCP servers and switching profiles
+        """
+        def get_routers_ports():
+            return self.get_os_routers_ports(
+                self.get_os_logical_routers() +
+                self.get_logical_routers(tier='TIER0'))
+
+        self.engine.run([
+            [('OS Firewall Sections', self.get_os_firewall_sections,
+              self.delete_firewall_section)],
+            [('OS NSGroups', self.get_ns_groups, self.delete_ns_group),
+             ('OS Logical Router Ports', get_routers_ports,
+              self.delete_logical_router_port)],
+            [('OS Logical Routers', self.get_os_logical_routers,
+              self.delete_logical_router)],
+            [('OS Logical Ports', self.get_os_logical_ports,
+              self.delete_logical_port)],
+            [('OS Logical Switches', self.get_os_logical_switches,
+              self.delete_logical_switch)],
+            [('OS Logical DHCP Servers', self.get_os_logical_dhcp_servers,
+              self.delete_logical_dhcp_server),
+             ('OS SwitchingProfiles', self.get_os_switching_profiles,
+              self.delete_switching_profile)]])
 
 
 if __name__ == "__main__":
@@ -541,10 +593,16 @@ if __name__ == "__main__":
     parser.add_option("--db-connection", default="", dest="db_connection",
                       help=("When set, cleaning only backend resources that "
                             "have db record."))
+    parser.add_option("--threads", type="int", dest="threads",
+                      default=cleanup_engine.DEFAULT_THREADS,
+                      help="Number of concurrent requests to the backend")
     (options, args) = parser.parse_args()
+    # Show the progress reported by the cleanup engine
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
 
     # Get NSX REST client
     nsx_client = NSXClient(options.mgr_ip, options.username,
-                           options.password, options.db_connection)
+                           options.password, options.db_connection,
+                           threads=options.threads)
     # Clean all objects created by OpenStack
     nsx_client.cleanup_all()
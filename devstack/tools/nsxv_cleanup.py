@@ -29,7 +29,10 @@ Usage:
                            --username <nsx-manager-username>
                            --password <nsx-manager-password>
                            --force
+                           --threads <number-of-concurrent-requests>
 Note: force is optional. If it is specified, force delete security group
+Independent objects are deleted concurrently, using up to threads (10 by
+default) concurrent requests over a shared keep-alive session.
 
 You can also use it in python interactive console by import the module
 >>>> import nsxv_cleanup
@@ -50,15 +53,19 @@ Tong Liu <tongl@vmware.com>
 """
 
 import base64
+import logging
 import optparse
-import requests
-import sqlalchemy as sa
 import sys
 
+import eventlet
+eventlet.monkey_patch()
+import requests
+import sqlalchemy as sa
 
 from oslo_serialization import jsonutils
 from vmware_nsx.db import nsx_models
 from vmware_nsx.db import nsxv_models
+from vmware_nsx.shell import cleanup_engine
 
 requests.packages.urllib3.disable_warnings()
 
@@ -97,7 +104,8 @@ class VSMClient(object):
     """Base VSM REST client """
     API_VERSION = "2.0"
 
-    def __init__(self, host, username, password, db_connection, force):
+    def __init__(self, host, username, password, db_connection, force,
+                 threads=cleanup_engine.DEFAULT_THREADS):
         self.force = force
         self.host = host
         self.username = username
@@ -114,6 +122,9 @@ class VSMClient(object):
         self.api_version = VSMClient.API_VERSION
         self.neutron_db = (NeutronNsxDB(db_connection) if db_connection
                            else None)
+        # A single keep-alive session is shared by all the requests
+        self.session = cleanup_engine.get_session(threads)
+        self.engine = cleanup_engine.CleanupEngine(threads)
         self.__set_headers()
 
     def __set_endpoint(self, endpoint):
@@ -147,6 +158,8 @@ class VSMClient(object):
         endpoint = self.endpoint if endpoint is None else endpoint
         http_type = 'https' if secure else 'http'
         self.url = '%s://%s/api/%s%s' % (http_type, host, api, endpoint)
+        # Return the url as well, as requests may run concurrently
+        return self.url
 
     def get_url(self):
         return self.url
@@ -155,49 +168,47 @@ class VSMClient(object):
         content_type = self.content_type if content is None else content
         accept_type = self.accept_type if accept is None else accept
         auth_cred = self.username + ":" + self.password
-        auth = base64.b64encode(auth_cred)
+        auth = base64.b64encode(auth_cred.encode('utf-8')).decode('utf-8')
         headers = {}
         headers['Authorization'] = "Basic %s" % auth
         headers['Content-Type'] = content_type
         headers['Accept'] = accept_type
         self.headers = headers
 
-    def get(self, endpoint=None, params=None):
+    def get(self, endpoint=None, params=None, api=None):
         """
         Basic query method for json API request
         """
-        self.__set_url(endpoint=endpoint)
-        response = requests.get(self.url, headers=self.headers,
-                                verify=self.verify, params=params)
+        url = self.__set_url(api=api, endpoint=endpoint)
+        response = self.session.get(url, headers=self.headers,
+                                    verify=self.verify, params=params)
         return response
 
-    def delete(self, endpoint=None, params=None):
+    def delete(self, endpoint=None, params=None, api=None):
         """
         Basic delete API method on endpoint
         """
-        self.__set_url(endpoint=endpoint)
-        response = requests.delete(self.url, headers=self.headers,
-                                   verify=self.verify, params=params)
+        url = self.__set_url(api=api, endpoint=endpoint)
+        response = self.session.delete(url, headers=self.headers,
+                                       verify=self.verify, params=params)
         return response
 
-    def post(self, endpoint=None, body=None):
+    def post(self, endpoint=None, body=None, api=None):
         """
         Basic post API method on endpoint
         """
-        self.__set_url(endpoint=endpoint)
+        url = self.__set_url(api=api, endpoint=endpoint)
         self.__set_headers()
-        response = requests.post(self.url, headers=self.headers,
-                                 verify=self.verify,
-                                 data=jsonutils.dumps(body))
+        response = self.session.post(url, headers=self.headers,
+                                     verify=self.verify,
+                                     data=jsonutils.dumps(body))
         return response
 
     def get_vdn_scope_id(self):
         """
         Retrieve existing network scope id
         """
-        self.__set_api_version('2.0')
-        self.__set_endpoint("/vdn/scopes")
-        response = self.get()
+        response = self.get(endpoint="/vdn/scopes", api='2.0')
         if len(response.json()['allScopes']) == 0:
             return
         else:
@@ -205,14 +216,12 @@ class VSMClient(object):
 
     def query_all_logical_switches(self):
         lswitches = []
-        self.__set_api_version('2.0')
         vdn_scope_id = self.get_vdn_scope_id()
         if not vdn_scope_id:
             return lswitches
         endpoint = "/vdn/scopes/%s/virtualwires" % (vdn_scope_id)
-        self.__set_endpoint(endpoint)
         # Query all logical switches
-        response = self.get()
+        response = self.get(endpoint=endpoint, api='2.0')
         paging_info = response.json()['dataPage']['pagingInfo']
         page_size = int(paging_info['pageSize'])
         total_count = int(paging_info['totalCount'])
@@ -223,7 +232,7 @@ class VSMClient(object):
         for i in range(0, pages):
             start_index = page_size * i
             params = {'startindex': start_index}
-            response = self.get(params=params)
+            response = self.get(endpoint=endpoint, params=params, api='2.0')
             temp_lswitches = response.json()['dataPage']['data']
             lswitches += temp_lswitches
 
@@ -234,26 +243,31 @@ class VSMClient(object):
 
         return lswitches
 
+    def delete_logical_switch(self, ls):
+        endpoint = '/vdn/virtualwires/%s' % ls['objectId']
+        response = self.delete(endpoint=endpoint, api='2.0')
+        if response.status_code != 200:
+            print("ERROR: failed to delete logical switch %s (%s), response "
+                  "status code %s" % (ls['name'], ls['objectId'],
+                                      response.status_code))
+            return False
+        return True
+
+    def _get_logical_switch_step(self):
+        return ('logical switches', self.query_all_logical_switches,
+                self.delete_logical_switch)
+
     def cleanup_logical_switch(self):
         print("Cleaning up logical switches on NSX manager")
-        lswitches = self.query_all_logical_switches()
-        print("There are total %s logical switches" % len(lswitches))
-        for ls in lswitches:
-            print("\nDeleting logical switch %s (%s) ..." % (ls['name'],
-                                                             ls['objectId']))
-            endpoint = '/vdn/virtualwires/%s' % ls['objectId']
-            response = self.delete(endpoint=endpoint)
-            if response.status_code != 200:
-                print("ERROR: response status code %s" % response.status_code)
+        self.engine.run([[self._get_logical_switch_step()]])
 
     def query_all_firewall_sections(self):
         firewall_sections = []
-        self.__set_api_version('4.0')
-        self.__set_endpoint('/firewall/globalroot-0/config')
         # Query all firewall sections
-        response = self.get()
+        response = self.get(endpoint='/firewall/globalroot-0/config',
+                            api='4.0')
         # Get layer3 sections related to security group
-        if response.status_code is 200:
+        if response.status_code == 200:
             l3_sections = response.json()['layer3Sections']['layer3Sections']
             # do not delete the default section, or sections created by the
             # service composer
@@ -270,26 +284,31 @@ class VSMClient(object):
                                  in db_sections]
         return firewall_sections
 
+    def delete_firewall_section(self, l3sec):
+        endpoint = '/firewall/globalroot-0/config/layer3sections/%s' % \
+                   l3sec['id']
+        response = self.delete(endpoint=endpoint, api='4.0')
+        if response.status_code != 204:
+            print("ERROR: failed to delete firewall section %s (%s), "
+                  "response status code %s" % (l3sec['name'], l3sec['id'],
+                                               response.status_code))
+            return False
+        return True
+
+    def _get_firewall_section_step(self):
+        return ('firewall sections', self.query_all_firewall_sections,
+                self.delete_firewall_section)
+
     def cleanup_firewall_section(self):
         print("\n\nCleaning up firewall sections on NSX manager")
-        l3_sections = self.query_all_firewall_sections()
-        print("There are total %s firewall sections" % len(l3_sections))
-        for l3sec in l3_sections:
-            print("\nDeleting firewall section %s (%s) ..." % (l3sec['name'],
-                                                               l3sec['id']))
-            endpoint = '/firewall/globalroot-0/config/layer3sections/%s' % \
-                       l3sec['id']
-            response = self.delete(endpoint=endpoint)
-            if response.status_code != 204:
-                print("ERROR: response status code %s" % response.status_code)
+        self.engine.run([[self._get_firewall_section_step()]])
 
     def query_all_security_groups(self):
         security_groups = []
-        self.__set_api_version('2.0')
-        self.__set_endpoint("/services/securitygroup/scope/globalroot-0")
         # Query all security groups
-        response = self.get()
-        if response.status_code is 200:
+        response = self.get(
+            endpoint="/services/securitygroup/scope/globalroot-0", api='2.0')
+        if response.status_code == 200:
             sg_all = response.json()
         else:
             print("ERROR: wrong response status code! Exiting...")
@@ -305,25 +324,30 @@ class VSMClient(object):
                                if sg['objectId'] in db_sgs]
         return security_groups
 
+    def delete_security_group(self, sg):
+        endpoint = '/services/securitygroup/%s' % sg['objectId']
+        params = {'force': self.force}
+        response = self.delete(endpoint=endpoint, params=params, api='2.0')
+        if response.status_code != 200:
+            print("ERROR: failed to delete security group %s (%s), response "
+                  "status code %s" % (sg['name'], sg['objectId'],
+                                      response.status_code))
+            return False
+        return True
+
+    def _get_security_group_step(self):
+        return ('security groups', self.query_all_security_groups,
+                self.delete_security_group)
+
     def cleanup_security_group(self):
         print("\n\nCleaning up security groups on NSX manager")
-        security_groups = self.query_all_security_groups()
-        print("There are total %s security groups" % len(security_groups))
-        for sg in security_groups:
-            print("\nDeleting security group %s (%s) ..." % (sg['name'],
-                                                             sg['objectId']))
-            endpoint = '/services/securitygroup/%s' % sg['objectId']
-            params = {'force': self.force}
-            response = self.delete(endpoint=endpoint, params=params)
-            if response.status_code != 200:
-                print("ERROR: response status code %s" % response.status_code)
+        self.engine.run([[self._get_security_group_step()]])
 
     def query_all_spoofguard_policies(self):
-        self.__set_api_version('4.0')
-        self.__set_endpoint("/services/spoofguard/policies/")
         # Query all spoofguard policies
-        response = self.get()
-        if response.status_code is not 200:
+        response = self.get(endpoint="/services/spoofguard/policies/",
+                            api='4.0')
+        if response.status_code != 200:
             print("ERROR: Faield to get spoofguard policies")
             return
         sgp_all = response.json()
@@ -335,23 +359,28 @@ class VSMClient(object):
             policies = [p for p in policies if p['policyId'] in db_policies]
         return policies
 
+    def delete_spoofguard_policy(self, spg):
+        endpoint = '/services/spoofguard/policies/%s' % spg['policyId']
+        response = self.delete(endpoint=endpoint, api='4.0')
+        if response.status_code not in (200, 204):
+            print("ERROR: failed to delete spoofguard policy %s (%s), "
+                  "response status code %s" % (spg['name'], spg['policyId'],
+                                               response.status_code))
+            return False
+        return True
+
+    def _get_spoofguard_policy_step(self):
+        return ('spoofguard policies', self.query_all_spoofguard_policies,
+                self.delete_spoofguard_policy)
+
     def cleanup_spoofguard_policies(self):
         print("\n\nCleaning up spoofguard policies")
-        policies = self.query_all_spoofguard_policies()
-        print("There are total %s policies" % len(policies))
-        for spg in policies:
-            print("\nDeleting spoofguard policy %s (%s) ..." %
-                  (spg['name'], spg['policyId']))
-            endpoint = '/services/spoofguard/policies/%s' % spg['policyId']
-            response = self.delete(endpoint=endpoint)
-            print("Response code: %s" % response.status_code)
+        self.engine.run([[self._get_spoofguard_policy_step()]])
 
     def query_all_edges(self):
         edges = []
-        self.__set_api_version('4.0')
-        self.__set_endpoint("/edges")
         # Query all edges
-        response = self.get()
+        response = self.get(endpoint="/edges", api='4.0')
         paging_info = response.json()['edgePage']['pagingInfo']
         page_size = int(paging_info['pageSize'])
         total_count = int(paging_info['totalCount'])
@@ -362,7 +391,7 @@ class VSMClient(object):
         for i in range(0, pages):
             start_index = page_size * i
             params = {'startindex': start_index}
-            response = self.get(params=params)
+            response = self.get(endpoint="/edges", params=params, api='4.0')
             temp_edges = response.json()['edgePage']['data']
             edges += temp_edges
 
@@ -372,30 +401,45 @@ class VSMClient(object):
 
         return edges
 
+    def delete_edge(self, edge):
+        endpoint = '/edges/%s' % edge['id']
+        response = self.delete(endpoint=endpoint, api='4.0')
+        if response.status_code != 204:
+            print("ERROR: failed to delete edge %s (%s), response status "
+                  "code %s" % (edge['name'], edge['id'],
+                               response.status_code))
+            return False
+        return True
+
+    def _get_edge_step(self):
+        return ('edges', self.query_all_edges, self.delete_edge)
+
     def cleanup_edge(self):
         print("\n\nCleaning up edges on NSX manager")
-        edges = self.query_all_edges()
-        for edge in edges:
-            print("\nDeleting edge %s (%s) ..." % (edge['name'], edge['id']))
-            endpoint = '/edges/%s' % edge['id']
-            response = self.delete(endpoint=endpoint)
-            if response.status_code != 204:
-                print("ERROR: response status code %s" %
-                      response.status_code)
+        self.engine.run([[self._get_edge_step()]])
 
     def cleanup_all(self):
-        self.cleanup_firewall_section()
-        self.cleanup_security_group()
-        self.cleanup_spoofguard_policies()
-        self.cleanup_edge()
-        self.cleanup_logical_switch()
+        """
+        Cleanup steps, the resources of each step are deleted concurrently:
+            1. Cleanup firewall sections
+            2. Cleanup security groups, once no firewall rule uses them,
+               and spoofguard policies
+            3. Cleanup edges
+            4. Cleanup logical switches, once no edge is attached to them
+        """
+        return self.engine.run([
+            [self._get_firewall_section_step()],
+            [self._get_security_group_step(),
+             self._get_spoofguard_policy_step()],
+            [self._get_edge_step()],
+            [self._get_logical_switch_step()]])
 
 
 def ceil(a, b):
     if b == 0:
         return 0
-    div = a / b
-    mod = 0 if a % b is 0 else 1
+    div = a // b
+    mod = 0 if a % b == 0 else 1
     return div + mod
 
 
@@ -412,15 +456,22 @@ if __name__ == "__main__":
                             "have db record."))
     parser.add_option("-f", "--force", dest="force", action="store_true",
                       help="Force cleanup option")
+    parser.add_option("--threads", type="int", dest="threads",
+                      default=cleanup_engine.DEFAULT_THREADS,
+                      help="Number of concurrent requests to the backend")
     (options, args) = parser.parse_args()
+    # Show the progress reported by the cleanup engine
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     print("vsm-ip: %s" % options.vsm_ip)
     print("username: %s" % options.username)
     print("password: %s" % options.password)
     print("db-connection: %s" % options.db_connection)
     print("force: %s" % options.force)
+    print("threads: %s" % options.threads)
 
     # Get VSM REST client
     vsm_client = VSMClient(options.vsm_ip, options.username, options.password,
-                           options.db_connection, options.force)
+                           options.db_connection, options.force,
+                           threads=options.threads)
     # Clean all objects created by OpenStack
     vsm_client.cleanup_all()
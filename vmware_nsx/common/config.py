@@ -120,6 +120,18 @@ base_opts = [
                         "configured maximum bandwidth of the QoS rule, "
                         "multiplied by this value. Value must be bigger than"
                         " 1")),
+    cfg.IntOpt('qos_binding_cache_ttl', default=0, min=0,
+               help=_("Number of seconds the QoS policy bindings of ports "
+                      "and networks are cached by the plugin. The cache is "
+                      "local to each neutron server, so bindings changed "
+                      "by other servers may be used for this long. 0 "
+                      "disables the cache.")),
+    cfg.BoolOpt('cache_security_profile_rules', default=False,
+                help=_("If True, the plugin caches the rule set of each "
+                       "security profile and pushes it to the backend after "
+                       "the security group rules are committed, instead of "
+                       "rebuilding it from the database within the "
+                       "transaction on each rule creation.")),
 ]
 
 sync_opts = [
@@ -167,7 +179,15 @@ sync_opts = [
                        "synchronization on show operations. In this way, show "
                        "operations will always fetch the operational status "
                        "of the resource from the NSX backend, and this might "
-                       "have a considerable impact on overall performance."))
+                       "have a considerable impact on overall performance.")),
+    cfg.IntOpt('status_cache_ttl', default=0, min=0,
+               help=_("Number of seconds during which the operational status "
+                      "read from the NSX backend on show and list operations "
+                      "is reused, when always_read_status is enabled. "
+                      "Concurrent reads of the same resource always result "
+                      "in a single NSX request. 0 disables the reuse, and "
+                      "the status of listed ports is then not read from "
+                      "the NSX backend."))
 ]
 
 connection_opts = [
@@ -240,6 +260,11 @@ nsx_common_opts = [
                       "parameter to tooz coordinator. By default, value is "
                       "None and oslo_concurrency is used for single-node "
                       "lock management.")),
+    cfg.IntOpt('locking_hold_time_threshold',
+               default=60,
+               help=_("(Optional) Number of seconds after which a warning "
+                      "with the stack trace of the holder is logged when a "
+                      "lock is released. The value 0 disables it.")),
     cfg.BoolOpt('api_replay_mode',
                 default=False,
                 help=_("If true, the server then allows the caller to "
@@ -251,6 +276,15 @@ nsx_common_opts = [
                 help=_("An ordered list of extension driver "
                        "entrypoints to be loaded from the "
                        "vmware_nsx.extension_drivers namespace.")),
+    cfg.IntOpt('tenant_security_groups_cache_ttl',
+               default=0, min=0,
+               help=_("(Optional) Number of seconds the NSX-V and NSX-V3 "
+                      "plugins cache the default and provider security "
+                      "groups of a tenant, used when creating ports. The "
+                      "cache is invalidated by security group changes done "
+                      "by this server process, so with several API workers "
+                      "other processes may use stale values up to this "
+                      "number of seconds. 0 disables the cache.")),
 ]
 
 nsx_v3_opts = [
@@ -681,6 +715,31 @@ nsxv_opts = [
                default=1,
                help=_("(Optional) Set the interval (Seconds) for BGP "
                       "neighbour keep alive time.")),
+    cfg.IntOpt('ipam_prefetch_size',
+               default=0, min=0,
+               help=_("(Optional) Number of IP addresses the IPAM driver "
+                      "reserves ahead from each NSX IP pool, and hands out "
+                      "locally. Reserved addresses are seen as used by the "
+                      "backend until they are returned. 0 disables the "
+                      "prefetching.")),
+    cfg.IntOpt('ipam_prefetch_release_interval',
+               default=300, min=1,
+               help=_("(Optional) Number of seconds after which unused "
+                      "prefetched IP addresses of an idle NSX IP pool are "
+                      "returned to the backend.")),
+    cfg.IntOpt('fwaas_backend_rules_cache_ttl',
+               default=0, min=0,
+               help=_("(Optional) Number of seconds the FWaaS driver caches "
+                      "the edge firewall rules which do not belong to FWaaS, "
+                      "to avoid reading the edge firewall before each "
+                      "update. 0 disables the cache.")),
+    cfg.IntOpt('bgp_routes_cache_ttl',
+               default=0, min=0,
+               help=_("(Optional) Maximal number of seconds the BGP driver "
+                      "keeps the edges, routers and subnets advertised by a "
+                      "BGP speaker. The cache is also invalidated by router "
+                      "interface and gateway changes done by this server. "
+                      "0 disables the cache.")),
 ]
 
 # define the configuration of each NSX-V availability zone.
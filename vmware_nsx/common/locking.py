@@ -14,20 +14,84 @@
 #    under the License.
 
 import os
+import re
 import traceback
 
 from oslo_concurrency import lockutils
 from oslo_config import cfg
 from oslo_log import log
+from oslo_utils import timeutils
 from tooz import coordination
 
+from vmware_nsx.common import utils
+
 LOG = log.getLogger(__name__)
 
+# Upper bounds, in seconds, of the lock wait and hold time histograms buckets
+LOCK_TIME_BUCKETS = (0.001, 0.01, 0.1, 1, 10, 60)
+
+# Objects ids in lock names: uuids, edge ids and numeric ids
+_LOCK_NAME_ID = re.compile(
+    r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+    r'[0-9a-fA-F]{12}|\b(edge-)?\d+\b')
+
+
+def _get_lock_kind(name):
+    return _LOCK_NAME_ID.sub('{id}', name)
+
+
+class _LockStats(object):
+    def __init__(self):
+        self.acquired = 0
+        self.wait_time = utils.DurationHistogram(LOCK_TIME_BUCKETS)
+        self.hold_time = utils.DurationHistogram(LOCK_TIME_BUCKETS)
+
+    def to_dict(self):
+        return {'acquired': self.acquired,
+                'wait_time': self.wait_time.to_dict(),
+                'hold_time': self.hold_time.to_dict()}
+
+
+class _ProfiledLock(object):
+    """Wrap a lock context manager to record its contention statistics
+
+    The stack of the holder is captured only when the lock was held for
+    more than the locking_hold_time_threshold configuration option.
+    """
+
+    def __init__(self, name, lock, stats):
+        self._name = name
+        self._lock = lock
+        self._stats = stats
+        self._acquired_at = None
+
+    def __enter__(self):
+        start = timeutils.now()
+        result = self._lock.__enter__()
+        self._acquired_at = timeutils.now()
+        self._stats.acquired += 1
+        self._stats.wait_time.add(self._acquired_at - start)
+        return result
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        held = timeutils.now() - self._acquired_at
+        try:
+            return self._lock.__exit__(exc_type, exc_value, exc_tb)
+        finally:
+            self._stats.hold_time.add(held)
+            threshold = cfg.CONF.locking_hold_time_threshold
+            if threshold and held > threshold:
+                LOG.warning('Lock %(name)s was held for %(held).2f seconds '
+                            'with stack trace %(stack)s',
+                            {'name': self._name, 'held': held,
+                             'stack': ''.join(traceback.format_stack())})
+
 
 class LockManager(object):
     _coordinator = None
     _coordinator_pid = None
     _connect_string = cfg.CONF.locking_coordinator_url
+    _lock_stats = {}
 
     def __init__(self):
         LOG.debug('LockManager initialized!')
@@ -36,16 +100,33 @@ class LockManager(object):
     def get_lock(name, **kwargs):
         if cfg.CONF.locking_coordinator_url:
             lck = LockManager._get_lock_distributed(name)
-            LOG.debug('Lock %s taken with stack trace %s', name,
-                      traceback.extract_stack())
-            return lck
         else:
             # Ensure that external=True
             kwargs['external'] = True
             lck = LockManager._get_lock_local(name, **kwargs)
-            LOG.debug('Lock %s taken with stack trace %s', name,
-                      traceback.extract_stack())
-            return lck
+        # The statistics are kept by lock kind, as most lock names contain
+        # an object id
+        kind = _get_lock_kind(name)
+        stats = LockManager._lock_stats.get(kind)
+        if stats is None:
+            stats = LockManager._lock_stats.setdefault(kind, _LockStats())
+        return _ProfiledLock(name, lck, stats)
+
+    @staticmethod
+    def get_lock_stats():
+        """Return the contention statistics of the locks, by lock kind
+
+        The lock kind is the lock name with the objects ids replaced by
+        '{id}'. For each lock kind, the number of times it was acquired, and
+        the count, total, max and histogram buckets of its wait and hold
+        times, in seconds. A bucket is an (upper bound, count) pair.
+        """
+        return dict((kind, stats.to_dict())
+                    for kind, stats in LockManager._lock_stats.items())
+
+    @staticmethod
+    def reset_lock_stats():
+        LockManager._lock_stats.clear()
 
     @staticmethod
     def _get_lock_local(name, **kwargs):
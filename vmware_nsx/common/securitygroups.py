@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+
 from oslo_log import log
 import six
 
@@ -116,6 +118,41 @@ def merge_security_group_rules_with_current(session, cluster,
     return merged_rules
 
 
+def merge_nsx_rules(current_nsx_rules, new_nsx_rules):
+    """Return a new NSX rule set with new_nsx_rules appended to current."""
+    merged_rules = copy.deepcopy(current_nsx_rules)
+    for direction in ['logical_port_ingress_rules',
+                      'logical_port_egress_rules']:
+        merged_rules[direction].extend(new_nsx_rules[direction])
+    return merged_rules
+
+
+class SecurityProfileRulesCache(object):
+    """Cache of the NSX rule set last pushed to each security profile.
+
+    Each entry is keyed by Neutron security group id and records the ids
+    of the Neutron rules it was built from. An entry is returned only if
+    those ids match the ones currently in the DB, so changes done by other
+    servers, or by operations which do not update the cache, are detected
+    and the rule set is rebuilt from the DB.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, security_group_id, rule_ids):
+        entry = self._entries.get(security_group_id)
+        if entry and entry[0] == frozenset(rule_ids):
+            return copy.deepcopy(entry[1])
+
+    def set(self, security_group_id, rule_ids, nsx_rules):
+        self._entries[security_group_id] = (frozenset(rule_ids),
+                                            copy.deepcopy(nsx_rules))
+
+    def invalidate(self, security_group_id):
+        self._entries.pop(security_group_id, None)
+
+
 def remove_security_group_with_id_and_id_field(rules, rule_id):
     """Remove rule by rule_id.
 
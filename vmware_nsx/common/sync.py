@@ -15,7 +15,9 @@
 
 import copy
 import random
+import time
 
+import eventlet
 from neutron_lib import constants
 from neutron_lib import context as n_context
 from neutron_lib import exceptions
@@ -173,6 +175,66 @@ class NsxCache(object):
                 self._get_resource_ids(self._lswitchports, changed_only=True))
 
 
+class NsxStatusCache(object):
+    """A read-through cache for the status of neutron resources.
+
+    Punctual status reads for the same resource are coalesced, so that
+    concurrent reads cost a single NSX request, and the status is then
+    reused for ttl seconds.
+    """
+
+    # Bound the number of statuses kept for resources which were deleted
+    MAX_ENTRIES = 10000
+
+    def __init__(self, ttl=0):
+        self._ttl = ttl
+        # Maps a neutron id to a (status, expiration time) tuple
+        self._statuses = {}
+        # Maps a neutron id to the event of the request fetching its status
+        self._in_flight = {}
+
+    def get(self, resource_id):
+        entry = self._statuses.get(resource_id)
+        if entry and entry[1] > time.time():
+            return entry[0]
+
+    def set(self, resource_id, status):
+        if not self._ttl or not status:
+            return
+        now = time.time()
+        if len(self._statuses) >= self.MAX_ENTRIES:
+            self._statuses = dict(
+                (key, entry) for key, entry in six.iteritems(self._statuses)
+                if entry[1] > now)
+            if len(self._statuses) >= self.MAX_ENTRIES:
+                self._statuses = {}
+        self._statuses[resource_id] = (status, now + self._ttl)
+
+    def read_through(self, resource_id, fetch_func, *args, **kwargs):
+        """Return the resource status, calling fetch_func if needed.
+
+        If a request for the same resource is already running, wait for
+        its result instead of issuing a new one.
+        The returned status is None if the status could not be fetched.
+        """
+        status = self.get(resource_id)
+        if status:
+            return status
+        event = self._in_flight.get(resource_id)
+        if event:
+            return event.wait()
+        event = eventlet.event.Event()
+        self._in_flight[resource_id] = event
+        status = None
+        try:
+            status = fetch_func(*args, **kwargs)
+            self.set(resource_id, status)
+            return status
+        finally:
+            del self._in_flight[resource_id]
+            event.send(status)
+
+
 class SyncParameters(object):
     """Defines attributes used by the synchronization procedure.
 
@@ -229,9 +291,11 @@ class NsxSynchronizer(object):
 
     def __init__(self, plugin, cluster, state_sync_interval,
                  req_delay, min_chunk_size, max_rand_delay=0,
-                 initial_delay=5):
+                 initial_delay=5, status_cache_ttl=0):
         random.seed()
         self._nsx_cache = NsxCache()
+        self._network_status_cache = NsxStatusCache(status_cache_ttl)
+        self._port_status_cache = NsxStatusCache(status_cache_ttl)
         # Store parameters as instance members
         # NOTE(salv-orlando): apologies if it looks java-ish
         self._plugin = plugin
@@ -300,7 +364,7 @@ class NsxSynchronizer(object):
         # Update db object
         if status == neutron_network_data['status']:
             # do nothing
-            return
+            return status
 
         with db_api.context_manager.writer.using(context):
             try:
@@ -314,6 +378,17 @@ class NsxSynchronizer(object):
                           " %(status)s",
                           {'q_id': neutron_network_data['id'],
                            'status': status})
+        return status
+
+    def read_network_status(self, context, neutron_network_data):
+        """Return the status of a network, synchronizing it if needed.
+
+        The status is read from the status cache if it is fresh, and
+        concurrent reads of the same network are coalesced.
+        """
+        return self._network_status_cache.read_through(
+            neutron_network_data['id'], self.synchronize_network,
+            context, neutron_network_data)
 
     def _synchronize_lswitches(self, ctx, ls_uuids, scan_missing=False):
         if not ls_uuids and not scan_missing:
@@ -344,7 +419,9 @@ class NsxSynchronizer(object):
         for network in networks:
             lswitches = neutron_nsx_mappings.get(network['id'], [])
             lswitches = [lsw.get('data') for lsw in lswitches]
-            self.synchronize_network(ctx, network, lswitches)
+            self._network_status_cache.set(
+                network['id'],
+                self.synchronize_network(ctx, network, lswitches))
 
     def synchronize_router(self, context, neutron_router_data,
                            lrouter=None):
@@ -438,7 +515,7 @@ class NsxSynchronizer(object):
         if neutron_port_data['network_id'] in ext_networks:
             with db_api.context_manager.writer.using(context):
                 neutron_port_data['status'] = constants.PORT_STATUS_ACTIVE
-                return
+                return constants.PORT_STATUS_ACTIVE
 
         if not lswitchport:
             # Try to get port from nsx
@@ -477,7 +554,7 @@ class NsxSynchronizer(object):
         # Update db object
         if status == neutron_port_data['status']:
             # do nothing
-            return
+            return status
 
         with db_api.context_manager.writer.using(context):
             try:
@@ -491,6 +568,58 @@ class NsxSynchronizer(object):
                           " %(status)s",
                           {'q_id': neutron_port_data['id'],
                            'status': status})
+        return status
+
+    def read_port_status(self, context, neutron_port_data):
+        """Return the status of a port, synchronizing it if needed.
+
+        The status is read from the status cache if it is fresh, and
+        concurrent reads of the same port are coalesced.
+        """
+        return self._port_status_cache.read_through(
+            neutron_port_data['id'], self.synchronize_port,
+            context, neutron_port_data)
+
+    def read_ports_status(self, context, neutron_ports_data):
+        """Bulk version of read_port_status for port list operations.
+
+        Ports without a fresh cached status are synchronized using a single
+        NSX query for each of their logical switches, and the status of each
+        port is updated in the port data.
+        """
+        stale_ports = {}
+        for port in neutron_ports_data:
+            status = self._port_status_cache.get(port['id'])
+            if status:
+                port['status'] = status
+            else:
+                stale_ports.setdefault(port['network_id'], []).append(port)
+        if not stale_ports:
+            return
+
+        ext_nets = [net['id'] for net in context.session.query(
+            models_v2.Network).join(
+                external_net_db.ExternalNetwork,
+                (models_v2.Network.id ==
+                 external_net_db.ExternalNetwork.network_id))]
+        for network_id, ports in six.iteritems(stale_ports):
+            lswitchports = {}
+            if network_id not in ext_nets:
+                try:
+                    for ls_uuid in nsx_utils.get_nsx_switch_ids(
+                            context.session, self._cluster, network_id):
+                        lswitchports.update(switchlib.get_ports(
+                            self._cluster, networks=[ls_uuid]))
+                except (exceptions.NetworkNotFound,
+                        nsx_exc.NsxPluginException):
+                    LOG.warning("Logical switch ports of neutron network "
+                                "%s not found on NSX.", network_id)
+            for port in ports:
+                status = self.synchronize_port(
+                    context, port, lswitchports.get(port['id']),
+                    ext_networks=ext_nets)
+                self._port_status_cache.set(port['id'], status)
+                port['status'] = status
 
     def _synchronize_lswitchports(self, ctx, lp_uuids, scan_missing=False):
         if not lp_uuids and not scan_missing:
@@ -524,9 +653,11 @@ class NsxSynchronizer(object):
             filters=filters)
         for port in ports:
             lswitchport = neutron_port_mappings.get(port['id'])
-            self.synchronize_port(
-                ctx, port, lswitchport and lswitchport.get('data'),
-                ext_networks=ext_nets)
+            self._port_status_cache.set(
+                port['id'],
+                self.synchronize_port(
+                    ctx, port, lswitchport and lswitchport.get('data'),
+                    ext_networks=ext_nets))
 
     def _get_chunk_size(self, sp):
         # NOTE(salv-orlando): Try to use __future__ for this routine only?
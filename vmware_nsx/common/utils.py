@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import bisect
+import collections
 from distutils import version
 import functools
 import hashlib
@@ -27,6 +29,9 @@ from neutron_lib.api import validators
 from neutron_lib import constants
 from oslo_context import context as common_context
 from oslo_log import log
+from oslo_utils import timeutils
+
+from vmware_nsx._i18n import _
 
 LOG = log.getLogger(__name__)
 
@@ -228,3 +233,77 @@ def spawn_n(func, *args, **kwargs):
         func(*args, **kwargs)
 
     eventlet.spawn_n(context_wrapper, *args, **kwargs)
+
+
+class DurationHistogram(object):
+    """Count, total, max and histogram of durations, in seconds
+
+    buckets is the sorted list of the upper bounds of the histogram
+    buckets. Longer durations are counted in an additional last bucket.
+    """
+
+    def __init__(self, buckets):
+        self.bounds = tuple(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(self.bounds) + 1)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.buckets[bisect.bisect_left(self.bounds, duration)] += 1
+
+    def to_dict(self):
+        """Return the statistics, with (upper bound, count) buckets"""
+        bounds = self.bounds + (float('inf'),)
+        return {'count': self.count,
+                'total': self.total,
+                'max': self.max,
+                'buckets': list(zip(bounds, self.buckets))}
+
+
+def run_init_stages(stages):
+    """Run independent initialization stages concurrently.
+
+    stages is a list of (name, func, dependencies) tuples. A stage starts
+    once all the stages named in its dependencies, which must appear before
+    it in the list, completed. The duration of each stage is logged, and
+    the error of the first failed stage is raised after all the stages
+    ended.
+    """
+    threads = collections.OrderedDict()
+
+    def _run_stage(name, func, dependencies):
+        for dependency in dependencies:
+            threads[dependency].wait()
+        with timeutils.StopWatch() as watch:
+            func()
+        LOG.info("Init stage %(name)s completed in %(time).2f seconds",
+                 {'name': name, 'time': watch.elapsed()})
+
+    # Validate all the dependencies before starting any stage
+    names = set()
+    for name, func, dependencies in stages:
+        for dependency in dependencies:
+            if dependency not in names:
+                raise ValueError(_("Unknown init stage %(dep)s required "
+                                   "by %(name)s") % {'dep': dependency,
+                                                     'name': name})
+        names.add(name)
+
+    for name, func, dependencies in stages:
+        threads[name] = eventlet.spawn(_run_stage, name, func, dependencies)
+
+    error = None
+    for name, thread in threads.items():
+        try:
+            thread.wait()
+        except Exception as e:
+            LOG.error("Init stage %(name)s failed: %(e)s",
+                      {'name': name, 'e': e})
+            if error is None:
+                error = e
+    if error is not None:
+        raise error
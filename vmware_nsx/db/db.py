@@ -15,6 +15,7 @@
 #    under the License.
 
 import six
+from sqlalchemy import event as sa_event
 from sqlalchemy.orm import exc
 
 from oslo_db import exception as db_exc
@@ -28,6 +29,48 @@ from vmware_nsx.db import nsx_models
 
 LOG = logging.getLogger(__name__)
 
+# Session info key of the callbacks to call once the transaction commits
+_AFTER_COMMIT_CALLBACKS = 'nsx_after_commit_callbacks'
+
+
+def _run_after_commit_callbacks(session):
+    # Ignore the commit of savepoints
+    if session.transaction.parent is not None:
+        return
+    callbacks = session.info.get(_AFTER_COMMIT_CALLBACKS)
+    while callbacks:
+        func, args = callbacks.pop(0)
+        func(*args)
+
+
+def _drop_after_commit_callbacks(session, transaction):
+    # Once the outermost transaction ended, the callbacks which did not
+    # run belong to a rolled back transaction. Savepoints rollbacks are
+    # ignored.
+    if transaction.parent is None:
+        del session.info.get(_AFTER_COMMIT_CALLBACKS, [])[:]
+
+
+def call_after_commit(session, func, *args):
+    """Call func once the current transaction of the session is committed
+
+    func is called right away if the session is not in a transaction, and
+    is not called if the transaction is rolled back. The session listeners
+    are registered once, and the pending callbacks are kept in the session
+    info until the transaction ends.
+    """
+    if not session.is_active:
+        func(*args)
+        return
+    callbacks = session.info.get(_AFTER_COMMIT_CALLBACKS)
+    if callbacks is None:
+        callbacks = session.info[_AFTER_COMMIT_CALLBACKS] = []
+        sa_event.listen(session, 'after_commit',
+                        _run_after_commit_callbacks)
+        sa_event.listen(session, 'after_transaction_end',
+                        _drop_after_commit_callbacks)
+    callbacks.append((func, args))
+
 
 def _apply_filters_to_query(query, model, filters, like_filters=None):
     if filters:
@@ -254,6 +297,14 @@ def get_nsx_switch_and_port_id(session, neutron_id):
         return None, None
 
 
+def get_nsx_port_ids_by_neutron_ids(session, neutron_ids):
+    """Return a dictionary of neutron port id -> NSX port id"""
+    entries = (session.query(nsx_models.NeutronNsxPortMapping).
+               filter(nsx_models.NeutronNsxPortMapping.neutron_id.in_(
+                   neutron_ids)).all())
+    return dict((entry.neutron_id, entry.nsx_port_id) for entry in entries)
+
+
 def get_nsx_router_id(session, neutron_id):
     try:
         mapping = (session.query(nsx_models.NeutronNsxRouterMapping).
@@ -280,6 +331,15 @@ def get_nsx_security_group_id(session, neutron_id):
         return None
 
 
+def get_nsx_security_group_ids_by_neutron_ids(session, neutron_ids):
+    """Return a dictionary of neutron security group id -> NSX id"""
+    entries = (session.query(nsx_models.NeutronNsxSecurityGroupMapping).
+               filter(nsx_models.NeutronNsxSecurityGroupMapping.neutron_id.in_(
+                   neutron_ids)).all())
+    return dict((entry.neutron_id, entry.nsx_id) for entry in entries
+                if entry.nsx_id is not None)
+
+
 def get_nsx_security_group_ids(session, neutron_ids):
     """Return list of ids of a security groups in the NSX backend.
     """
@@ -374,6 +434,18 @@ def get_switch_profile_by_qos_policy(session, qos_policy_id):
         raise nsx_exc.NsxQosPolicyMappingNotFound(policy=qos_policy_id)
 
 
+def get_switch_profiles_by_qos_policies(session, qos_policy_ids):
+    """Return a dictionary of QoS policy id -> switch profile id
+
+    Policies without a switch profile mapping are not in the result.
+    """
+    entries = (session.query(nsx_models.QosPolicySwitchProfile).
+               filter(nsx_models.QosPolicySwitchProfile.qos_policy_id.in_(
+                   qos_policy_ids)).all())
+    return dict((entry.qos_policy_id, entry.switch_profile_id)
+                for entry in entries)
+
+
 def delete_qos_policy_profile_mapping(session, qos_policy_id):
     return (session.query(nsx_models.QosPolicySwitchProfile).
             filter_by(qos_policy_id=qos_policy_id).delete())
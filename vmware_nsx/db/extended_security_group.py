@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import uuidutils
 import sqlalchemy as sa
@@ -34,6 +37,7 @@ from neutron_lib.db import model_base
 from neutron_lib.utils import helpers
 from neutron_lib.utils import net as n_utils
 
+from vmware_nsx.db import db as nsx_db
 from vmware_nsx.extensions import providersecuritygroup as provider_sg
 from vmware_nsx.extensions import securitygrouplogging as sg_logging
 from vmware_nsx.extensions import securitygrouppolicy as sg_policy
@@ -59,9 +63,66 @@ class NsxExtendedSecurityGroupProperties(model_base.BASEV2):
                             uselist=False, cascade='delete'))
 
 
+class TenantSecurityGroupsCache(object):
+    """Cache of the default and provider security groups of tenants
+
+    Entries expire after ttl seconds, and are invalidated by the security
+    group create and delete notifications of this process.
+    """
+
+    def __init__(self, ttl):
+        self._ttl = ttl
+        self._default_sgs = {}
+        self._provider_sgs = {}
+
+    def _get(self, entries, tenant_id):
+        entry = entries.get(tenant_id)
+        if entry and entry[0] > time.time():
+            return entry[1]
+        entries.pop(tenant_id, None)
+
+    def get_default(self, tenant_id):
+        return self._get(self._default_sgs, tenant_id)
+
+    def set_default(self, tenant_id, sg_id):
+        self._default_sgs[tenant_id] = (time.time() + self._ttl, sg_id)
+
+    def get_provider(self, tenant_id):
+        sg_ids = self._get(self._provider_sgs, tenant_id)
+        if sg_ids is not None:
+            return list(sg_ids)
+
+    def set_provider(self, tenant_id, sg_ids):
+        self._provider_sgs[tenant_id] = (time.time() + self._ttl,
+                                         frozenset(sg_ids))
+
+    def invalidate_tenant(self, tenant_id):
+        self._default_sgs.pop(tenant_id, None)
+        self._provider_sgs.pop(tenant_id, None)
+
+    def invalidate_security_group(self, sg_id):
+        for tenant_id, entry in list(self._default_sgs.items()):
+            if entry[1] == sg_id:
+                self._default_sgs.pop(tenant_id, None)
+        for tenant_id, entry in list(self._provider_sgs.items()):
+            if sg_id in entry[1]:
+                self._provider_sgs.pop(tenant_id, None)
+
+    def security_group_callback(self, resource, event, trigger, **kwargs):
+        sg = kwargs.get('security_group')
+        if sg and sg.get('tenant_id'):
+            self.invalidate_tenant(sg['tenant_id'])
+        sg_id = kwargs.get('security_group_id') or (sg and sg.get('id'))
+        if sg_id:
+            self.invalidate_security_group(sg_id)
+
+
 @resource_extend.has_resource_extenders
 class ExtendedSecurityGroupPropertiesMixin(object):
 
+    # Set by _init_tenant_security_groups_cache when the cache is enabled
+    _tenant_sgs_cache = None
+
     # NOTE(arosen): here we add a relationship so that from the ports model
     # it provides us access to SecurityGroupPortBinding and
     # NsxExtendedSecurityGroupProperties
@@ -71,6 +132,16 @@ class ExtendedSecurityGroupPropertiesMixin(object):
         primaryjoin=("NsxExtendedSecurityGroupProperties.security_group_id"
                      "==SecurityGroupPortBinding.security_group_id"))
 
+    def _init_tenant_security_groups_cache(self):
+        ttl = cfg.CONF.tenant_security_groups_cache_ttl
+        if not ttl:
+            return
+        self._tenant_sgs_cache = TenantSecurityGroupsCache(ttl)
+        for event in (events.AFTER_CREATE, events.AFTER_DELETE):
+            registry.subscribe(
+                self._tenant_sgs_cache.security_group_callback,
+                resources.SECURITY_GROUP, event)
+
     def create_provider_security_group(self, context, security_group):
         return self.create_security_group_without_rules(
             context, security_group, False, True)
@@ -131,6 +202,8 @@ class ExtendedSecurityGroupPropertiesMixin(object):
         sg_res[sg_logging.LOGGING] = sg_req.get(sg_logging.LOGGING, False)
         sg_res[provider_sg.PROVIDER] = sg_req.get(provider_sg.PROVIDER, False)
         sg_res[sg_policy.POLICY] = sg_req.get(sg_policy.POLICY)
+        if self._tenant_sgs_cache and sg_res[provider_sg.PROVIDER]:
+            self._tenant_sgs_cache.invalidate_tenant(sg_res['tenant_id'])
 
     def _get_security_group_properties(self, context, security_group_id):
         with db_api.context_manager.reader.using(context):
@@ -199,9 +272,11 @@ class ExtendedSecurityGroupPropertiesMixin(object):
         list anyway, the result will be the same.
         """
         if validators.is_attr_set(port.get(ext_sg.SECURITYGROUPS)):
-            for sg in port.get(ext_sg.SECURITYGROUPS, []):
+            sgs = port.get(ext_sg.SECURITYGROUPS, [])
+            provider_sgs = self._get_provider_security_group_ids(context, sgs)
+            for sg in sgs:
                 # makes sure user doesn't add non-provider secgrp as secgrp
-                if self._is_provider_security_group(context, sg):
+                if sg in provider_sgs:
                     if only_warn:
                         LOG.warning(
                             "Ignored provider security group %(sg)s in "
@@ -217,13 +292,76 @@ class ExtendedSecurityGroupPropertiesMixin(object):
             for sg in port.get(provider_sg.PROVIDER_SECURITYGROUPS, []):
                 self._check_provider_security_group_exists(context, sg)
 
+    def _get_provider_security_group_ids(self, context, security_group_ids):
+        """Return the provider security groups out of the given ones
+
+        The properties of all the security groups are read with one query.
+        """
+        if not security_group_ids:
+            return set()
+        with db_api.context_manager.reader.using(context):
+            res = context.session.query(
+                NsxExtendedSecurityGroupProperties.security_group_id,
+                NsxExtendedSecurityGroupProperties.provider).filter(
+                NsxExtendedSecurityGroupProperties.security_group_id.in_(
+                    set(security_group_ids))).all()
+        found = dict(res)
+        for sg_id in security_group_ids:
+            if sg_id not in found:
+                raise ext_sg.SecurityGroupNotFound(id=sg_id)
+        return set(sg_id for sg_id, provider in found.items() if provider)
+
     def _get_tenant_provider_security_groups(self, context, tenant_id):
+        if self._tenant_sgs_cache:
+            sg_ids = self._tenant_sgs_cache.get_provider(tenant_id)
+            if sg_ids is not None:
+                return sg_ids
         res = context.session.query(
             NsxExtendedSecurityGroupProperties.security_group_id
         ).join(securitygroups_db.SecurityGroup).filter(
             securitygroups_db.SecurityGroup.tenant_id == tenant_id,
             NsxExtendedSecurityGroupProperties.provider == sa.true()).all()
-        return [r[0] for r in res]
+        sg_ids = [r[0] for r in res]
+        if self._tenant_sgs_cache:
+            # Do not cache security groups which may not be committed
+            nsx_db.call_after_commit(context.session,
+                                     self._tenant_sgs_cache.set_provider,
+                                     tenant_id, sg_ids)
+        return sg_ids
+
+    def _get_tenant_default_security_group(self, context, tenant_id):
+        """Return the id of the default security group of the tenant
+
+        The security group is created if it does not exist yet.
+        """
+        if self._tenant_sgs_cache:
+            sg_id = self._tenant_sgs_cache.get_default(tenant_id)
+            if sg_id:
+                return sg_id
+        sg_id = self._ensure_default_security_group(context, tenant_id)
+        if self._tenant_sgs_cache and sg_id:
+            # The security group may be created by this transaction, and
+            # must not be cached if it is rolled back
+            nsx_db.call_after_commit(context.session,
+                                     self._tenant_sgs_cache.set_default,
+                                     tenant_id, sg_id)
+        return sg_id
+
+    def _ensure_tenant_default_security_group_on_port(self, context, port):
+        """Set the default security group of the tenant on the port
+
+        Same as _ensure_default_security_group_on_port, using the cached
+        default security group of the tenant.
+        """
+        p = port['port']
+        if p.get('device_owner') and n_utils.is_port_trusted(p):
+            return
+        port_sg = p.get(ext_sg.SECURITYGROUPS)
+        if port_sg is None or not validators.is_attr_set(port_sg):
+            default_sg = self._get_tenant_default_security_group(
+                context, p.get('tenant_id'))
+            if default_sg:
+                p[ext_sg.SECURITYGROUPS] = [default_sg]
 
     def _validate_security_group_properties_create(self, context,
                                                    security_group, default_sg):
@@ -281,7 +419,7 @@ class ExtendedSecurityGroupPropertiesMixin(object):
         if not len(sgids) and had_sgs:
             # Add the default sg of the tenant if no other remained
             tenant_id = port_data.get('tenant_id')
-            default_sg = self._ensure_default_security_group(
+            default_sg = self._get_tenant_default_security_group(
                 context, tenant_id)
             sgids.append(default_sg)
 
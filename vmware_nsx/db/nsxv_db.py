@@ -336,6 +336,10 @@ def get_dhcp_static_bindings_by_edge(session, edge_id):
         edge_id=edge_id).all()
 
 
+def get_dhcp_static_bindings(session):
+    return session.query(nsxv_models.NsxvEdgeDhcpStaticBinding).all()
+
+
 def delete_edge_dhcp_static_binding(session, edge_id, mac_address):
     with session.begin(subtransactions=True):
         session.query(nsxv_models.NsxvEdgeDhcpStaticBinding).filter_by(
@@ -477,6 +481,10 @@ def get_nsx_section(session, neutron_id):
                   "stored in Neutron DB", neutron_id)
 
 
+def get_nsx_sections(session):
+    return session.query(nsxv_models.NsxvSecurityGroupSectionMapping).all()
+
+
 def delete_neutron_nsx_section_mapping(session, neutron_id):
     with session.begin(subtransactions=True):
         return (session.query(nsxv_models.NsxvSecurityGroupSectionMapping).
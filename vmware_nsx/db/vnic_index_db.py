@@ -13,9 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from sqlalchemy import sql
 from sqlalchemy.orm import exc
 
 from neutron.db import _resource_extend as resource_extend
+from neutron.db import models_v2
+from neutron.db.port_security import models as psec_models
 
 from neutron_lib.api.definitions import port as port_def
 
@@ -55,6 +58,24 @@ class VnicIndexDbMixin(object):
                     filter_by(device_id=device_id))
         return mappings
 
+    def _count_no_sec_vnic_ports_for_device_id(self, context, device_id,
+                                               device_owner):
+        """Count the ports of the device with a vnic and no port security
+
+        The count is done by the DB, using the device id index of the vnic
+        mappings, instead of reading all the ports of the device.
+        """
+        mapping = nsxv_models.NsxvPortIndexMapping
+        port = models_v2.Port
+        psec_binding = psec_models.PortSecurityBinding
+        query = (context.session.query(mapping).
+                 join(port, port.id == mapping.port_id).
+                 join(psec_binding, psec_binding.port_id == mapping.port_id).
+                 filter(mapping.device_id == device_id,
+                        port.device_owner == device_owner,
+                        psec_binding.port_security_enabled == sql.false()))
+        return query.count()
+
     def _create_port_vnic_index_mapping(self, context, port_id,
                                         device_id, index):
         """Save the port vnic-index to DB."""
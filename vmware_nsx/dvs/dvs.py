@@ -12,6 +12,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
+import eventlet
 from neutron_lib import exceptions
 from oslo_log import log as logging
 from oslo_utils import excutils
@@ -84,6 +87,9 @@ class VCManagerBase(object):
         NOTE: the DVS port group name will be the Neutron network UUID.
         """
         self._session = dvs_utils.dvs_create_session()
+        # Limit the number of concurrent reconfiguration tasks on the VC
+        self._task_semaphore = eventlet.semaphore.Semaphore(
+            dvs_utils.dvs_max_concurrent_tasks_get())
 
     def get_vc_session(self):
         return self._session
@@ -290,14 +296,15 @@ class DvsManager(VCManagerBase):
         spec_update_calback(new_spec, spec_update_data)
 
         # Update the port group configuration
-        task = self._session.invoke_api(self._session.vim,
-                                        'ReconfigureDVPortgroup_Task',
-                                        pg_moref, spec=new_spec)
-        try:
-            self._session.wait_for_task(task)
-        except Exception:
-            LOG.error('Failed to reconfigure DVPortGroup %s', pg_moref)
-            raise nsx_exc.DvsNotFound(dvs=pg_moref)
+        with self._task_semaphore:
+            task = self._session.invoke_api(self._session.vim,
+                                            'ReconfigureDVPortgroup_Task',
+                                            pg_moref, spec=new_spec)
+            try:
+                self._session.wait_for_task(task)
+            except Exception:
+                LOG.error('Failed to reconfigure DVPortGroup %s', pg_moref)
+                raise nsx_exc.DvsNotFound(dvs=pg_moref)
 
     # Update the dvs port groups config for a vxlan/vlan network
     # update the spec using a callback and user data
@@ -434,6 +441,12 @@ class DvsManager(VCManagerBase):
 class VMManager(VCManagerBase):
     """Management class for VMs related VC tasks."""
 
+    def __init__(self):
+        super(VMManager, self).__init__()
+        # LRU cache of the VM morefs by instance uuid
+        self._vm_morefs = collections.OrderedDict()
+        self._vm_morefs_size = dvs_utils.dvs_vm_moref_cache_size_get()
+
     def get_vm_moref_obj(self, instance_uuid):
         """Get reference to the VM.
         The method will make use of FindAllByUuid to get the VM reference.
@@ -451,12 +464,32 @@ class VMManager(VCManagerBase):
         if vm_refs:
             return vm_refs[0]
 
-    def get_vm_moref(self, instance_uuid):
+    def get_vm_moref(self, instance_uuid, use_cache=True):
         """Get reference to the VM.
+
+        The moref is taken from the cache, unless use_cache is False or the
+        VM was not found in it, in which case it is looked up on the VC.
         """
+        if use_cache:
+            vm_moref = self._vm_morefs.pop(instance_uuid, None)
+            if vm_moref:
+                # Move the VM to the end of the LRU order
+                self._vm_morefs[instance_uuid] = vm_moref
+                return vm_moref
         vm_ref = self.get_vm_moref_obj(instance_uuid)
-        if vm_ref:
-            return vm_ref.value
+        if not vm_ref:
+            self.invalidate_vm_moref(instance_uuid)
+            return
+        if self._vm_morefs_size:
+            self._vm_morefs.pop(instance_uuid, None)
+            self._vm_morefs[instance_uuid] = vm_ref.value
+            while len(self._vm_morefs) > self._vm_morefs_size:
+                self._vm_morefs.popitem(last=False)
+        return vm_ref.value
+
+    def invalidate_vm_moref(self, instance_uuid):
+        """Remove the VM from the moref cache."""
+        self._vm_morefs.pop(instance_uuid, None)
 
     def get_vm_spec(self, vm_moref):
         vm_specs = self._session.invoke_api(vim_util,
@@ -466,16 +499,15 @@ class VMManager(VCManagerBase):
         if vm_specs:
             return vm_specs[0]
 
-    def _build_vm_spec_attach(self, neutron_port_id, port_mac,
-                              nsx_net_id, device_type):
+    def _build_vm_device_attach(self, neutron_port_id, port_mac,
+                                nsx_net_id, device_type, key=-47):
         # Code inspired by nova: _create_vif_spec
         client_factory = self._session.vim.client.factory
-        vm_spec = client_factory.create('ns0:VirtualMachineConfigSpec')
         device_change = client_factory.create('ns0:VirtualDeviceConfigSpec')
         device_change.operation = "add"
 
         net_device = client_factory.create('ns0:' + device_type)
-        net_device.key = -47
+        net_device.key = key
         net_device.addressType = "manual"
         # configure the neutron port id and mac
         net_device.externalId = neutron_port_id
@@ -498,8 +530,14 @@ class VMManager(VCManagerBase):
         net_device.connectable = connectable_spec
 
         device_change.device = net_device
-        vm_spec.deviceChange = [device_change]
+        return device_change
 
+    def _build_vm_spec_attach(self, neutron_port_id, port_mac,
+                              nsx_net_id, device_type):
+        client_factory = self._session.vim.client.factory
+        vm_spec = client_factory.create('ns0:VirtualMachineConfigSpec')
+        vm_spec.deviceChange = [self._build_vm_device_attach(
+            neutron_port_id, port_mac, nsx_net_id, device_type)]
         return vm_spec
 
     def attach_vm_interface(self, vm_moref, neutron_port_id,
@@ -519,16 +557,20 @@ class VMManager(VCManagerBase):
             LOG.error("Failed to reconfigure VM %(moref)s spec: %(e)s",
                       {'moref': vm_moref.value, 'e': e})
 
-    def _build_vm_spec_detach(self, device):
-        """Builds the vif detach config spec."""
+    def _build_vm_device_detach(self, device):
         # Code inspired by nova: get_network_detach_config_spec
         client_factory = self._session.vim.client.factory
-        config_spec = client_factory.create('ns0:VirtualMachineConfigSpec')
         virtual_device_config = client_factory.create(
                                 'ns0:VirtualDeviceConfigSpec')
         virtual_device_config.operation = "remove"
         virtual_device_config.device = device
-        config_spec.deviceChange = [virtual_device_config]
+        return virtual_device_config
+
+    def _build_vm_spec_detach(self, device):
+        """Builds the vif detach config spec."""
+        client_factory = self._session.vim.client.factory
+        config_spec = client_factory.create('ns0:VirtualMachineConfigSpec')
+        config_spec.deviceChange = [self._build_vm_device_detach(device)]
         return config_spec
 
     def detach_vm_interface(self, vm_moref, device):
@@ -545,6 +587,31 @@ class VMManager(VCManagerBase):
             LOG.error("Failed to reconfigure vm moref %(moref)s: %(e)s",
                       {'moref': vm_moref.value, 'e': e})
 
+    def replace_vm_interfaces(self, vm_moref, devices, interfaces):
+        """Replace VM interfaces with a single reconfiguration task.
+
+        The network devices in 'devices' are detached from the VM, and the
+        interfaces, given as (neutron port id, mac, nsx net id, device type)
+        tuples, are attached to it as OpaqueNetwork interfaces.
+        An exception is raised if the VM reconfiguration failed.
+        """
+        client_factory = self._session.vim.client.factory
+        new_spec = client_factory.create('ns0:VirtualMachineConfigSpec')
+        device_changes = [self._build_vm_device_detach(device)
+                          for device in devices]
+        # New devices in the same spec need distinct temporary keys
+        for index, interface in enumerate(interfaces):
+            device_changes.append(self._build_vm_device_attach(
+                *interface, key=-47 - index))
+        new_spec.deviceChange = device_changes
+        task = self._session.invoke_api(self._session.vim,
+                                        'ReconfigVM_Task',
+                                        vm_moref,
+                                        spec=new_spec)
+        self._session.wait_for_task(task)
+        LOG.info("Updated VM %(moref)s spec - replaced %(count)s interfaces",
+                 {'moref': vm_moref.value, 'count': len(interfaces)})
+
     def get_vm_interfaces_info(self, vm_moref):
         hardware_devices = self._session.invoke_api(vim_util,
                                                     "get_object_property",
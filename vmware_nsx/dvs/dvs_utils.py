@@ -47,6 +47,14 @@ dvs_opts = [
                     'socket error, etc.'),
     cfg.StrOpt('dvs_name',
                help='The name of the preconfigured DVS.'),
+    cfg.IntOpt('max_concurrent_tasks',
+               default=10, min=1,
+               help='The maximal number of port group reconfiguration '
+                    'tasks that may run concurrently on the vCenter.'),
+    cfg.IntOpt('vm_moref_cache_size',
+               default=1000, min=0,
+               help='The maximal number of VM instance uuid to moref '
+                    'lookups to cache. 0 disables the cache.'),
     cfg.StrOpt('metadata_mode',
                help=_("This value should not be set. It is just required for "
                       "ensuring that the DVS plugin works with the generic "
@@ -76,3 +84,11 @@ def dvs_create_session():
 
 def dvs_name_get():
     return CONF.dvs.dvs_name
+
+
+def dvs_max_concurrent_tasks_get():
+    return CONF.dvs.max_concurrent_tasks
+
+
+def dvs_vm_moref_cache_size_get():
+    return CONF.dvs.vm_moref_cache_size
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
 import uuid
 
 from neutron_lib.api.definitions import port_security as psec
@@ -214,7 +215,9 @@ class NsxPluginV2(addr_pair_db.AllowedAddressPairsMixin,
             self.nsx_sync_opts.state_sync_interval,
             self.nsx_sync_opts.min_sync_req_delay,
             self.nsx_sync_opts.min_chunk_size,
-            self.nsx_sync_opts.max_random_sync_delay)
+            self.nsx_sync_opts.max_random_sync_delay,
+            status_cache_ttl=self.nsx_sync_opts.status_cache_ttl)
+        self._sg_rules_cache = sg_utils.SecurityProfileRulesCache()
 
     def _ensure_default_network_gateway(self):
         if self._is_default_net_gw_in_sync:
@@ -1037,16 +1040,20 @@ class NsxPluginV2(addr_pair_db.AllowedAddressPairsMixin,
         with db_api.context_manager.writer.using(context):
             # goto to the plugin DB and fetch the network
             network = self._get_network(context, id)
+            status = None
             if (self.nsx_sync_opts.always_read_status or
                 fields and 'status' in fields):
                 # External networks are not backed by nsx lswitches
                 if not network.external:
                     # Perform explicit state synchronization
-                    self._synchronizer.synchronize_network(context, network)
+                    status = self._synchronizer.read_network_status(
+                        context, network)
             # Don't do field selection here otherwise we won't be able
             # to add provider networks fields
             net_result = self._make_network_dict(network,
                                                  context=context)
+            if status:
+                net_result['status'] = status
             self._extend_network_dict_provider(context, net_result)
         return db_utils.resource_fields(net_result, fields)
 
@@ -1377,12 +1384,36 @@ class NsxPluginV2(addr_pair_db.AllowedAddressPairsMixin,
                 fields and 'status' in fields):
                 # Perform explicit state synchronization
                 db_port = self._get_port(context, id)
-                self._synchronizer.synchronize_port(
+                status = self._synchronizer.read_port_status(
                     context, db_port)
-                return self._make_port_dict(db_port, fields)
+                port = self._make_port_dict(db_port, fields)
+                if status and 'status' in port:
+                    port['status'] = status
+                return port
             else:
                 return super(NsxPluginV2, self).get_port(context, id, fields)
 
+    def get_ports(self, context, filters=None, fields=None,
+                  sorts=None, limit=None, marker=None,
+                  page_reverse=False):
+        # Listed ports are synchronized only when their status can be cached,
+        # as otherwise every list operation would query NSX
+        if not (self.nsx_sync_opts.always_read_status and
+                self.nsx_sync_opts.status_cache_ttl and
+                (not fields or 'status' in fields)):
+            return super(NsxPluginV2, self).get_ports(
+                context, filters, fields, sorts,
+                limit, marker, page_reverse)
+        # The port id and network are needed for the synchronization
+        ports = super(NsxPluginV2, self).get_ports(
+            context, filters, None, sorts,
+            limit, marker, page_reverse)
+        # Perform explicit state synchronization for the ports without a
+        # cached status, out of any DB transaction as this calls NSX
+        self._synchronizer.read_ports_status(context, ports)
+        return (ports if not fields else
+                [db_utils.resource_fields(port, fields) for port in ports])
+
     def get_router(self, context, id, fields=None):
         with db_api.context_manager.writer.using(context):
             if (self.nsx_sync_opts.always_read_status or
@@ -2414,6 +2445,7 @@ class NsxPluginV2(addr_pair_db.AllowedAddressPairsMixin,
                 raise ext_sg.SecurityGroupInUse(id=security_group['id'])
             nsx_sec_profile_id = nsx_utils.get_nsx_security_group_id(
                 context.session, self.cluster, security_group_id)
+            self._sg_rules_cache.invalidate(security_group_id)
 
             try:
                 secgrouplib.delete_security_profile(
@@ -2467,6 +2499,9 @@ class NsxPluginV2(addr_pair_db.AllowedAddressPairsMixin,
 
         :param security_group_rule: list of rules to create
         """
+        if self.nsx_opts.cache_security_profile_rules:
+            return self._create_security_group_rule_bulk_cached(
+                context, security_group_rules)
         s = security_group_rules.get('security_group_rules')
 
         # TODO(arosen) is there anyway we could avoid having the update of
@@ -2497,10 +2532,94 @@ class NsxPluginV2(addr_pair_db.AllowedAddressPairsMixin,
                 NsxPluginV2, self).create_security_group_rule_bulk_native(
                     context, security_group_rules)
 
+    def _get_security_group_rule_ids(self, context, security_group_id):
+        query = context.session.query(
+            securitygroup_model.SecurityGroupRule.id).filter_by(
+                security_group_id=security_group_id)
+        return [rule.id for rule in query]
+
+    def _create_security_group_rule_bulk_cached(self, context,
+                                                security_group_rules):
+        """Create security group rules and push them as a delta.
+
+        The NSX rule set of the security profile is taken from the cache
+        when still valid and the new rules are appended to it. The backend
+        is updated once the rules are committed in the DB; should this
+        fail the new rules are removed from the DB.
+        """
+        s = security_group_rules.get('security_group_rules')
+        security_group_id = self._validate_security_group_rules(
+            context, security_group_rules)
+        with lockutils.lock('nsx-sg-rules-%s' % security_group_id):
+            with db_api.context_manager.writer.using(context):
+                # Check to make sure security group exists
+                security_group = super(NsxPluginV2, self).get_security_group(
+                    context, security_group_id)
+                if not security_group:
+                    raise ext_sg.SecurityGroupNotFound(id=security_group_id)
+                # Check for duplicate rules
+                self._check_for_duplicate_rules(context, s)
+                rule_ids = self._get_security_group_rule_ids(
+                    context, security_group_id)
+                current_rules = self._sg_rules_cache.get(
+                    security_group_id, rule_ids)
+                if current_rules is None:
+                    existing_rules = self.get_security_group_rules(
+                        context, {'security_group_id': [security_group_id]})
+                    current_rules = (
+                        sg_utils.get_security_group_rules_nsx_format(
+                            context.session, self.cluster, existing_rules))
+                nsx_sec_profile_id = nsx_utils.get_nsx_security_group_id(
+                    context.session, self.cluster, security_group_id)
+                rules = super(
+                    NsxPluginV2, self).create_security_group_rule_bulk_native(
+                        context, security_group_rules)
+                new_rules = sg_utils.get_security_group_rules_nsx_format(
+                    context.session, self.cluster, rules)
+            combined_rules = sg_utils.merge_nsx_rules(current_rules,
+                                                      new_rules)
+            try:
+                # update_security_group_rules alters the rules it is given
+                secgrouplib.update_security_group_rules(
+                    self.cluster, nsx_sec_profile_id,
+                    copy.deepcopy(combined_rules))
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    LOG.error("Unable to update NSX security profile %(id)s "
+                              "with new rules for security group %(sg)s. "
+                              "Removing them from the DB",
+                              {'id': nsx_sec_profile_id,
+                               'sg': security_group_id})
+                    self._sg_rules_cache.invalidate(security_group_id)
+                    for rule in rules:
+                        try:
+                            super(NsxPluginV2,
+                                  self).delete_security_group_rule(
+                                      context, rule['id'])
+                        except Exception:
+                            LOG.exception("Failed to remove security group "
+                                          "rule %s from the DB", rule['id'])
+            self._sg_rules_cache.set(
+                security_group_id,
+                rule_ids + [rule['id'] for rule in rules],
+                combined_rules)
+            return rules
+
     def delete_security_group_rule(self, context, sgrid):
         """Delete a security group rule
         :param sgrid: security group id to remove.
         """
+        if not self.nsx_opts.cache_security_profile_rules:
+            return self._delete_security_group_rule(context, sgrid)
+        sgid = super(NsxPluginV2, self).get_security_group_rule(
+            context, sgrid)['security_group_id']
+        # Serialize with rule creation so that the rule set pushed by a
+        # concurrent creation does not resurrect the deleted rule
+        with lockutils.lock('nsx-sg-rules-%s' % sgid):
+            self._sg_rules_cache.invalidate(sgid)
+            return self._delete_security_group_rule(context, sgrid)
+
+    def _delete_security_group_rule(self, context, sgrid):
         with db_api.context_manager.writer.using(context):
             # determine security profile id
             security_group_rule = (
@@ -17,6 +17,7 @@ from distutils import version
 import six
 import uuid
 
+import eventlet
 import netaddr
 from neutron_lib.api.definitions import network as net_def
 from neutron_lib.api.definitions import port as port_def
@@ -36,6 +37,7 @@ from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import excutils
 from oslo_utils import netutils
+from oslo_utils import timeutils
 from oslo_utils import uuidutils
 from sqlalchemy.orm import exc as sa_exc
 
@@ -140,6 +142,8 @@ LOG = logging.getLogger(__name__)
 PORTGROUP_PREFIX = 'dvportgroup'
 ROUTER_SIZE = routersize.ROUTER_SIZE
 VALID_EDGE_SIZES = routersize.VALID_EDGE_SIZES
+# Number of DFW sections updated concurrently by the logging re-sync
+SG_LOGGING_UPDATE_THREADS = 5
 
 
 @resource_extend.has_resource_extenders
@@ -213,6 +217,7 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
         registry.subscribe(self.init_complete,
                            resources.PROCESS,
                            events.AFTER_INIT)
+        self._init_tenant_security_groups_cache()
         self._extension_manager.initialize()
         self.supported_extension_aliases.extend(
             self._extension_manager.extension_aliases())
@@ -231,17 +236,13 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
         self.nsx_v = vcns_driver.VcnsDriver(_nsx_v_callbacks)
         # Use the existing class instead of creating a new instance
         self.lbv2_driver = self.nsx_v
-        # Ensure that edges do concurrency
-        self._ensure_lock_operations()
-        # Configure aggregate publishing
-        self._aggregate_publishing()
-        # Configure edge reservations
-        self._configure_reservations()
-        self.edge_manager = edge_utils.EdgeManager(self.nsx_v, self)
         self.nsx_sg_utils = securitygroup_utils.NsxSecurityGroupUtils(
             self.nsx_v)
+        self._sg_membership = securitygroup_utils.NsxSecurityGroupMembership(
+            self.nsx_v.vcns)
         self.init_availability_zones()
-        self._validate_config()
+        # The independent backend initialization stages run concurrently
+        c_utils.run_init_stages(self._get_init_stages())
 
         self._use_nsx_policies = False
         if cfg.CONF.nsxv.use_nsx_policies:
@@ -266,9 +267,6 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
             else:
                 LOG.warning("Transparent support only from "
                             "NSX 6.3 onwards")
-        self.sg_container_id = self._create_security_group_container()
-        self.default_section = self._create_cluster_default_fw_section()
-        self._process_security_groups_rules_logging()
 
         self._router_managers = managers.RouterTypeManager(self)
 
@@ -295,6 +293,42 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
         # Bind QoS notifications
         qos_driver.register(self)
 
+    def _init_edge_manager(self):
+        self.edge_manager = edge_utils.EdgeManager(self.nsx_v, self)
+
+    def _init_security_group_container(self):
+        self.sg_container_id = self._create_security_group_container()
+
+    def _init_cluster_default_fw_section(self):
+        self.default_section = self._create_cluster_default_fw_section()
+
+    def _get_init_stages(self):
+        """Return the backend initialization stages and their dependencies
+        """
+        return [
+            # The version is cached for all the stages using it
+            ('version', self.nsx_v.vcns.get_version, []),
+            # Ensure that edges do concurrency
+            ('lock_operations', self._ensure_lock_operations, []),
+            ('aggregate_publishing', self._aggregate_publishing, []),
+            ('edge_reservations', self._configure_reservations,
+             ['version']),
+            ('config_validation', self._validate_config, ['version']),
+            # The stages below create backend objects, so they run only
+            # with a valid configuration
+            # Checks the backup edge pools
+            ('edge_manager', self._init_edge_manager,
+             ['version', 'lock_operations', 'config_validation']),
+            ('security_group_container',
+             self._init_security_group_container, ['config_validation']),
+            ('cluster_default_fw_section',
+             self._init_cluster_default_fw_section,
+             ['config_validation', 'security_group_container']),
+            ('security_groups_logging',
+             self._process_security_groups_rules_logging,
+             ['config_validation', 'cluster_default_fw_section']),
+        ]
+
     def init_complete(self, resource, event, trigger, **kwargs):
         has_metadata_cfg = (
             cfg.CONF.nsxv.nova_metadata_ips
@@ -302,14 +336,20 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
             and cfg.CONF.nsxv.mgt_net_proxy_ips
             and cfg.CONF.nsxv.mgt_net_proxy_netmask)
         if has_metadata_cfg:
-            # Init md_proxy handler per availability zone
+            # Init md_proxy handler per availability zone.
+            # The handlers are not created concurrently as their init is
+            # serialized by a lock shared by all the neutron servers.
             self.metadata_proxy_handler = {}
-            for az in self.get_azs_list():
-                # create metadata handler only if the az supports it.
-                # if not, the global one will be used
-                if az.supports_metadata():
-                    self.metadata_proxy_handler[az.name] = (
-                        nsx_v_md_proxy.NsxVMetadataProxyHandler(self, az))
+            with timeutils.StopWatch() as watch:
+                for az in self.get_azs_list():
+                    # create metadata handler only if the az supports it.
+                    # if not, the global one will be used
+                    if az.supports_metadata():
+                        self.metadata_proxy_handler[az.name] = (
+                            nsx_v_md_proxy.NsxVMetadataProxyHandler(
+                                self, az))
+            LOG.info("Init stage metadata_proxy completed in %.2f seconds",
+                     watch.elapsed())
 
         self.init_is_complete = True
 
@@ -512,6 +552,79 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
                 section_id = self.nsx_sg_utils.parse_and_get_section_id(c)
         return section_id
 
+    def _get_sections_to_update_logging(self, context, log_allowed):
+        """Return the DFW sections of security groups to update logging
+
+        The whole DFW configuration is read once, and the rules 'logged'
+        option is compared in memory. Return a list of (security group id,
+        section uri, updated section) for the sections that differ.
+        """
+        sections_uris = dict(
+            (mapping['neutron_id'], mapping['ip_section_id'])
+            for mapping in nsxv_db.get_nsx_sections(context.session))
+        h, dfw_config = self.nsx_v.vcns.get_dfw_config()
+        nsx_sections = dict(
+            (section.attrib.get('id'), section)
+            for section in c_utils.normalize_xml(dfw_config).iter('section'))
+
+        sections = []
+        # If the section/sg is already logged, then no action is
+        # required.
+        for sg in [sg for sg in self.get_security_groups(context)
+                   if sg[sg_logging.LOGGING] is False]:
+            if sg.get(sg_policy.POLICY):
+                # Logging is not relevant with a policy
+                continue
+
+            section_uri = sections_uris.get(sg['id'])
+            if section_uri is None:
+                continue
+            section = nsx_sections.get(section_uri.split('/')[-1])
+            if section is None:
+                LOG.warning('Section of security group %s not found on the '
+                            'NSX', sg['id'])
+                continue
+
+            # Section/sg is not logged, update rules logging according
+            # to the 'log_security_groups_allowed_traffic' config
+            # option.
+            if self.nsx_sg_utils.set_rules_logged_option(section,
+                                                         log_allowed):
+                sections.append((sg['id'], section_uri, section))
+        return sections
+
+    def _update_section_logging(self, sg_id, section_uri, section,
+                                log_allowed):
+        try:
+            # The generation number of the section read from the DFW
+            # configuration is its etag, so that a section changed
+            # since then is not overwritten
+            etag = section.attrib.get('generationNumber')
+            if etag is not None:
+                try:
+                    self.nsx_v.vcns.update_section(
+                        section_uri,
+                        self.nsx_sg_utils.to_xml_string(section),
+                        {'etag': etag})
+                    return
+                except vsh_exc.VcnsApiException as e:
+                    if e.status != 412:
+                        raise
+                    LOG.debug('Section %s was changed since the DFW '
+                              'configuration was read', section_uri)
+            # Re-read the section and update it with its current etag
+            h, c = self.nsx_v.vcns.get_section(section_uri)
+            section = self.nsx_sg_utils.parse_section(c)
+            if self.nsx_sg_utils.set_rules_logged_option(section,
+                                                         log_allowed):
+                self.nsx_v.vcns.update_section(
+                    section_uri, self.nsx_sg_utils.to_xml_string(section),
+                    h)
+        except Exception as exc:
+            LOG.error('Unable to update security group %(sg)s '
+                      'section for logging. %(e)s',
+                      {'e': exc, 'sg': sg_id})
+
     def _process_security_groups_rules_logging(self):
 
         def process_security_groups_rules_logging(*args, **kwargs):
@@ -519,37 +632,20 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
                                               lock_file_prefix='dfw-section'):
                 context = n_context.get_admin_context()
                 log_allowed = cfg.CONF.nsxv.log_security_groups_allowed_traffic
-
-                # If the section/sg is already logged, then no action is
-                # required.
-                for sg in [sg for sg in self.get_security_groups(context)
-                           if sg[sg_logging.LOGGING] is False]:
-                    if sg.get(sg_policy.POLICY):
-                        # Logging is not relevant with a policy
-                        continue
-
-                    section_uri = self._get_section_uri(context.session,
-                                                        sg['id'])
-                    if section_uri is None:
-                        continue
-
-                    # Section/sg is not logged, update rules logging according
-                    # to the 'log_security_groups_allowed_traffic' config
-                    # option.
-                    try:
-                        h, c = self.nsx_v.vcns.get_section(section_uri)
-                        section = self.nsx_sg_utils.parse_section(c)
-                        section_needs_update = (
-                            self.nsx_sg_utils.set_rules_logged_option(
-                                section, log_allowed))
-                        if section_needs_update:
-                            self.nsx_v.vcns.update_section(
-                                section_uri,
-                                self.nsx_sg_utils.to_xml_string(section), h)
-                    except Exception as exc:
-                        LOG.error('Unable to update security group %(sg)s '
-                                  'section for logging. %(e)s',
-                                  {'e': exc, 'sg': sg['id']})
+                try:
+                    sections = self._get_sections_to_update_logging(
+                        context, log_allowed)
+                except Exception as exc:
+                    LOG.error('Unable to read the DFW configuration for '
+                              'security groups logging. %s', exc)
+                    return
+                LOG.info('Updating the logging of %s security groups '
+                         'sections', len(sections))
+                pool = eventlet.GreenPool(SG_LOGGING_UPDATE_THREADS)
+                for sg_id, section_uri, section in sections:
+                    pool.spawn_n(self._update_section_logging, sg_id,
+                                 section_uri, section, log_allowed)
+                pool.waitall()
 
         c_utils.spawn_n(process_security_groups_rules_logging)
 
@@ -901,53 +997,59 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
             dvs.strip() for dvs in physical_network.split(',') if dvs))
 
     def _add_member_to_security_group(self, sg_id, vnic_id):
-        with locking.LockManager.get_lock('neutron-security-ops' + str(sg_id)):
-            try:
-                self.nsx_v.vcns.add_member_to_security_group(
-                    sg_id, vnic_id)
-                LOG.info("Added %(sg_id)s member to NSX security "
-                         "group %(vnic_id)s",
-                         {'sg_id': sg_id, 'vnic_id': vnic_id})
-            except Exception:
-                with excutils.save_and_reraise_exception():
-                    LOG.error("NSX security group %(sg_id)s member add "
-                              "failed %(vnic_id)s.",
-                              {'sg_id': sg_id,
-                               'vnic_id': vnic_id})
+        # Concurrent membership changes of the same security group are
+        # aggregated into bulk updates
+        try:
+            self._sg_membership.add_member(sg_id, vnic_id)
+            LOG.info("Added %(sg_id)s member to NSX security "
+                     "group %(vnic_id)s",
+                     {'sg_id': sg_id, 'vnic_id': vnic_id})
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                LOG.error("NSX security group %(sg_id)s member add "
+                          "failed %(vnic_id)s.",
+                          {'sg_id': sg_id,
+                           'vnic_id': vnic_id})
+
+    def _get_nsx_security_group_ids(self, session, sgids):
+        """Return a dict of the NSX ids of the security groups
+
+        The ids of all the security groups are read with a single query.
+        """
+        if not sgids:
+            return {}
+        nsx_sg_ids = nsx_db.get_nsx_security_group_ids_by_neutron_ids(
+            session, list(sgids))
+        for sgid in sgids:
+            if sgid not in nsx_sg_ids:
+                LOG.warning("NSX security group not found for %s", sgid)
+        return nsx_sg_ids
 
     def _add_security_groups_port_mapping(self, session, vnic_id,
                                           added_sgids):
         if vnic_id is None or added_sgids is None:
             return
-        for add_sg in added_sgids:
-            nsx_sg_id = nsx_db.get_nsx_security_group_id(session, add_sg)
-            if nsx_sg_id is None:
-                LOG.warning("NSX security group not found for %s", add_sg)
-            else:
-                self._add_member_to_security_group(nsx_sg_id, vnic_id)
+        nsx_sg_ids = self._get_nsx_security_group_ids(session, added_sgids)
+        for nsx_sg_id in nsx_sg_ids.values():
+            self._add_member_to_security_group(nsx_sg_id, vnic_id)
 
     def _remove_member_from_security_group(self, sg_id, vnic_id):
-        with locking.LockManager.get_lock('neutron-security-ops' + str(sg_id)):
-            try:
-                h, c = self.nsx_v.vcns.remove_member_from_security_group(
-                    sg_id, vnic_id)
-            except Exception:
-                LOG.debug("NSX security group %(nsx_sg_id)s member "
-                          "delete failed %(vnic_id)s",
-                          {'nsx_sg_id': sg_id,
-                           'vnic_id': vnic_id})
+        try:
+            self._sg_membership.remove_member(sg_id, vnic_id)
+        except Exception:
+            LOG.debug("NSX security group %(nsx_sg_id)s member "
+                      "delete failed %(vnic_id)s",
+                      {'nsx_sg_id': sg_id,
+                       'vnic_id': vnic_id})
 
     def _delete_security_groups_port_mapping(self, session, vnic_id,
                                              deleted_sgids):
         if vnic_id is None or deleted_sgids is None:
             return
         # Remove vnic from delete security groups binding
-        for del_sg in deleted_sgids:
-            nsx_sg_id = nsx_db.get_nsx_security_group_id(session, del_sg)
-            if nsx_sg_id is None:
-                LOG.warning("NSX security group not found for %s", del_sg)
-            else:
-                self._remove_member_from_security_group(nsx_sg_id, vnic_id)
+        nsx_sg_ids = self._get_nsx_security_group_ids(session, deleted_sgids)
+        for nsx_sg_id in nsx_sg_ids.values():
+            self._remove_member_from_security_group(nsx_sg_id, vnic_id)
 
     def _update_security_groups_port_mapping(self, session, port_id,
                                              vnic_id, current_sgids,
@@ -969,10 +1071,16 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
             if new_sg not in current_sgids:
                 added_sgids.add(new_sg)
 
-        self._delete_security_groups_port_mapping(session, vnic_id,
-                                                  deleted_sgids)
-        self._add_security_groups_port_mapping(session, vnic_id,
-                                               added_sgids)
+        # Resolve the NSX ids of all the changed security groups at once
+        nsx_sg_ids = self._get_nsx_security_group_ids(
+            session, deleted_sgids | added_sgids)
+        for sgid in deleted_sgids:
+            if sgid in nsx_sg_ids:
+                self._remove_member_from_security_group(nsx_sg_ids[sgid],
+                                                        vnic_id)
+        for sgid in added_sgids:
+            if sgid in nsx_sg_ids:
+                self._add_member_to_security_group(nsx_sg_ids[sgid], vnic_id)
 
     def _get_port_vnic_id(self, port_index, device_id):
         # The vnic-id format which is expected by NSXv
@@ -1267,11 +1375,8 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
                 net_data['id'],
                 net_data[qos_consts.QOS_POLICY_ID])
 
-    def _update_qos_on_backend_network(self, context, net_id, qos_policy_id):
-        # Translate the QoS rule data into Nsx values
-        qos_data = qos_utils.NsxVQosRule(
-            context=context, qos_policy_id=qos_policy_id)
-
+    def _get_qos_backend_network_mappings(self, context, net_id):
+        """Return the (dvs id, network moref) pairs of a network"""
         # default dvs for this network
         az = self.get_network_az_by_net_id(context, net_id)
         az_dvs_id = az.dvs_id
@@ -1279,12 +1384,25 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
         # get the network moref/s from the db
         net_mappings = nsx_db.get_nsx_network_mappings(
             context.session, net_id)
-        for mapping in net_mappings:
-            # update the qos restrictions of the network
-            self._vcm.update_port_groups_config(
-                mapping.dvs_id or az_dvs_id,
-                net_id, mapping.nsx_id,
-                self._vcm.update_port_group_spec_qos, qos_data)
+        return [(mapping.dvs_id or az_dvs_id, mapping.nsx_id)
+                for mapping in net_mappings]
+
+    def _update_qos_on_backend_port_group(self, net_id, dvs_id, net_moref,
+                                          qos_data):
+        # update the qos restrictions of the network
+        self._vcm.update_port_groups_config(
+            dvs_id, net_id, net_moref,
+            self._vcm.update_port_group_spec_qos, qos_data)
+
+    def _update_qos_on_backend_network(self, context, net_id, qos_policy_id):
+        # Translate the QoS rule data into Nsx values
+        qos_data = qos_utils.NsxVQosRule(
+            context=context, qos_policy_id=qos_policy_id)
+
+        for dvs_id, net_moref in self._get_qos_backend_network_mappings(
+                context, net_id):
+            self._update_qos_on_backend_port_group(
+                net_id, dvs_id, net_moref, qos_data)
 
     def _cleanup_dhcp_edge_before_deletion(self, context, net_id):
         if self.metadata_proxy_handler:
@@ -1734,7 +1852,8 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
 
             # security group extension checks
             if has_ip:
-                self._ensure_default_security_group_on_port(context, port)
+                self._ensure_tenant_default_security_group_on_port(context,
+                                                                   port)
             elif (has_security_groups or provider_sg_specified):
                 raise psec_exc.PortSecurityAndIPRequiredForSecurityGroups()
             else:
@@ -1803,12 +1922,28 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
         there are, so we can decide on adding / removing the device from
         the exclusion list
         """
-        filters = {'device_id': [device_id],
-                   'device_owner': ['compute:None']}
-        ports = self.get_ports(context.elevated(), filters=filters)
-        return len([p for p in ports
-            if validators.is_attr_set(p.get(ext_vnic_idx.VNIC_INDEX))
-            and not p[psec.PORTSECURITY]])
+        return self._count_no_sec_vnic_ports_for_device_id(
+            context.elevated(), device_id, 'compute:None')
+
+    def _update_vm_exclude_list(self, device_id, vm_moref, update_func):
+        """Update the exclude list with the (possibly cached) VM moref
+
+        If the update fails, the moref is validated against the VC, and the
+        update is retried if the moref of the VM changed.
+        """
+        try:
+            update_func(vm_moref)
+        except vsh_exc.RequestBad:
+            with excutils.save_and_reraise_exception() as ctxt:
+                new_moref = self._vcm.get_vm_moref(device_id,
+                                                   use_cache=False)
+                if new_moref is not None and new_moref != vm_moref:
+                    ctxt.reraise = False
+        else:
+            return
+        LOG.info("VM %(dev)s moref changed from %(old)s to %(new)s",
+                 {'dev': device_id, 'old': vm_moref, 'new': new_moref})
+        update_func(new_moref)
 
     def _add_vm_to_exclude_list(self, context, device_id, port_id):
         if (self._vcm and
@@ -1824,7 +1959,9 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
                                  "behalf of port %(port)s: added to "
                                  "list",
                                  {"dev": device_id, "port": port_id})
-                        self.nsx_v.vcns.add_vm_to_exclude_list(vm_moref)
+                        self._update_vm_exclude_list(
+                            device_id, vm_moref,
+                            self.nsx_v.vcns.add_vm_to_exclude_list)
                     except vsh_exc.RequestBad as e:
                         LOG.error("Failed to add vm %(device)s "
                                   "moref %(moref)s to exclude list: "
@@ -1856,13 +1993,18 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
                                  "behalf of port %(port)s: removed from "
                                  "list",
                                  {"dev": device_id, "port": port_id})
-                        self.nsx_v.vcns.delete_vm_from_exclude_list(vm_moref)
+                        self._update_vm_exclude_list(
+                            device_id, vm_moref,
+                            self.nsx_v.vcns.delete_vm_from_exclude_list)
                     except vsh_exc.RequestBad as e:
                         LOG.error("Failed to delete vm %(device)s "
                                   "moref %(moref)s from exclude list: "
                                   "%(err)s",
                                   {'device': device_id, 'moref': vm_moref,
                                    'err': e})
+                # The VM has no more ports without port security, and is
+                # probably being deleted
+                self._vcm.invalidate_vm_moref(device_id)
             else:
                 LOG.info("Remove VM %(dev)s from exclude list on behalf "
                          "of port %(port)s: other ports still in list",
@@ -3916,8 +4058,12 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
         if set(['name', 'description']) & set(s.keys()):
             nsx_sg_name = self.nsx_sg_utils.get_nsx_sg_name(sg_data)
             section_name = self.nsx_sg_utils.get_nsx_section_name(sg_data)
-            self.nsx_v.vcns.update_security_group(
-                nsx_sg_id, nsx_sg_name, sg_data['description'])
+            # The NSX security group is read and written back, so this
+            # must not run together with its members updates
+            with locking.LockManager.get_lock(
+                    'neutron-security-ops' + str(nsx_sg_id)):
+                self.nsx_v.vcns.update_security_group(
+                    nsx_sg_id, nsx_sg_name, sg_data['description'])
 
         # security groups with NSX policy - update the backend policy attached
         # to the security group
@@ -4208,53 +4354,55 @@ class NsxVPluginV2(addr_pair_db.AllowedAddressPairsMixin,
             LOG.info("Unable to configure edge reservations")
 
     def _validate_config(self):
+        # The inventory is read once for all the availability zones
+        snapshot = self.nsx_v.vcns.get_inventory_snapshot()
         if (cfg.CONF.nsxv.dvs_id and
-            not self.nsx_v.vcns.validate_dvs(cfg.CONF.nsxv.dvs_id)):
+            not snapshot.validate_dvs(cfg.CONF.nsxv.dvs_id)):
             raise nsx_exc.NsxResourceNotFound(
                                 res_name='dvs_id',
                                 res_id=cfg.CONF.nsxv.dvs_id)
 
         # Validate the global & per-AZ validate_datacenter_moid
-        if not self.nsx_v.vcns.validate_datacenter_moid(
+        if not snapshot.validate_datacenter_moid(
                 cfg.CONF.nsxv.datacenter_moid):
             raise nsx_exc.NsxResourceNotFound(
                                 res_name='datacenter_moid',
                                 res_id=cfg.CONF.nsxv.datacenter_moid)
         for dc in self._availability_zones_data.get_additional_datacenter():
-            if not self.nsx_v.vcns.validate_datacenter_moid(dc):
+            if not snapshot.validate_datacenter_moid(dc):
                 raise nsx_exc.NsxAZResourceNotFound(
                     res_name='datacenter_moid', res_id=dc)
 
         # Validate the global & per-AZ external_network
-        if not self.nsx_v.vcns.validate_network(
+        if not snapshot.validate_network(
                 cfg.CONF.nsxv.external_network):
             raise nsx_exc.NsxResourceNotFound(
                                 res_name='external_network',
                                 res_id=cfg.CONF.nsxv.external_network)
         for ext_net in self._availability_zones_data.get_additional_ext_net():
-            if not self.nsx_v.vcns.validate_network(ext_net):
+            if not snapshot.validate_network(ext_net):
                 raise nsx_exc.NsxAZResourceNotFound(
                     res_name='external_network', res_id=ext_net)
 
         # Validate the global & per-AZ vdn_scope_id
-        if not self.nsx_v.vcns.validate_vdn_scope(cfg.CONF.nsxv.vdn_scope_id):
+        if not snapshot.validate_vdn_scope(cfg.CONF.nsxv.vdn_scope_id):
             raise nsx_exc.NsxResourceNotFound(
                                 res_name='vdn_scope_id',
                                 res_id=cfg.CONF.nsxv.vdn_scope_id)
         for vdns in self._availability_zones_data.get_additional_vdn_scope():
-            if not self.nsx_v.vcns.validate_vdn_scope(vdns):
+            if not snapshot.validate_vdn_scope(vdns):
                 raise nsx_exc.NsxAZResourceNotFound(
                     res_name='vdn_scope_id', res_id=vdns)
 
         # Validate the global & per-AZ mgt_net_moid
         if (cfg.CONF.nsxv.mgt_net_moid
-            and not self.nsx_v.vcns.validate_network(
+            and not snapshot.validate_network(
                 cfg.CONF.nsxv.mgt_net_moid)):
             raise nsx_exc.NsxResourceNotFound(
                                 res_name='mgt_net_moid',
                                 res_id=cfg.CONF.nsxv.mgt_net_moid)
         for mgmt_net in self._availability_zones_data.get_additional_mgt_net():
-            if not self.nsx_v.vcns.validate_network(mgmt_net):
+            if not snapshot.validate_network(mgmt_net):
                 raise nsx_exc.NsxAZResourceNotFound(
                     res_name='mgt_net_moid', res_id=mgmt_net)
 
@@ -242,7 +242,13 @@ class EdgeApplianceDriver(object):
             {'featureType': 'highavailability_4.0',
              'enabled': True})
 
-    def get_edge_status(self, edge_id):
+    def get_edge_status(self, edge_id, use_cache=False):
+        if use_cache:
+            # Use the status from the edges summaries read in the last few
+            # seconds, if the edge is there
+            for edge in self.vcns.get_edges(use_cache=True):
+                if edge.get('id') == edge_id and edge.get('edgeStatus'):
+                    return self._edge_status_to_level(edge['edgeStatus'])
         try:
             response = self.vcns.get_edge_status(edge_id)[1]
             status_level = self._edge_status_to_level(
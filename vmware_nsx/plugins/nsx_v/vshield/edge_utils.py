@@ -418,9 +418,10 @@ class EdgeManager(object):
                 edge_type=edge_type,
                 availability_zone=availability_zone)
 
-    def check_edge_active_at_backend(self, edge_id):
+    def check_edge_active_at_backend(self, edge_id, use_cache=False):
         try:
-            status = self.nsxv_manager.get_edge_status(edge_id)
+            status = self.nsxv_manager.get_edge_status(edge_id,
+                                                       use_cache=use_cache)
             return (status == vcns_const.RouterStatus.ROUTER_STATUS_ACTIVE)
         except Exception:
             return False
@@ -435,8 +436,10 @@ class EdgeManager(object):
         while backup_router_bindings:
             router_binding = random.choice(backup_router_bindings)
             if (router_binding['status'] == constants.ACTIVE):
+                # A status read a few seconds ago is good enough to pick
+                # a backup edge
                 if not self.check_edge_active_at_backend(
-                    router_binding['edge_id']):
+                    router_binding['edge_id'], use_cache=True):
                     LOG.debug("Delete unavailable backup resource "
                               "%(router_id)s with edge_id %(edge_id)s",
                               {'router_id': router_binding['router_id'],
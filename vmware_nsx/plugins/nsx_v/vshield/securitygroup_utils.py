@@ -13,10 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import xml.etree.ElementTree as et
 
+import eventlet
 from oslo_log import log as logging
 
+from vmware_nsx.common import locking
 from vmware_nsx.common import utils
 
 WAIT_INTERVAL = 2000
@@ -202,3 +205,69 @@ class NsxSecurityGroupUtils(object):
 
         return self.nsxv_manager.vcns.update_security_policy(
             policy_id, et.tostring(policy))
+
+
+class NsxSecurityGroupMembership(object):
+    """Aggregate the vnic membership changes of NSX security groups
+
+    Membership changes of a security group submitted while another change
+    of the same group is applied are queued, and applied together by the
+    next update of the group: a single change with the per member API, and
+    several changes with one bulk update of the group members. Each caller
+    waits for the update which includes its change, and gets its error.
+    """
+
+    def __init__(self, vcns):
+        self._vcns = vcns
+        self._pending = collections.defaultdict(list)
+        self._updating = set()
+
+    def add_member(self, sg_id, member_id):
+        self._apply(sg_id, member_id, True)
+
+    def remove_member(self, sg_id, member_id):
+        self._apply(sg_id, member_id, False)
+
+    def _apply(self, sg_id, member_id, add):
+        done = eventlet.event.Event()
+        self._pending[sg_id].append((member_id, add, done))
+        if sg_id not in self._updating:
+            self._updating.add(sg_id)
+            try:
+                while self._pending.get(sg_id):
+                    self._update(sg_id, self._pending.pop(sg_id))
+            finally:
+                self._updating.discard(sg_id)
+        return done.wait()
+
+    def _update(self, sg_id, changes):
+        # The last change of each member wins
+        members = collections.OrderedDict()
+        for member_id, add, done in changes:
+            members.pop(member_id, None)
+            members[member_id] = add
+        try:
+            with locking.LockManager.get_lock(
+                    'neutron-security-ops' + str(sg_id)):
+                if len(members) == 1:
+                    member_id, add = list(members.items())[0]
+                    if add:
+                        self._vcns.add_member_to_security_group(
+                            sg_id, member_id)
+                    else:
+                        self._vcns.remove_member_from_security_group(
+                            sg_id, member_id)
+                else:
+                    LOG.debug("Updating %(count)s members of NSX security "
+                              "group %(sg_id)s",
+                              {'count': len(members), 'sg_id': sg_id})
+                    self._vcns.update_security_group_members(
+                        sg_id,
+                        [m for m, add in members.items() if add],
+                        [m for m, add in members.items() if not add])
+        except Exception as e:
+            for member_id, add, done in changes:
+                done.send_exception(e)
+        else:
+            for member_id, add, done in changes:
+                done.send()
@@ -12,12 +12,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import functools
 import re
 import time
 
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+from oslo_utils import timeutils
 import six
 import xml.etree.ElementTree as et
 
@@ -103,6 +107,149 @@ def retry_upon_exception(exc, delay=0.5, max_delay=4, max_attempts=0):
     return utils.retry_upon_exception(exc, delay, max_delay, max_attempts)
 
 
+# Maximal number of edge list pages read concurrently
+MAX_EDGE_PAGES_THREADS = 10
+# Number of seconds the edges list may be reused by callers of get_edges
+# which accept a slightly stale list
+EDGES_LIST_CACHE_TTL = 10
+
+# The last edges list read from each NSX manager, with its expiration time
+_edges_list_cache = {}
+# Number of edge changes done on each NSX manager, so that a list read
+# while an edge was changed is not cached
+_edges_list_changes = collections.defaultdict(int)
+
+
+# Per edge counters of the edge firewall changes done by this process, used
+# by callers caching parts of the edge firewall configuration to detect
+# changes done by other components
+_edge_firewall_generations = collections.defaultdict(int)
+
+
+# Upper bounds, in seconds, of the requests latency histogram buckets
+REQUEST_LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60)
+
+# Per endpoint statistics of the NSX requests done by this process
+_request_stats = {}
+
+# Segments of the requests uri which are replaced by '{id}' in the endpoint:
+# numbers, NSX object ids (like edge-1) and UUIDs
+_URI_ID_SEGMENT = re.compile(r'^(\d+|[\w.]+-\d+|[0-9a-f]{8}-[0-9a-f-]{27})$')
+
+
+class _RequestStats(object):
+    def __init__(self):
+        self.requests = 0
+        self.attempts = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = utils.DurationHistogram(REQUEST_LATENCY_BUCKETS)
+
+    def to_dict(self):
+        return {'requests': self.requests,
+                'retries': self.attempts - self.requests,
+                'errors': self.errors,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'latency': self.latency.to_dict()}
+
+
+def _get_request_endpoint(method, uri):
+    path = uri.split('?', 1)[0]
+    return '%s %s' % (method, '/'.join(
+        '{id}' if _URI_ID_SEGMENT.match(segment) else segment
+        for segment in path.split('/')))
+
+
+def get_request_stats():
+    """Return the statistics of the NSX requests, by endpoint
+
+    The endpoint is the HTTP method and the uri, without its query and
+    with the objects ids replaced by '{id}'. For each endpoint, the number
+    of requests, retries and failed requests, the bytes sent and received,
+    and the latency histogram of the requests, including their retries.
+    """
+    return dict((endpoint, stats.to_dict())
+                for endpoint, stats in _request_stats.items())
+
+
+def reset_request_stats():
+    _request_stats.clear()
+
+
+def get_edge_firewall_generation(edge_id):
+    return _edge_firewall_generations[edge_id]
+
+
+def _changes_edge_firewall(f):
+    @functools.wraps(f)
+    def wrapper(self, edge_id, *args, **kwargs):
+        try:
+            return f(self, edge_id, *args, **kwargs)
+        finally:
+            _edge_firewall_generations[edge_id] += 1
+    return wrapper
+
+
+class InventorySnapshot(object):
+    """Index of the NSX inventory used to validate many objects
+
+    The scoping objects, the transport zones and the switches are each
+    read from the NSX manager once, on their first lookup, and indexed by
+    object id, so any number of validations can use a single snapshot.
+    """
+
+    def __init__(self, vcns):
+        self._vcns = vcns
+        self._scoping_objects = None
+        self._vdn_scope_ids = None
+        self._dvs_ids = None
+
+    def _get_object_ids(self, uri):
+        h, obj_list = self._vcns.do_request(HTTP_GET, uri, decode=False,
+                                            format='xml')
+        root = utils.normalize_xml(obj_list)
+        return set(obj_id.text for obj_id in root.iter('objectId'))
+
+    def _get_scoping_objects(self):
+        if self._scoping_objects is None:
+            root = utils.normalize_xml(self._vcns.get_scoping_objects())
+            scoping_objects = collections.defaultdict(list)
+            for obj in root.iter('object'):
+                scoping_objects[obj.findtext('objectId')].append(
+                    (obj.findtext('objectTypeName'), obj.findtext('name')))
+            self._scoping_objects = scoping_objects
+        return self._scoping_objects
+
+    def _scopingobjects_lookup(self, type_names, object_id, name=None):
+        for type_name, obj_name in self._get_scoping_objects().get(
+                object_id, []):
+            if type_name in type_names and (name is None or obj_name == name):
+                return True
+        return False
+
+    def validate_datacenter_moid(self, object_id):
+        return self._scopingobjects_lookup(['Datacenter'], object_id)
+
+    def validate_network(self, object_id):
+        return self._scopingobjects_lookup(NETWORK_TYPES, object_id)
+
+    def validate_network_name(self, object_id, name):
+        return self._scopingobjects_lookup(NETWORK_TYPES, object_id, name)
+
+    def validate_vdn_scope(self, object_id):
+        if self._vdn_scope_ids is None:
+            self._vdn_scope_ids = self._get_object_ids(
+                '%s/scopes' % VDN_PREFIX)
+        return object_id in self._vdn_scope_ids
+
+    def validate_dvs(self, object_id):
+        if self._dvs_ids is None:
+            self._dvs_ids = self._get_object_ids('%s/switches' % VDN_PREFIX)
+        return object_id in self._dvs_ids
+
+
 class Vcns(object):
 
     def __init__(self, address, user, password, ca_file, insecure):
@@ -139,26 +286,48 @@ class Vcns(object):
 
     @retry_upon_exception(exceptions.ServiceConflict)
     def _client_request(self, client, method, uri,
-                        params, headers, encodeParams):
+                        params, headers, encodeParams, stats):
+        stats.attempts += 1
+        if params:
+            stats.bytes_sent += len(params)
         return client(method, uri, params, headers, encodeParams)
 
     def do_request(self, method, uri, params=None, format='json', **kwargs):
-        self._log_request(method, uri, jsonutils.dumps(params), format)
+        if LOG.isEnabledFor(logging.DEBUG):
+            self._log_request(method, uri, jsonutils.dumps(params), format)
         headers = kwargs.get('headers')
         encodeParams = kwargs.get('encode', True)
         if format == 'json':
-            _client = self.jsonapi_client.request
+            api_client = self.jsonapi_client
         else:
-            _client = self.xmlapi_client.request
-
-        ts = time.time()
-        header, content = self._client_request(_client, method, uri, params,
-                                               headers, encodeParams)
-        te = time.time()
+            api_client = self.xmlapi_client
+        if params and encodeParams is True:
+            # Encode the body once, so its size is known for the statistics
+            params = api_client.encode(params)
+            encodeParams = False
+
+        endpoint = _get_request_endpoint(method, uri)
+        stats = _request_stats.get(endpoint)
+        if stats is None:
+            stats = _request_stats.setdefault(endpoint, _RequestStats())
+        stats.requests += 1
+        ts = timeutils.now()
+        try:
+            header, content = self._client_request(
+                api_client.request, method, uri, params, headers,
+                encodeParams, stats)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = timeutils.now() - ts
+            stats.latency.add(elapsed)
+        if content:
+            stats.bytes_received += len(content)
 
         LOG.debug('VcnsApiHelper reply: header=%(header)s content=%(content)s'
                   ' took %(seconds)2.4f',
-                  {'header': header, 'content': content, 'seconds': te - ts})
+                  {'header': header, 'content': content, 'seconds': elapsed})
         if content == '':
             return header, {}
         if kwargs.get('decode', True):
@@ -173,11 +342,17 @@ class Vcns(object):
     @retry_upon_exception(exceptions.RequestBad)
     def deploy_edge(self, request):
         uri = URI_PREFIX
-        return self.do_request(HTTP_POST, uri, request, decode=False)
+        try:
+            return self.do_request(HTTP_POST, uri, request, decode=False)
+        finally:
+            self._invalidate_edges_list()
 
     def update_edge(self, edge_id, request):
         uri = "%s/%s" % (URI_PREFIX, edge_id)
-        return self.do_request(HTTP_PUT, uri, request, decode=False)
+        try:
+            return self.do_request(HTTP_PUT, uri, request, decode=False)
+        finally:
+            self._invalidate_edges_list()
 
     def get_edge_id(self, job_id):
         uri = URI_PREFIX + "/jobs/%s" % job_id
@@ -193,7 +368,10 @@ class Vcns(object):
 
     def delete_edge(self, edge_id):
         uri = "%s/%s" % (URI_PREFIX, edge_id)
-        return self.do_request(HTTP_DELETE, uri)
+        try:
+            return self.do_request(HTTP_DELETE, uri)
+        finally:
+            self._invalidate_edges_list()
 
     def add_vdr_internal_interface(self, edge_id, interface):
         uri = "%s/%s/interfaces?action=patch" % (URI_PREFIX, edge_id)
@@ -252,7 +430,24 @@ class Vcns(object):
         uri = '%s?startIndex=%d' % (URI_PREFIX, startindex)
         return self.do_request(HTTP_GET, uri, decode=True)
 
-    def get_edges(self):
+    def _invalidate_edges_list(self):
+        # Called once the edge change is done, so that a list read while
+        # the request was in progress is not reused
+        _edges_list_changes[self.address] += 1
+        _edges_list_cache.pop(self.address, None)
+
+    def get_edges(self, use_cache=False):
+        """Return the summaries of all the edges
+
+        The pages following the first one are read concurrently. With
+        use_cache, a list read up to EDGES_LIST_CACHE_TTL seconds ago may be
+        returned.
+        """
+        if use_cache:
+            cached = _edges_list_cache.get(self.address)
+            if cached and cached[0] > time.time():
+                return list(cached[1])
+        changes = _edges_list_changes[self.address]
         edges = []
         h, d = self._get_edges()
         edges.extend(d['edgePage']['data'])
@@ -261,12 +456,16 @@ class Vcns(object):
         count = int(paging_info['totalCount'])
         LOG.debug("There are total %s edges and page size is %s",
                   count, page_size)
-        pages = count / page_size + 1
-        for i in range(1, pages):
-            start_index = page_size * i
-            h, d = self._get_edges(start_index)
-            edges.extend(d['edgePage']['data'])
-        return edges
+        start_indexes = range(page_size, count, page_size)
+        if start_indexes:
+            pool = eventlet.GreenPool(MAX_EDGE_PAGES_THREADS)
+            # imap returns the pages in the order of their start index
+            for h, d in pool.imap(self._get_edges, start_indexes):
+                edges.extend(d['edgePage']['data'])
+        if changes == _edges_list_changes[self.address]:
+            _edges_list_cache[self.address] = (
+                time.time() + EDGES_LIST_CACHE_TTL, edges)
+        return list(edges)
 
     def get_edge_syslog(self, edge_id):
         uri = "%s/%s/syslog/config" % (URI_PREFIX, edge_id)
@@ -323,16 +522,19 @@ class Vcns(object):
             uri = '/api/4.0/firewall/forceSync/%s' % cluster_id
             self.do_request(HTTP_POST, uri)
 
+    @_changes_edge_firewall
     def update_firewall(self, edge_id, fw_req):
         uri = self._build_uri_path(
             edge_id, FIREWALL_SERVICE)
         return self.do_request(HTTP_PUT, uri, fw_req)
 
+    @_changes_edge_firewall
     def delete_firewall(self, edge_id):
         uri = self._build_uri_path(
             edge_id, FIREWALL_SERVICE, None)
         return self.do_request(HTTP_DELETE, uri)
 
+    @_changes_edge_firewall
     def update_firewall_rule(self, edge_id, vcns_rule_id, fwr_req):
         uri = self._build_uri_path(
             edge_id, FIREWALL_SERVICE,
@@ -340,6 +542,7 @@ class Vcns(object):
             vcns_rule_id)
         return self.do_request(HTTP_PUT, uri, fwr_req)
 
+    @_changes_edge_firewall
     def delete_firewall_rule(self, edge_id, vcns_rule_id):
         uri = self._build_uri_path(
             edge_id, FIREWALL_SERVICE,
@@ -347,6 +550,7 @@ class Vcns(object):
             vcns_rule_id)
         return self.do_request(HTTP_DELETE, uri)
 
+    @_changes_edge_firewall
     def add_firewall_rule_above(self, edge_id, ref_vcns_rule_id, fwr_req):
         uri = self._build_uri_path(
             edge_id, FIREWALL_SERVICE,
@@ -354,6 +558,7 @@ class Vcns(object):
         uri += "?aboveRuleId=" + ref_vcns_rule_id
         return self.do_request(HTTP_POST, uri, fwr_req)
 
+    @_changes_edge_firewall
     def add_firewall_rule(self, edge_id, fwr_req):
         uri = self._build_uri_path(
             edge_id, FIREWALL_SERVICE,
@@ -734,6 +939,27 @@ class Vcns(object):
             SECURITYGROUP_PREFIX, security_group_id, member_id)
         return self.do_request(HTTP_DELETE, uri, format='xml', decode=False)
 
+    def update_security_group_members(self, security_group_id,
+                                      add_members, remove_members):
+        """Adds and removes vnic members of nsx security group at once."""
+        uri = '%s/%s' % (SECURITYGROUP_PREFIX, security_group_id)
+        h, c = self.do_request(HTTP_GET, uri, format='xml', decode=False)
+        sg = et.fromstring(c)
+        current_members = set()
+        for member in sg.findall('member'):
+            member_id = member.find('objectId').text
+            if member_id in remove_members:
+                sg.remove(member)
+            else:
+                current_members.add(member_id)
+        for member_id in add_members:
+            if member_id not in current_members:
+                member = et.SubElement(sg, 'member')
+                et.SubElement(member, 'objectId').text = member_id
+        uri = '%s/bulk/%s' % (SECURITYGROUP_PREFIX, security_group_id)
+        return self.do_request(HTTP_PUT, uri, et.tostring(sg),
+                               format='xml', decode=False, encode=False)
+
     def set_system_control(self, edge_id, prop):
         uri = self._build_uri_path(edge_id, SYSCTL_SERVICE)
 
@@ -877,49 +1103,26 @@ class Vcns(object):
                                              format='xml')
         return scoping_objects
 
-    def _scopingobjects_lookup(self, type_names, object_id, name=None):
-        uri = '%s/usermgmt/scopingobjects' % SERVICES_PREFIX
-        h, so_list = self.do_request(HTTP_GET, uri, decode=False,
-                                     format='xml')
-        root = utils.normalize_xml(so_list)
-        for obj in root.iter('object'):
-            if (obj.find('objectTypeName').text in type_names and
-                    obj.find('objectId').text == object_id and
-                    (name is None or obj.find('name').text == name)):
-                return True
-
-        return False
+    def get_inventory_snapshot(self):
+        """Return an InventorySnapshot for validating many objects"""
+        return InventorySnapshot(self)
 
     def validate_datacenter_moid(self, object_id):
-        return self._scopingobjects_lookup(['Datacenter'], object_id)
+        return self.get_inventory_snapshot().validate_datacenter_moid(
+            object_id)
 
     def validate_network(self, object_id):
-        return self._scopingobjects_lookup(NETWORK_TYPES, object_id)
+        return self.get_inventory_snapshot().validate_network(object_id)
 
     def validate_network_name(self, object_id, name):
-        return self._scopingobjects_lookup(NETWORK_TYPES, object_id, name)
+        return self.get_inventory_snapshot().validate_network_name(
+            object_id, name)
 
     def validate_vdn_scope(self, object_id):
-        uri = '%s/scopes' % VDN_PREFIX
-        h, scope_list = self.do_request(HTTP_GET, uri, decode=False,
-                                        format='xml')
-        root = utils.normalize_xml(scope_list)
-        for obj_id in root.iter('objectId'):
-            if obj_id.text == object_id:
-                return True
-
-        return False
+        return self.get_inventory_snapshot().validate_vdn_scope(object_id)
 
     def validate_dvs(self, object_id):
-        uri = '%s/switches' % VDN_PREFIX
-        h, dvs_list = self.do_request(HTTP_GET, uri, decode=False,
-                                      format='xml')
-        root = utils.normalize_xml(dvs_list)
-        for obj_id in root.iter('objectId'):
-            if obj_id.text == object_id:
-                return True
-
-        return False
+        return self.get_inventory_snapshot().validate_dvs(object_id)
 
     def validate_inventory(self, object_id):
         uri = '%s/inventory/%s/basicinfo' % (SERVICES_PREFIX, object_id)
@@ -193,6 +193,7 @@ class NsxV3Plugin(agentschedulers_db.AZDhcpAgentSchedulerDbMixin,
         registry.subscribe(
             self.nsxlib.reinitialize_cluster,
             resources.PROCESS, events.AFTER_INIT)
+        self._init_tenant_security_groups_cache()
 
         self._nsx_version = self.nsxlib.get_version()
         LOG.info("NSX Version: %s", self._nsx_version)
@@ -1709,7 +1710,7 @@ class NsxV3Plugin(agentschedulers_db.AZDhcpAgentSchedulerDbMixin,
             port_data[addr_pair.ADDRESS_PAIRS] = []
 
         if port_security and has_ip:
-            self._ensure_default_security_group_on_port(context, port)
+            self._ensure_tenant_default_security_group_on_port(context, port)
         elif self._check_update_has_security_groups(
                 {'port': port_data}):
             raise psec_exc.PortSecurityAndIPRequiredForSecurityGroups()
@@ -80,6 +80,7 @@ class NSXvBgpPlugin(service_base.ServicePluginBase, bgp_db.BgpDbMixin):
                                                              bgp_speaker)
 
     def update_bgp_speaker(self, context, bgp_speaker_id, bgp_speaker):
+        self.nsxv_driver.invalidate_speaker_edges(bgp_speaker_id)
         with locking.LockManager.get_lock(str(bgp_speaker_id)):
             self.nsxv_driver.update_bgp_speaker(context, bgp_speaker_id,
                                                 bgp_speaker)
@@ -88,6 +89,7 @@ class NSXvBgpPlugin(service_base.ServicePluginBase, bgp_db.BgpDbMixin):
                 context, bgp_speaker_id, bgp_speaker)
 
     def delete_bgp_speaker(self, context, bgp_speaker_id):
+        self.nsxv_driver.invalidate_speaker_edges(bgp_speaker_id)
         with locking.LockManager.get_lock(str(bgp_speaker_id)):
             self.nsxv_driver.delete_bgp_speaker(context, bgp_speaker_id)
             super(NSXvBgpPlugin, self).delete_bgp_speaker(context,
@@ -164,8 +166,10 @@ class NSXvBgpPlugin(service_base.ServicePluginBase, bgp_db.BgpDbMixin):
             self.nsxv_driver.add_gateway_network(context,
                                                  bgp_speaker_id,
                                                  network_info)
-            return super(NSXvBgpPlugin, self).add_gateway_network(
+            ret = super(NSXvBgpPlugin, self).add_gateway_network(
                 context, bgp_speaker_id, network_info)
+            self.nsxv_driver.invalidate_speaker_edges(bgp_speaker_id)
+            return ret
 
     def remove_gateway_network(self, context, bgp_speaker_id, network_info):
         with locking.LockManager.get_lock(str(bgp_speaker_id)):
@@ -174,11 +178,13 @@ class NSXvBgpPlugin(service_base.ServicePluginBase, bgp_db.BgpDbMixin):
             self.nsxv_driver.remove_gateway_network(context,
                                                     bgp_speaker_id,
                                                     network_info)
+            self.nsxv_driver.invalidate_speaker_edges(bgp_speaker_id)
 
     def get_advertised_routes(self, context, bgp_speaker_id):
         return self.nsxv_driver.get_advertised_routes(context, bgp_speaker_id)
 
     def router_interface_callback(self, resource, event, trigger, **kwargs):
+        self.nsxv_driver.invalidate_speaker_edges()
         if not kwargs['network_id']:
             # No GW network, hence no BGP speaker associated
             return
@@ -206,6 +212,7 @@ class NSXvBgpPlugin(service_base.ServicePluginBase, bgp_db.BgpDbMixin):
                                                      router_id, subnet_id)
 
     def router_gateway_callback(self, resource, event, trigger, **kwargs):
+        self.nsxv_driver.invalidate_speaker_edges()
         context = kwargs.get('context') or n_context.get_admin_context()
         context = context.elevated()
         router_id = kwargs['router_id']
@@ -232,6 +239,7 @@ class NSXvBgpPlugin(service_base.ServicePluginBase, bgp_db.BgpDbMixin):
 
     def _before_service_edge_delete_callback(self, resource, event,
                                              trigger, **kwargs):
+        self.nsxv_driver.invalidate_speaker_edges()
         context = kwargs['context'].elevated()
         router = kwargs['router']
         ext_net_id = router.gw_port and router.gw_port['network_id']
@@ -249,6 +257,7 @@ class NSXvBgpPlugin(service_base.ServicePluginBase, bgp_db.BgpDbMixin):
 
     def _after_service_edge_create_callback(self, resource, event,
                                             trigger, **kwargs):
+        self.nsxv_driver.invalidate_speaker_edges()
         context = kwargs['context'].elevated()
         router = kwargs['router']
         ext_net_id = router.gw_port and router.gw_port['network_id']
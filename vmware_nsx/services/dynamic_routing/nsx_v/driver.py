@@ -13,6 +13,9 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import copy
+import time
+
 import netaddr
 
 from neutron_dynamic_routing.extensions import bgp as bgp_ext
@@ -20,6 +23,8 @@ from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
 
+from neutron.db.models import l3 as l3_db_models
+from neutron.db import models_v2
 from neutron.extensions import address_scope
 from neutron_lib import constants as n_const
 from neutron_lib import exceptions as n_exc
@@ -33,6 +38,8 @@ from vmware_nsx.extensions import edge_service_gateway_bgp_peer as ext_esg_peer
 from vmware_nsx.plugins.nsx_v.vshield.common import exceptions as vcns_exc
 
 LOG = logging.getLogger(__name__)
+# Max number of routers in a single DB query
+MAX_ROUTERS_PER_QUERY = 500
 
 
 def ip_prefix(name, ip_address):
@@ -88,6 +95,9 @@ class NSXvBgpDriver(object):
         self._core_plugin = directory.get_plugin()
         self._nsxv = self._core_plugin.nsx_v
         self._edge_manager = self._core_plugin.edge_manager
+        # speaker id -> (gateway network id, timestamp, edges)
+        self._speaker_edges_cache = {}
+        self._speaker_edges_generation = 0
 
     def prefix_name(self, subnet_id):
         return 'subnet-%s' % subnet_id
@@ -115,53 +125,164 @@ class NSXvBgpDriver(object):
     def get_advertised_routes(self, context, bgp_speaker_id):
         routes = []
         bgp_speaker = self._plugin.get_bgp_speaker(context, bgp_speaker_id)
-        edge_router_dict = (
-            self._get_dynamic_routing_edge_list(context,
-                                                bgp_speaker['networks'][0],
-                                                bgp_speaker_id))
+        edge_router_dict = self._get_speaker_dynamic_routing_edges(
+            context, bgp_speaker['networks'][0], bgp_speaker_id)
         for edge_id, edge_router_config in edge_router_dict.items():
             bgp_identifier = edge_router_config['bgp_identifier']
-            subnets = self._query_tenant_subnets(
-                context, edge_router_config['no_snat_routers'])
             routes.extend([(subnet['cidr'], bgp_identifier)
-                           for subnet in subnets])
+                           for subnet in edge_router_config['subnets']])
         routes = self._plugin._make_advertised_routes_list(routes)
         return self._plugin._make_advertised_routes_dict(routes)
 
-    def _get_dynamic_routing_edge_list(self, context,
-                                       gateway_network_id, bgp_speaker_id):
-        # Filter the routers attached this network as gateway interface
-        filters = {'network_id': [gateway_network_id],
-                   'device_owner': [n_const.DEVICE_OWNER_ROUTER_GW]}
-        fields = ['device_id', 'fixed_ips']
-        gateway_ports = self._core_plugin.get_ports(context, filters=filters,
-                                                    fields=fields)
+    def invalidate_speaker_edges(self, bgp_speaker_id=None):
+        """Drop the memoized edges of a speaker, or of all the speakers"""
+        self._speaker_edges_generation += 1
+        if bgp_speaker_id:
+            self._speaker_edges_cache.pop(bgp_speaker_id, None)
+        else:
+            self._speaker_edges_cache.clear()
+
+    def _get_speaker_dynamic_routing_edges(self, context, gateway_network_id,
+                                           bgp_speaker_id):
+        """Memoized version of _get_dynamic_routing_edges
+
+        The result is kept until invalidated by a router, interface or
+        gateway event, and for up to bgp_routes_cache_ttl seconds as other
+        servers may change the routers as well.
+        """
+        ttl = cfg.CONF.nsxv.bgp_routes_cache_ttl
+        if not ttl:
+            return self._get_dynamic_routing_edges(
+                context, gateway_network_id, bgp_speaker_id)
+        cached = self._speaker_edges_cache.get(bgp_speaker_id)
+        if (cached and cached[0] == gateway_network_id and
+            time.time() - cached[1] < ttl):
+            return copy.deepcopy(cached[2])
+        generation = self._speaker_edges_generation
+        edges = self._get_dynamic_routing_edges(
+            context, gateway_network_id, bgp_speaker_id)
+        # Do not keep a result which may have missed an invalidation
+        if generation == self._speaker_edges_generation:
+            self._speaker_edges_cache[bgp_speaker_id] = (
+                gateway_network_id, time.time(), copy.deepcopy(edges))
+        return edges
+
+    def _get_routers_gateway_ips(self, context, gateway_network_id):
+        """Return the routers with a gateway on the network
+
+        Returns a dict of router id -> (enable_snat, gateway ip)
+        """
+        query = context.session.query(
+            l3_db_models.Router.id, l3_db_models.Router.enable_snat,
+            models_v2.IPAllocation.ip_address)
+        query = query.join(
+            models_v2.Port,
+            l3_db_models.Router.gw_port_id == models_v2.Port.id)
+        query = query.join(
+            models_v2.IPAllocation,
+            models_v2.IPAllocation.port_id == models_v2.Port.id)
+        query = query.filter(models_v2.Port.network_id == gateway_network_id)
+        # Order the ips like the port fixed ips, to use the first one
+        query = query.order_by(models_v2.IPAllocation.ip_address,
+                               models_v2.IPAllocation.subnet_id)
+        routers = {}
+        for router_id, enable_snat, ip_address in query:
+            routers.setdefault(router_id, (enable_snat, ip_address))
+        return routers
+
+    def _get_routers_interface_subnets(self, context, router_ids):
+        """Return the subnets attached to each of the routers"""
+        router_subnets = dict((router_id, []) for router_id in router_ids)
+        seen_ports = set()
+        for i in range(0, len(router_ids), MAX_ROUTERS_PER_QUERY):
+            query = context.session.query(
+                models_v2.Port.device_id, models_v2.Port.id,
+                models_v2.Subnet.id, models_v2.Subnet.cidr)
+            query = query.join(
+                models_v2.IPAllocation,
+                models_v2.IPAllocation.port_id == models_v2.Port.id)
+            query = query.join(
+                models_v2.Subnet,
+                models_v2.Subnet.id == models_v2.IPAllocation.subnet_id)
+            query = query.filter(
+                models_v2.Port.device_owner ==
+                n_const.DEVICE_OWNER_ROUTER_INTF,
+                models_v2.Port.device_id.in_(
+                    router_ids[i:i + MAX_ROUTERS_PER_QUERY]))
+            # Order the ips of each port like the port fixed ips
+            query = query.order_by(models_v2.Port.id,
+                                   models_v2.IPAllocation.ip_address,
+                                   models_v2.IPAllocation.subnet_id)
+            for router_id, port_id, subnet_id, cidr in query:
+                # Like _query_tenant_subnets, use the first fixed ip of
+                # each interface port
+                if port_id in seen_ports:
+                    continue
+                seen_ports.add(port_id)
+                router_subnets[router_id].append({'id': subnet_id,
+                                                  'cidr': cidr})
+        return router_subnets
+
+    def _get_dynamic_routing_edges(self, context, gateway_network_id,
+                                   bgp_speaker_id):
+        """Return the edges of the routers with a gateway on the network
+
+        Returns a dict of edge id -> {'no_snat_routers', 'bgp_identifier',
+        'advertise_static_routes', 'subnets'}, where subnets are those
+        attached to the no-SNAT routers of the edge. The routers, their
+        gateway ips, edges and subnets are read with a few queries, only
+        distributed routers require a lookup of their PLR edge each.
+        """
+        routers = self._get_routers_gateway_ips(context, gateway_network_id)
+        router_ids = list(routers)
 
         bgp_bindings = nsxv_db.get_nsxv_bgp_speaker_bindings(
             context.session, bgp_speaker_id)
         binding_info = {bgp_binding['edge_id']: bgp_binding['bgp_identifier']
                         for bgp_binding in bgp_bindings}
 
+        router_edges = {}
+        for i in range(0, len(router_ids), MAX_ROUTERS_PER_QUERY):
+            edge_bindings = nsxv_db.get_nsxv_router_bindings(
+                context.session,
+                filters={'router_id': router_ids[i:i + MAX_ROUTERS_PER_QUERY]})
+            for edge_binding in edge_bindings:
+                router_id = edge_binding['router_id']
+                if edge_binding['edge_type'] == nsxv_constants.SERVICE_EDGE:
+                    router_edges[router_id] = (edge_binding['edge_id'], False)
+                else:
+                    # Distributed router, look for its PLR edge
+                    router_edges[router_id] = self._get_router_edge_info(
+                        context, router_id)
+
+        no_snat_routers = [router_id for router_id in router_ids
+                           if not routers[router_id][0] and
+                           router_edges.get(router_id, (None,))[0]]
+        router_subnets = self._get_routers_interface_subnets(
+            context, no_snat_routers)
+
         edge_router_dict = {}
-        for port in gateway_ports:
-            router_id = port['device_id']
-            router = self._core_plugin._get_router(context, router_id)
-            edge_id, advertise_static_routes = (
-                self._get_router_edge_info(context, router_id))
+        for router_id in router_ids:
+            enable_snat, gw_ip = routers[router_id]
+            edge_id, advertise_static_routes = router_edges.get(
+                router_id, (None, None))
             if not edge_id:
                 # Shared router is not attached on any edge
                 continue
 
             if edge_id not in edge_router_dict:
-                bgp_identifier = binding_info.get(
-                    edge_id, port['fixed_ips'][0]['ip_address'])
+                bgp_identifier = binding_info.get(edge_id, gw_ip)
                 edge_router_dict[edge_id] = {'no_snat_routers': [],
                                              'bgp_identifier':
                                              bgp_identifier,
                                              'advertise_static_routes':
-                                             advertise_static_routes}
-            if not router.enable_snat:
+                                             advertise_static_routes,
+                                             'subnets': []}
+            if not enable_snat:
                 edge_router_dict[edge_id]['no_snat_routers'].append(router_id)
+                edge_router_dict[edge_id]['subnets'].extend(
+                    router_subnets[router_id])
+        LOG.debug("Got dynamic routing edges %s", edge_router_dict)
         return edge_router_dict
 
     def _query_tenant_subnets(self, context, router_ids):
@@ -409,7 +530,7 @@ class NSXvBgpDriver(object):
                                               gateway_network_id):
             return
 
-        edge_router_dict = self._get_dynamic_routing_edge_list(
+        edge_router_dict = self._get_dynamic_routing_edges(
             context, gateway_network_id, bgp_speaker_id)
 
         speaker = self._plugin.get_bgp_speaker(context, bgp_speaker_id)
@@ -418,10 +539,9 @@ class NSXvBgpDriver(object):
         local_as = speaker['local_as']
         peers = []
         for edge_id, edge_router_config in edge_router_dict.items():
-            router_ids = edge_router_config['no_snat_routers']
             advertise_static_routes = (
                 edge_router_config['advertise_static_routes'])
-            subnets = self._query_tenant_subnets(context, router_ids)
+            subnets = edge_router_config['subnets']
             # router_id here is in IP address format and is required for
             # the BGP configuration.
             bgp_identifier = edge_router_config['bgp_identifier']
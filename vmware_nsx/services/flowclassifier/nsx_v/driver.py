@@ -16,6 +16,7 @@
 
 import xml.etree.ElementTree as et
 
+import eventlet
 from networking_sfc.extensions import flowclassifier
 from networking_sfc.services.flowclassifier.common import exceptions as exc
 from networking_sfc.services.flowclassifier.drivers import base as fc_driver
@@ -41,6 +42,73 @@ LOG = logging.getLogger(__name__)
 
 REDIRECT_FW_SECTION_NAME = 'OS Flow Classifier Rules'
 MAX_PORTS_IN_RANGE = 15
+# Length of the flow classifier id at the end of the redirect rule name
+FC_ID_LEN = 36
+
+
+class RedirectSectionWriter(object):
+    """Fold concurrent changes of the redirect section into one update
+
+    Each change is a callable receiving the section and an index of its
+    rules by flow classifier id, and returning True if it modified the
+    section. The caller submitting a change while no update is in progress
+    reads the section, applies all the pending changes and writes it back,
+    repeating as long as changes keep coming. Other callers wait for the
+    update that includes their change, and get its result or its error.
+    """
+
+    def __init__(self, driver):
+        self._driver = driver
+        self._pending = []
+        self._writing = False
+
+    def apply(self, change):
+        done = eventlet.event.Event()
+        self._pending.append((change, done))
+        if not self._writing:
+            self._writing = True
+            try:
+                while self._pending:
+                    batch, self._pending = self._pending, []
+                    self._write(batch)
+            finally:
+                self._writing = False
+        return done.wait()
+
+    @staticmethod
+    def _index_rules(section):
+        index = {}
+        for rule in section.iter('rule'):
+            name = rule.find('name')
+            if name is not None and name.text:
+                index[name.text[-FC_ID_LEN:]] = rule
+        return index
+
+    def _write(self, batch):
+        LOG.debug("Applying %d flow classifier changes to the redirect "
+                  "section", len(batch))
+        applied = []
+        try:
+            with self._driver._loc_fw_section():
+                section = self._driver.get_redirect_fw_section_from_backend()
+                index = self._index_rules(section)
+                modified = False
+                for change, done in batch:
+                    try:
+                        modified = change(section, index) or modified
+                    except Exception as e:
+                        done.send_exception(e)
+                    else:
+                        applied.append(done)
+                if modified:
+                    self._driver.update_redirect_section_in_backed(section)
+        except Exception as e:
+            for change, done in batch:
+                if not done.ready():
+                    done.send_exception(e)
+            return
+        for done in applied:
+            done.send()
 
 
 class NsxvFlowClassifierDriver(fc_driver.FlowClassifierDriverBase):
@@ -50,6 +118,7 @@ class NsxvFlowClassifierDriver(fc_driver.FlowClassifierDriverBase):
 
     def initialize(self):
         self._nsxv = vcns_driver.VcnsDriver(None)
+        self._section_writer = RedirectSectionWriter(self)
         self.init_profile_id()
         self.init_security_group()
         self.init_security_group_in_profile()
@@ -219,9 +288,6 @@ class NsxvFlowClassifierDriver(fc_driver.FlowClassifierDriverBase):
         return (flow_classifier.get('name')[:200] + '-' +
                 flow_classifier.get('id'))
 
-    def _is_the_same_rule(self, rule, flow_classifier_id):
-        return rule.find('name').text.endswith(flow_classifier_id)
-
     def init_redirect_fw_rule(self, redirect_rule, flow_classifier):
         et.SubElement(redirect_rule, 'name').text = self._rule_name(
             flow_classifier)
@@ -284,11 +350,17 @@ class NsxvFlowClassifierDriver(fc_driver.FlowClassifierDriverBase):
         """Create a redirect rule at the backend
         """
         flow_classifier = context.current
-        with self._loc_fw_section():
-            section = self.get_redirect_fw_section_from_backend()
-            new_rule = et.SubElement(section, 'rule')
+
+        def _create_rule(section, rules_index):
+            # Build the rule before adding it to the section, so that a
+            # failure does not leave a partial rule in the shared section
+            new_rule = et.Element('rule')
             self.init_redirect_fw_rule(new_rule, flow_classifier)
-            self.update_redirect_section_in_backed(section)
+            section.append(new_rule)
+            rules_index[flow_classifier['id']] = new_rule
+            return True
+
+        self._section_writer.apply(_create_rule)
 
     @log_helpers.log_method_call
     def update_flow_classifier(self, context):
@@ -296,48 +368,40 @@ class NsxvFlowClassifierDriver(fc_driver.FlowClassifierDriverBase):
         """
         flow_classifier = context.current
 
-        with self._loc_fw_section():
-            section = self.get_redirect_fw_section_from_backend()
-            redirect_rule = None
-            for rule in section.iter('rule'):
-                if self._is_the_same_rule(rule, flow_classifier['id']):
-                    redirect_rule = rule
-                    break
-
+        def _update_rule(section, rules_index):
+            redirect_rule = rules_index.get(flow_classifier['id'])
             if redirect_rule is None:
                 msg = _("Failed to find redirect rule %s "
                         "on backed") % flow_classifier['id']
                 raise exc.FlowClassifierException(message=msg)
-            else:
-                # The flowclassifier plugin currently supports updating only
-                # name or description
-                name = redirect_rule.find('name')
-                name.text = self._rule_name(flow_classifier)
-                notes = redirect_rule.find('notes')
-                notes.text = flow_classifier.get('description') or ''
-                self.update_redirect_section_in_backed(section)
+            # The flowclassifier plugin currently supports updating only
+            # name or description
+            name = redirect_rule.find('name')
+            name.text = self._rule_name(flow_classifier)
+            notes = redirect_rule.find('notes')
+            notes.text = flow_classifier.get('description') or ''
+            return True
+
+        self._section_writer.apply(_update_rule)
 
     @log_helpers.log_method_call
     def delete_flow_classifier(self, context):
         """Delete the backend redirect rule
         """
         flow_classifier_id = context.current['id']
-        with self._loc_fw_section():
-            section = self.get_redirect_fw_section_from_backend()
-            redirect_rule = None
-            for rule in section.iter('rule'):
-                if self._is_the_same_rule(rule, flow_classifier_id):
-                    redirect_rule = rule
-                    section.remove(redirect_rule)
-                    break
 
+        def _delete_rule(section, rules_index):
+            redirect_rule = rules_index.pop(flow_classifier_id, None)
             if redirect_rule is None:
                 LOG.error("Failed to delete redirect rule %s: "
                           "Could not find rule on backed",
                           flow_classifier_id)
                 # should not fail the deletion
-            else:
-                self.update_redirect_section_in_backed(section)
+                return False
+            section.remove(redirect_rule)
+            return True
+
+        self._section_writer.apply(_delete_rule)
 
     @log_helpers.log_method_call
     def create_flow_classifier_precommit(self, context):
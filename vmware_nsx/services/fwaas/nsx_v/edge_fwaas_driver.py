@@ -13,8 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+import time
+
+import eventlet
 from neutron_lib import context as n_context
 from neutron_lib.plugins import directory
+from oslo_config import cfg
 from oslo_log import helpers as log_helpers
 from oslo_log import log as logging
 
@@ -26,11 +31,13 @@ from vmware_nsx.plugins.nsx_v.vshield.common import (
     exceptions as vcns_exc)
 from vmware_nsx.plugins.nsx_v.vshield import edge_firewall_driver
 from vmware_nsx.plugins.nsx_v.vshield import edge_utils
+from vmware_nsx.plugins.nsx_v.vshield import vcns
 from vmware_nsx.plugins.nsx_v.vshield import vcns_driver
 
 LOG = logging.getLogger(__name__)
 FWAAS_DRIVER_NAME = 'Fwaas NSX-V driver'
 RULE_NAME_PREFIX = 'Fwaas-'
+MAX_EDGE_UPDATE_THREADS = 10
 
 
 class EdgeFwaasDriver(fwaas_base.FwaasDriverBase):
@@ -44,6 +51,8 @@ class EdgeFwaasDriver(fwaas_base.FwaasDriverBase):
         LOG.debug("Loading FWaaS NsxVDriver.")
         super(EdgeFwaasDriver, self).__init__()
         self._nsxv = vcns_driver.VcnsDriver(None)
+        # edge id -> (firewall generation, timestamp, before/after rules)
+        self._backend_rules_cache = {}
 
     def should_apply_firewall_to_router(self, router_data):
         """Return True if the firewall rules should be added the router
@@ -176,6 +185,24 @@ class EdgeFwaasDriver(fwaas_base.FwaasDriverBase):
 
         return before_rules, after_rules
 
+    def _get_cached_backend_rules(self, edge_id, generation):
+        """Return the cached non FWaaS rules of the edge, or None
+
+        The cached rules are valid only if the edge firewall was not changed
+        by this process since they were cached, and they are not older than
+        the configured TTL (as other servers may change the edge firewall).
+        """
+        cached = self._backend_rules_cache.get(edge_id)
+        if not cached:
+            return None
+        cached_generation, cached_at, rules = cached
+        ttl = cfg.CONF.nsxv.fwaas_backend_rules_cache_ttl
+        if (cached_generation != generation or
+            time.time() - cached_at > ttl):
+            del self._backend_rules_cache[edge_id]
+            return None
+        return copy.deepcopy(rules)
+
     def _set_rules_on_edge(self, context, edge_id, fw_id, translated_rules,
                            allow_external=False):
         """delete old FWaaS rules from the Edge, and add new ones
@@ -186,26 +213,82 @@ class EdgeFwaasDriver(fwaas_base.FwaasDriverBase):
         allow_external is usually False because it shouldn't exist with a
         firewall. It should only be True when the firewall is being deleted.
         """
-        # Get the existing backend rules which do not belong to FWaaS
-        backend_rules, after_rules = self._get_other_backend_rules(
-            context, edge_id)
-
-        # add new FWaaS rules at the correct location by their original order
-        backend_rules.extend(translated_rules)
-        backend_rules.extend(after_rules)
-
-        # update the backend
-        try:
-            with locking.LockManager.get_lock(str(edge_id)):
+        use_cache = cfg.CONF.nsxv.fwaas_backend_rules_cache_ttl > 0
+        with locking.LockManager.get_lock(str(edge_id)):
+            generation = vcns.get_edge_firewall_generation(edge_id)
+            other_rules = None
+            if use_cache:
+                other_rules = self._get_cached_backend_rules(edge_id,
+                                                             generation)
+            if other_rules is None:
+                # Get the existing backend rules which do not belong to
+                # FWaaS
+                other_rules = self._get_other_backend_rules(context, edge_id)
+            before_rules, after_rules = other_rules
+
+            # add new FWaaS rules at the correct location by their original
+            # order
+            backend_rules = copy.deepcopy(before_rules)
+            backend_rules.extend(translated_rules)
+            backend_rules.extend(copy.deepcopy(after_rules))
+
+            # update the backend
+            try:
                 self._nsxv.update_firewall(
                     edge_id,
                     {'firewall_rule_list': backend_rules},
                     context,
                     allow_external=allow_external)
-        except Exception as e:
-            # catch known library exceptions and raise Fwaas generic exception
-            LOG.error("Failed to update backend firewall %(fw)s: "
-                      "%(e)s", {'e': e, 'fw': fw_id})
+            except Exception as e:
+                self._backend_rules_cache.pop(edge_id, None)
+                # catch known library exceptions and raise Fwaas generic
+                # exception
+                LOG.error("Failed to update backend firewall %(fw)s on edge "
+                          "%(edge)s: %(e)s",
+                          {'e': e, 'fw': fw_id, 'edge': edge_id})
+                raise fw_ext.FirewallInternalDriverError(
+                    driver=FWAAS_DRIVER_NAME)
+
+            # Cache the non FWaaS rules only if no one else changed the edge
+            # firewall in the meantime
+            if (use_cache and
+                vcns.get_edge_firewall_generation(edge_id) ==
+                generation + 1):
+                self._backend_rules_cache[edge_id] = (
+                    generation + 1, time.time(), other_rules)
+
+    def _set_rules_on_edges(self, edges, fw_id, translated_rules,
+                            allow_external=False):
+        """Update the FWaaS rules of the edges concurrently
+
+        All the edges are handled even if some of them fail, and an error is
+        raised at the end so that the firewall status reflects the failure.
+        """
+        def _set_rules(edge_id):
+            # each green thread uses its own DB session
+            context = n_context.get_admin_context()
+            try:
+                self._set_rules_on_edge(context, edge_id, fw_id,
+                                        translated_rules,
+                                        allow_external=allow_external)
+            except fw_ext.FirewallInternalDriverError:
+                return edge_id
+            except Exception as e:
+                # Errors out of the backend update, like reading the edge
+                # rules, must not stop the update of the other edges
+                LOG.error("Failed to update firewall %(fw)s on edge "
+                          "%(edge)s: %(e)s",
+                          {'e': e, 'fw': fw_id, 'edge': edge_id})
+                return edge_id
+
+        pool = eventlet.GreenPool(min(MAX_EDGE_UPDATE_THREADS, len(edges)))
+        failed_edges = [edge_id for edge_id in pool.imap(_set_rules, edges)
+                        if edge_id]
+        if failed_edges:
+            LOG.error("Failed to update firewall %(fw)s on %(failed)s out "
+                      "of %(total)s edges: %(edges)s",
+                      {'fw': fw_id, 'failed': len(failed_edges),
+                       'total': len(edges), 'edges': failed_edges})
             raise fw_ext.FirewallInternalDriverError(driver=FWAAS_DRIVER_NAME)
 
     def _create_or_update_firewall(self, agent_mode, apply_list, firewall):
@@ -224,10 +307,8 @@ class EdgeFwaasDriver(fwaas_base.FwaasDriverBase):
             return
 
         rules = self._translate_rules(firewall['firewall_rule_list'])
-        # update each edge
-        for edge_id in router_edges:
-            self._set_rules_on_edge(
-                context, edge_id, firewall['id'], rules)
+        # update all the edges
+        self._set_rules_on_edges(router_edges, firewall['id'], rules)
 
     @log_helpers.log_method_call
     def create_firewall(self, agent_mode, apply_list, firewall):
@@ -244,9 +325,8 @@ class EdgeFwaasDriver(fwaas_base.FwaasDriverBase):
         context = n_context.get_admin_context()
         router_edges = self._get_routers_edges(context, apply_list)
         if router_edges:
-            for edge_id in router_edges:
-                self._set_rules_on_edge(context, edge_id, firewall['id'], [],
-                                        allow_external=allow_external)
+            self._set_rules_on_edges(router_edges, firewall['id'], [],
+                                     allow_external=allow_external)
 
     @log_helpers.log_method_call
     def delete_firewall(self, agent_mode, apply_list, firewall):
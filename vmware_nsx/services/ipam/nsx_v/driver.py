@@ -14,10 +14,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import atexit
+import time
+
+import eventlet
 import netaddr
 import xml.etree.ElementTree as et
 
+from oslo_concurrency import lockutils
+from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_service import loopingcall
 
 from neutron.extensions import external_net as ext_net_extn
 from neutron.extensions import multiprovidernet as mpnet
@@ -33,6 +40,228 @@ from vmware_nsx.services.ipam.common import driver as common
 
 LOG = logging.getLogger(__name__)
 
+MAX_PREFETCH_THREADS = 10
+
+# NSX pool id -> NsxvIpamPrefetchPool of the addresses reserved ahead
+_prefetch_pools = {}
+_prefetch_release_call = None
+
+
+def _parse_allocated_ip(response):
+    root = et.fromstring(response)
+    return (root.find('ipAddress').text,
+            int(root.find('prefixLength').text))
+
+
+class NsxvIpamPrefetchPool(object):
+    """IP addresses reserved ahead from an NSX IPAM pool.
+
+    Addresses are allocated from the backend in blocks of concurrent
+    requests, and kept in a bitmap indexed by their offset in the pool cidr
+    until they are handed out to neutron.
+    """
+
+    def __init__(self, vcns, nsx_pool_id, block_size):
+        self._vcns = vcns
+        self._nsx_pool_id = nsx_pool_id
+        self._block_size = block_size
+        self._lock_name = 'nsxv-ipam-prefetch-%s' % nsx_pool_id
+        # The cidr is learned from the first backend allocation
+        self._first = None
+        self._bitmap = None
+        self._count = 0
+        self._hint = 0
+        self.last_used = time.time()
+
+    def __len__(self):
+        return self._count
+
+    def _init_bitmap(self, ip_address, prefix_len):
+        cidr = netaddr.IPNetwork('%s/%s' % (ip_address, prefix_len))
+        self._first = cidr.first
+        self._bitmap = bytearray((cidr.size + 7) // 8)
+
+    def _offset(self, ip_address):
+        if self._bitmap is None:
+            return None
+        offset = int(netaddr.IPAddress(ip_address)) - self._first
+        if 0 <= offset < len(self._bitmap) * 8:
+            return offset
+
+    def _set(self, offset):
+        self._bitmap[offset // 8] |= 1 << (offset % 8)
+        self._count += 1
+
+    def _clear(self, offset):
+        self._bitmap[offset // 8] &= ~(1 << (offset % 8)) & 0xff
+        self._count -= 1
+
+    def _is_set(self, offset):
+        return bool(self._bitmap[offset // 8] & (1 << (offset % 8)))
+
+    def _allocate_one(self, dummy):
+        try:
+            response = self._vcns.allocate_ipam_ip_from_pool(
+                self._nsx_pool_id)[1]
+        except vc_exc.VcnsApiException as e:
+            if (_get_vcns_error_code(e) ==
+                constants.NSX_ERROR_IPAM_ALLOCATE_ALL_USED):
+                return None
+            raise
+        return _parse_allocated_ip(response)
+
+    def _try_allocate_one(self, dummy):
+        # Return the error instead of raising it, so that all the requests
+        # of the block complete and their addresses are known
+        try:
+            return self._allocate_one(dummy), None
+        except Exception as e:
+            return None, e
+
+    def _release_ip(self, ip_address):
+        try:
+            self._vcns.release_ipam_ip_to_pool(self._nsx_pool_id, ip_address)
+        except vc_exc.VcnsApiException as e:
+            LOG.warning("NSX IPAM failed to return prefetched ip %(ip)s to "
+                        "pool %(pool)s: %(e)s",
+                        {'ip': ip_address, 'e': e.response,
+                         'pool': self._nsx_pool_id})
+
+    def _reserve_block(self):
+        """Reserve a block of addresses from the backend pool
+
+        If an allocation fails, the addresses allocated for the block are
+        returned to the backend and the error is raised.
+        """
+        pool = eventlet.GreenPool(min(MAX_PREFETCH_THREADS,
+                                      self._block_size))
+        allocations = []
+        error = None
+        for allocated, e in pool.imap(self._try_allocate_one,
+                                      range(self._block_size)):
+            if e is not None:
+                error = error or e
+            elif allocated is not None:
+                # None means there are no more free addresses on the backend
+                allocations.append(allocated)
+        if error is not None:
+            LOG.error("IPAM pool %(pool)s: Failed to reserve addresses "
+                      "ahead: %(e)s", {'pool': self._nsx_pool_id, 'e': error})
+            for ip_address, prefix_len in allocations:
+                self._release_ip(ip_address)
+            raise error
+        for ip_address, prefix_len in allocations:
+            if self._bitmap is None:
+                self._init_bitmap(ip_address, prefix_len)
+            offset = self._offset(ip_address)
+            if offset is not None and not self._is_set(offset):
+                self._set(offset)
+        LOG.debug("IPAM pool %(pool)s: %(count)s addresses are reserved "
+                  "ahead", {'pool': self._nsx_pool_id, 'count': self._count})
+
+    def _pop_offset(self):
+        for index in range(self._hint, len(self._bitmap)):
+            byte = self._bitmap[index]
+            if byte:
+                self._hint = index
+                bit = (byte & -byte).bit_length() - 1
+                offset = index * 8 + bit
+                self._clear(offset)
+                return offset
+
+    def pop(self):
+        """Hand out a reserved address, reserving a new block if needed.
+
+        Return None if the backend pool has no more free addresses.
+        """
+        with lockutils.lock(self._lock_name):
+            self.last_used = time.time()
+            if not self._count:
+                self._hint = 0
+                self._reserve_block()
+            if not self._count:
+                return None
+            return str(netaddr.IPAddress(self._first + self._pop_offset()))
+
+    def take(self, ip_address):
+        """Hand out a specific address if it is reserved locally"""
+        with lockutils.lock(self._lock_name):
+            offset = self._offset(ip_address)
+            if offset is None or not self._is_set(offset):
+                return False
+            self._clear(offset)
+            self._hint = min(self._hint, offset // 8)
+            self.last_used = time.time()
+            return True
+
+    def release(self):
+        """Return all the unused reserved addresses to the backend"""
+        with lockutils.lock(self._lock_name):
+            if not self._count:
+                return
+            LOG.debug("IPAM pool %(pool)s: Returning %(count)s prefetched "
+                      "addresses", {'pool': self._nsx_pool_id,
+                                    'count': self._count})
+            for index, byte in enumerate(self._bitmap):
+                if not byte:
+                    continue
+                for bit in range(8):
+                    if not byte & (1 << bit):
+                        continue
+                    offset = index * 8 + bit
+                    self._release_ip(
+                        str(netaddr.IPAddress(self._first + offset)))
+                    self._clear(offset)
+            self._hint = 0
+
+
+def _get_vcns_error_code(e):
+    """Get the error code out of VcnsApiException"""
+    try:
+        desc = et.fromstring(e.response)
+        return int(desc.find('errorCode').text)
+    except Exception:
+        LOG.error('IPAM pool: Error code not present. %s',
+            e.response)
+
+
+def _get_prefetch_pool(vcns, nsx_pool_id):
+    global _prefetch_release_call
+    with lockutils.lock('nsxv-ipam-prefetch'):
+        if nsx_pool_id not in _prefetch_pools:
+            _prefetch_pools[nsx_pool_id] = NsxvIpamPrefetchPool(
+                vcns, nsx_pool_id, cfg.CONF.nsxv.ipam_prefetch_size)
+        if _prefetch_release_call is None:
+            interval = cfg.CONF.nsxv.ipam_prefetch_release_interval
+            _prefetch_release_call = loopingcall.FixedIntervalLoopingCall(
+                release_prefetched_ips, idle_interval=interval)
+            _prefetch_release_call.start(interval=interval,
+                                         initial_delay=interval)
+        return _prefetch_pools[nsx_pool_id]
+
+
+def release_prefetched_ips(idle_interval=None, nsx_pool_id=None):
+    """Return unused prefetched addresses to the backend pools.
+
+    If idle_interval is set, only pools which were not used during that
+    number of seconds are released.
+    If nsx_pool_id is set, only this pool is released, and forgotten.
+    """
+    if nsx_pool_id:
+        pool = _prefetch_pools.pop(nsx_pool_id, None)
+        pools = [pool] if pool else []
+    else:
+        now = time.time()
+        pools = [pool for pool in list(_prefetch_pools.values())
+                 if (not idle_interval or
+                     now - pool.last_used >= idle_interval)]
+    for pool in pools:
+        pool.release()
+
+
+# Do not leave reserved addresses behind on the backend when the server stops
+atexit.register(release_prefetched_ips)
+
 
 class NsxVIpamBase(common.NsxIpamBase):
 
@@ -110,6 +339,8 @@ class NsxvIpamDriver(common.NsxAbstractIpamDriver, NsxVIpamBase):
         return nsx_pool_id
 
     def delete_backend_pool(self, nsx_pool_id):
+        # The backend pool cannot be deleted while it has reserved addresses
+        release_prefetched_ips(nsx_pool_id=nsx_pool_id)
         try:
             self._vcns.delete_ipam_ip_pool(nsx_pool_id)
         except vc_exc.VcnsApiException as e:
@@ -128,28 +359,36 @@ class NsxvIpamSubnet(common.NsxAbstractIpamSubnet, NsxVIpamBase):
 
     def _get_vcns_error_code(self, e):
         """Get the error code out of VcnsApiException"""
-        try:
-            desc = et.fromstring(e.response)
-            return int(desc.find('errorCode').text)
-        except Exception:
-            LOG.error('IPAM pool: Error code not present. %s',
-                e.response)
+        return _get_vcns_error_code(e)
+
+    @property
+    def _prefetch_pool(self):
+        if cfg.CONF.nsxv.ipam_prefetch_size:
+            return _get_prefetch_pool(self._vcns, self._nsx_pool_id)
 
     def backend_allocate(self, address_request):
+        ip_address = None
+        prefetch_pool = self._prefetch_pool
         try:
             # allocate a specific IP
             if isinstance(address_request, ipam_req.SpecificAddressRequest):
                 # This handles both specific and automatic address requests
                 ip_address = str(address_request.address)
-                self._vcns.allocate_ipam_ip_from_pool(self._nsx_pool_id,
-                                                      ip_addr=ip_address)
+                if not (prefetch_pool and prefetch_pool.take(ip_address)):
+                    self._vcns.allocate_ipam_ip_from_pool(self._nsx_pool_id,
+                                                          ip_addr=ip_address)
+            elif prefetch_pool:
+                # Use an IP reserved ahead on the backend
+                ip_address = prefetch_pool.pop()
+                if not ip_address:
+                    raise ipam_exc.IpAddressGenerationFailure(
+                        subnet_id=self._subnet_id)
             else:
                 # Allocate any free IP
                 response = self._vcns.allocate_ipam_ip_from_pool(
                     self._nsx_pool_id)[1]
                 # get the ip from the response
-                root = et.fromstring(response)
-                ip_address = root.find('ipAddress').text
+                ip_address = _parse_allocated_ip(response)[0]
         except vc_exc.VcnsApiException as e:
             # handle backend failures
             error_code = self._get_vcns_error_code(e)
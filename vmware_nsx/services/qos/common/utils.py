@@ -14,10 +14,79 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
+from oslo_config import cfg
+
 from neutron.objects.qos import policy as qos_policy
 
+from vmware_nsx.db import db as nsx_db
+
+# Maximal number of cached bindings of each type, to bound the memory used
+# by bindings of deleted objects
+MAX_CACHED_BINDINGS = 10000
+
+
+class QosBindingCache(object):
+    """Process local cache of object id -> QoS policy id.
+
+    The binding update functions of this module invalidate the entries
+    again once their transaction is committed, so that an old binding
+    cached by a concurrent read is dropped, and the bindings are cached
+    only when read outside of a DB transaction. Entries expire after
+    NSX.qos_binding_cache_ttl seconds, so that bindings changed by other
+    neutron servers are eventually read again from the DB.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    @property
+    def _ttl(self):
+        return cfg.CONF.NSX.qos_binding_cache_ttl
+
+    def get(self, obj_id):
+        """Return a (found, policy id) tuple for the object"""
+        entry = self._entries.get(obj_id)
+        if entry and entry[1] > time.time():
+            return True, entry[0]
+        return False, None
+
+    def set(self, obj_id, policy_id):
+        if not self._ttl:
+            return
+        now = time.time()
+        if len(self._entries) >= MAX_CACHED_BINDINGS:
+            # drop the expired entries, or everything if none expired
+            self._entries = dict((key, entry) for key, entry in
+                                 self._entries.items() if entry[1] > now)
+            if len(self._entries) >= MAX_CACHED_BINDINGS:
+                self._entries = {}
+        self._entries[obj_id] = (policy_id, now + self._ttl)
+
+    def remove(self, obj_id):
+        self._entries.pop(obj_id, None)
+
+    def clear(self):
+        self._entries = {}
+
+
+_port_policy_cache = QosBindingCache()
+_network_policy_cache = QosBindingCache()
+
+
+def clear_policy_binding_cache():
+    _port_policy_cache.clear()
+    _network_policy_cache.clear()
+
 
 def update_network_policy_binding(context, net_id, new_policy_id):
+    # the binding is read again from the DB once the update is committed,
+    # also if a concurrent read cached the old binding in the meantime
+    _network_policy_cache.remove(net_id)
+    nsx_db.call_after_commit(context.session, _network_policy_cache.remove,
+                             net_id)
+
     # detach the old policy (if exists) from the network
     old_policy = qos_policy.QosPolicy.get_network_policy(
         context, net_id)
@@ -35,6 +104,12 @@ def update_network_policy_binding(context, net_id, new_policy_id):
 
 
 def update_port_policy_binding(context, port_id, new_policy_id):
+    # the binding is read again from the DB once the update is committed,
+    # also if a concurrent read cached the old binding in the meantime
+    _port_policy_cache.remove(port_id)
+    nsx_db.call_after_commit(context.session, _port_policy_cache.remove,
+                             port_id)
+
     # detach the old policy (if exists) from the port
     old_policy = qos_policy.QosPolicy.get_port_policy(
         context, port_id)
@@ -52,14 +127,26 @@ def update_port_policy_binding(context, port_id, new_policy_id):
 
 
 def get_port_policy_id(context, port_id):
+    found, policy_id = _port_policy_cache.get(port_id)
+    if found:
+        return policy_id
     policy = qos_policy.QosPolicy.get_port_policy(
         context, port_id)
-    if policy:
-        return policy.id
+    policy_id = policy.id if policy else None
+    # a binding read inside a transaction may still be rolled back
+    if not context.session.is_active:
+        _port_policy_cache.set(port_id, policy_id)
+    return policy_id
 
 
 def get_network_policy_id(context, net_id):
+    found, policy_id = _network_policy_cache.get(net_id)
+    if found:
+        return policy_id
     policy = qos_policy.QosPolicy.get_network_policy(
         context, net_id)
-    if policy:
-        return policy.id
+    policy_id = policy.id if policy else None
+    # a binding read inside a transaction may still be rolled back
+    if not context.session.is_active:
+        _network_policy_cache.set(net_id, policy_id)
+    return policy_id
@@ -14,14 +14,22 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
 from oslo_log import log as logging
 
 from neutron.common import constants as n_consts
 from neutron.services.qos.drivers import base
 from neutron.services.qos import qos_consts
 
+from vmware_nsx._i18n import _
+from vmware_nsx.common import exceptions as nsx_exc
+from vmware_nsx.dvs import dvs_utils
+from vmware_nsx.services.qos.nsx_v import utils as qos_utils
+
 LOG = logging.getLogger(__name__)
 DRIVER = None
+# Report the policy update progress every this number of port groups
+PROGRESS_REPORT_INTERVAL = 100
 SUPPORTED_RULES = {
     qos_consts.RULE_TYPE_BANDWIDTH_LIMIT: {
         qos_consts.MAX_KBPS: {
@@ -63,13 +71,59 @@ class NSXvQosDriver(base.DriverBase):
     def create_policy(self, context, policy):
         pass
 
+    def _update_port_group(self, args):
+        net_id, dvs_id, net_moref, qos_data = args
+        try:
+            self.core_plugin._update_qos_on_backend_port_group(
+                net_id, dvs_id, net_moref, qos_data)
+        except Exception as e:
+            LOG.error("Failed to update QoS of network %(net)s port group "
+                      "%(moref)s: %(e)s",
+                      {'net': net_id, 'moref': net_moref, 'e': e})
+            return net_id
+
     def update_policy(self, context, policy):
         # get all the bound networks of this policy
         networks = policy.get_bound_networks()
+        if not networks:
+            return
+
+        # Translate the QoS rule data into Nsx values once for all networks
+        qos_data = qos_utils.NsxVQosRule(
+            context=context, qos_policy_id=policy.id)
+
+        # Collect the port groups from the DB before going to the backend
+        port_groups = []
         for net_id in networks:
-            # update the new bw limitations for this network
-            self.core_plugin._update_qos_on_backend_network(
-                context, net_id, policy.id)
+            for dvs_id, net_moref in (
+                self.core_plugin._get_qos_backend_network_mappings(
+                    context, net_id)):
+                port_groups.append((net_id, dvs_id, net_moref, qos_data))
+        if not port_groups:
+            return
+
+        # update the new bw limitations of the port groups concurrently.
+        # The DVS manager limits the concurrent tasks on the vCenter.
+        pool = eventlet.GreenPool(min(dvs_utils.dvs_max_concurrent_tasks_get(),
+                                      len(port_groups)))
+        failed_networks = set()
+        for count, failed_net in enumerate(
+                pool.imap(self._update_port_group, port_groups), 1):
+            if failed_net:
+                failed_networks.add(failed_net)
+            if (count % PROGRESS_REPORT_INTERVAL == 0 or
+                count == len(port_groups)):
+                LOG.info("QoS policy %(policy)s: updated %(count)s of "
+                         "%(total)s port groups",
+                         {'policy': policy.id, 'count': count,
+                          'total': len(port_groups)})
+
+        if failed_networks:
+            msg = (_("Failed to update QoS policy %(policy)s on networks "
+                     "%(nets)s") % {
+                'policy': policy.id,
+                'nets': ', '.join(sorted(failed_networks))})
+            raise nsx_exc.NsxPluginException(err_msg=msg)
 
     def delete_policy(self, context, policy):
         pass
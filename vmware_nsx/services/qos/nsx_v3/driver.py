@@ -67,15 +67,7 @@ class NSXv3QosDriver(base.DriverBase):
 
     def update_policy(self, context, policy):
         if (hasattr(policy, "rules")):
-            # we may have up to 1 rule of each type
-            bw_rule = None
-            dscp_rule = None
-            for rule in policy["rules"]:
-                if rule.rule_type == qos_consts.RULE_TYPE_BANDWIDTH_LIMIT:
-                    bw_rule = rule
-                else:
-                    dscp_rule = rule
-
+            bw_rule, dscp_rule = qos_utils.get_policy_rules(policy)
             self.handler.update_policy_rules(
                 context, policy.id, bw_rule, dscp_rule)
 
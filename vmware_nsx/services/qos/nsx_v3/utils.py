@@ -14,9 +14,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 
+from neutron.services.qos import qos_consts
 from neutron_lib.api import validators
 from neutron_lib.plugins import directory
 
@@ -30,6 +32,21 @@ MAX_KBPS_MIN_VALUE = 1024
 # The max limit is calculated so that the value sent to the backed will
 # be smaller than 2**31
 MAX_BURST_MAX_VALUE = int((2 ** 31 - 1) / 128)
+# Maximal number of switch profiles updated concurrently
+MAX_UPDATE_THREADS = 10
+
+
+def get_policy_rules(policy):
+    """Return the (bw limit rule, dscp marking rule) of a QoS policy"""
+    # we may have up to 1 rule of each type
+    bw_rule = None
+    dscp_rule = None
+    for rule in policy["rules"]:
+        if rule.rule_type == qos_consts.RULE_TYPE_BANDWIDTH_LIMIT:
+            bw_rule = rule
+        else:
+            dscp_rule = rule
+    return bw_rule, dscp_rule
 
 
 class QosNotificationsHandler(object):
@@ -155,7 +172,44 @@ class QosNotificationsHandler(object):
         """
         profile_id = nsx_db.get_switch_profile_by_qos_policy(
             context.session, policy_id)
+        self._update_profile_rules(profile_id, bw_rule, dscp_rule)
+
+    def update_policies_rules(self, context, policies_rules):
+        """Update the QoS switch profiles of several policies together
 
+        policies_rules is a list of (policy id, bw rule, dscp rule) tuples.
+        The switch profiles of all the policies are found with one DB query,
+        and the backend updates are sent concurrently.
+        Return the ids of the policies whose switch profile failed to update.
+        """
+        if not policies_rules:
+            return []
+        profiles = nsx_db.get_switch_profiles_by_qos_policies(
+            context.session,
+            [policy_id for policy_id, bw, dscp in policies_rules])
+
+        def _update(policy_rules):
+            policy_id, bw_rule, dscp_rule = policy_rules
+            profile_id = profiles.get(policy_id)
+            if not profile_id:
+                LOG.error("QoS policy %s has no switch profile on the "
+                          "backend", policy_id)
+                return policy_id
+            try:
+                self._update_profile_rules(profile_id, bw_rule, dscp_rule)
+            except Exception as e:
+                LOG.error("Failed to update the switch profile %(profile)s "
+                          "of QoS policy %(policy)s: %(e)s",
+                          {'profile': profile_id, 'policy': policy_id,
+                           'e': e})
+                return policy_id
+
+        pool = eventlet.GreenPool(min(MAX_UPDATE_THREADS,
+                                      len(policies_rules)))
+        return [policy_id for policy_id in pool.imap(_update, policies_rules)
+                if policy_id]
+
+    def _update_profile_rules(self, profile_id, bw_rule, dscp_rule):
         (shaping_enabled, burst_size, peak_bw,
             average_bw) = self._get_bw_values_from_rule(bw_rule)
 
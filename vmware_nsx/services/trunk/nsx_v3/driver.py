@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
@@ -38,6 +39,7 @@ SUPPORTED_INTERFACES = (
 SUPPORTED_SEGMENTATION_TYPES = (
     trunk_consts.VLAN,
 )
+MAX_SUBPORT_UPDATE_THREADS = 10
 
 
 class NsxV3TrunkHandler(object):
@@ -56,12 +58,8 @@ class NsxV3TrunkHandler(object):
             switch_profile_ids.append(switch_profile)
         return switch_profile_ids
 
-    def _update_port_at_backend(self, context, parent_port_id, subport):
-        # Retrieve the child port details
-        child_port = self.plugin_driver.get_port(context, subport.port_id)
-        # Retrieve the logical port ID based on the child port's neutron ID
-        nsx_child_port_id = nsx_db.get_nsx_switch_and_port_id(
-            session=context.session, neutron_id=subport.port_id)[1]
+    def _update_subport_at_backend(self, parent_port_id, subport,
+                                   child_port, nsx_child_port_id):
         # Retrieve child logical port from the backend
         try:
             nsx_child_port = self.plugin_driver.nsxlib.logical_port.get(
@@ -106,40 +104,81 @@ class NsxV3TrunkHandler(object):
                           "type. Setting trunk status to ERROR. "
                           "Exception is %s", e)
 
+    def _update_subports_at_backend(self, context, parent_port_id, subports):
+        """Set or unset the parent port of the subports on the backend
+
+        The child ports and their NSX mappings are read from the DB at once,
+        and the logical ports are then read and updated concurrently.
+        Returns the IDs of the subports which failed to be updated.
+        """
+        if not subports:
+            return []
+        port_ids = [subport.port_id for subport in subports]
+        child_ports = dict(
+            (port['id'], port) for port in self.plugin_driver.get_ports(
+                context, filters={'id': port_ids}))
+        nsx_port_ids = nsx_db.get_nsx_port_ids_by_neutron_ids(
+            context.session, port_ids)
+
+        def _update_subport(subport):
+            child_port = child_ports.get(subport.port_id)
+            nsx_child_port_id = nsx_port_ids.get(subport.port_id)
+            if not child_port or not nsx_child_port_id:
+                LOG.error("Child port %s or its NSX mapping was not found. "
+                          "Setting trunk status to ERROR.", subport.port_id)
+                return subport.port_id
+            try:
+                self._update_subport_at_backend(
+                    parent_port_id, subport, child_port, nsx_child_port_id)
+            except (nsxlib_exc.ManagerError, nsxlib_exc.ResourceNotFound):
+                return subport.port_id
+
+        pool = eventlet.GreenPool(min(MAX_SUBPORT_UPDATE_THREADS,
+                                      len(subports)))
+        failed_subports = [port_id for port_id in
+                           pool.imap(_update_subport, subports) if port_id]
+        if failed_subports:
+            LOG.error("Failed to update %(failed)s out of %(total)s "
+                      "subports on the backend: %(ports)s",
+                      {'failed': len(failed_subports),
+                       'total': len(subports), 'ports': failed_subports})
+        return failed_subports
+
     def _set_subports(self, context, parent_port_id, subports):
-        for subport in subports:
-            # Update port with parent port for backend.
-            self._update_port_at_backend(context, parent_port_id, subport)
+        # Update ports with parent port for backend.
+        return self._update_subports_at_backend(
+            context, parent_port_id, subports)
 
     def _unset_subports(self, context, subports):
-        for subport in subports:
-            # Update port and remove parent port attachment in the backend
-            self._update_port_at_backend(
-                context=context, parent_port_id=None, subport=subport)
+        # Update ports and remove parent port attachment in the backend
+        return self._update_subports_at_backend(context, None, subports)
+
+    def _get_trunk_status(self, subports, failed_subports):
+        if not failed_subports:
+            return trunk_consts.ACTIVE_STATUS
+        if len(failed_subports) < len(subports):
+            return trunk_consts.DEGRADED_STATUS
+        return trunk_consts.ERROR_STATUS
 
     def trunk_created(self, context, trunk):
-        try:
-            if trunk.sub_ports:
-                self._set_subports(context, trunk.port_id, trunk.sub_ports)
-            trunk.update(status=trunk_consts.ACTIVE_STATUS)
-        except (nsxlib_exc.ManagerError, nsxlib_exc.ResourceNotFound):
-            trunk.update(status=trunk_consts.ERROR_STATUS)
+        failed_subports = self._set_subports(
+            context, trunk.port_id, trunk.sub_ports)
+        trunk.update(status=self._get_trunk_status(trunk.sub_ports,
+                                                   failed_subports))
 
     def trunk_deleted(self, context, trunk):
         self._unset_subports(context, trunk.sub_ports)
 
     def subports_added(self, context, trunk, subports):
-        try:
-            self._set_subports(context, trunk.port_id, subports)
-            trunk.update(status=trunk_consts.ACTIVE_STATUS)
-        except (nsxlib_exc.ManagerError, nsxlib_exc.ResourceNotFound):
-            trunk.update(status=trunk_consts.ERROR_STATUS)
+        failed_subports = self._set_subports(context, trunk.port_id, subports)
+        trunk.update(status=self._get_trunk_status(subports,
+                                                   failed_subports))
 
     def subports_deleted(self, context, trunk, subports):
-        try:
-            self._unset_subports(context, subports)
-        except (nsxlib_exc.ManagerError, nsxlib_exc.ResourceNotFound):
-            trunk.update(status=trunk_consts.ERROR_STATUS)
+        failed_subports = self._unset_subports(context, subports)
+        if failed_subports:
+            trunk.update(status=self._get_trunk_status(subports,
+                                                       failed_subports))
 
     def trunk_event(self, resource, event, trunk_plugin, payload):
         if event == events.AFTER_CREATE:
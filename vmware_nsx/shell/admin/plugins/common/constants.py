@@ -36,6 +36,7 @@ PORTS = 'ports'
 METADATA_PROXY = 'metadata-proxy'
 ORPHANED_DHCP_SERVERS = 'orphaned-dhcp-servers'
 CERTIFICATE = 'certificate'
+QOS_POLICIES = 'qos-policies'
 
 # NSXV only Resource Constants
 EDGES = 'edges'
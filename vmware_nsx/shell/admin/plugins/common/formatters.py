@@ -28,11 +28,15 @@ def output_formatter(resource_name, resources_list, attrs):
     JSON or as a table.
     """
     LOG.info('%(resource_name)s', {'resource_name': resource_name})
+    fmt = cfg.CONF.fmt
     if not resources_list:
         LOG.info('No resources found')
+        # Always emit a JSON document, so that it can be parsed
+        if fmt == 'json':
+            return jsonutils.dumps({resource_name: []}, sort_keys=True,
+                                   indent=4)
         return ''
 
-    fmt = cfg.CONF.fmt
     if fmt == 'psql':
         tableout = prettytable.PrettyTable(attrs)
         tableout.padding_width = 1
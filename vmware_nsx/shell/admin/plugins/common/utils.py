@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
 import six
 import sys
 
@@ -56,6 +57,109 @@ def parse_multi_keyval_opt(opt_list):
     return result
 
 
+def read_progress_file(progress_file):
+    """Return the set of resource ids listed in a progress file
+
+    Admin utilities updating many resources write the id of each updated
+    resource to a progress file, one per line, so an interrupted run can be
+    resumed. A missing file means nothing was updated yet.
+    """
+    try:
+        with open(progress_file) as f:
+            return set(line.strip() for line in f if line.strip())
+    except IOError:
+        return set()
+
+
+def update_resources(resource_ids, update_func, threads=1,
+                     progress_file=None, resource_type='resources'):
+    """Call update_func for each of the resources using green threads
+
+    Up to threads resources are updated concurrently. A resource fails to
+    update if update_func raises an exception or returns False.
+    If progress_file is given, the resources it lists are skipped, and the
+    updated resources are added to it, so an interrupted run can be resumed.
+    Return the list of resources which failed to update.
+    """
+    updated = read_progress_file(progress_file) if progress_file else set()
+    pending = [resource_id for resource_id in resource_ids
+               if resource_id not in updated]
+    if len(pending) < len(resource_ids):
+        LOG.info("Skipping %(count)s %(type)s which were already updated",
+                 {'count': len(resource_ids) - len(pending),
+                  'type': resource_type})
+
+    def _update_resource(resource_id):
+        try:
+            return resource_id, update_func(resource_id) is not False
+        except Exception as e:
+            LOG.error("Failed to update %(id)s. Exception: %(e)s",
+                      {'id': resource_id, 'e': str(e)})
+            return resource_id, False
+
+    failed = []
+    progress = open(progress_file, 'a') if progress_file else None
+    try:
+        pool = eventlet.GreenPool(threads)
+        for count, (resource_id, success) in enumerate(
+                pool.imap(_update_resource, pending), 1):
+            if not success:
+                failed.append(resource_id)
+            elif progress:
+                progress.write('%s\n' % resource_id)
+                progress.flush()
+            LOG.info("Processed %(count)s of %(total)s %(type)s",
+                     {'count': count, 'total': len(pending),
+                      'type': resource_type})
+    finally:
+        if progress:
+            progress.close()
+    return failed
+
+
+def _iter_sorted(items, key):
+    last_key = None
+    for item in items:
+        item_key = key(item)
+        if last_key is not None and item_key < last_key:
+            raise ValueError(_("Resources are not sorted: %(key)s is after "
+                               "%(last)s") % {'key': item_key,
+                                              'last': last_key})
+        last_key = item_key
+        yield item_key, item
+
+
+def merge_join(left, right, left_key, right_key):
+    """Match the items of two sequences sorted by their keys
+
+    The neutron and backend resources are streamed once, side by side,
+    so the comparison is linear and does not keep the resources in memory.
+    Yield (left item, right item) for the matching items, and (item, None)
+    or (None, item) for the items without a match in the other sequence.
+    ValueError is raised if any of the sequences is not sorted.
+    """
+    left = _iter_sorted(left, left_key)
+    right = _iter_sorted(right, right_key)
+    left_item = next(left, None)
+    right_item = next(right, None)
+    right_matched = False
+    while left_item is not None or right_item is not None:
+        if right_item is None or (left_item is not None and
+                                  left_item[0] < right_item[0]):
+            yield left_item[1], None
+            left_item = next(left, None)
+        elif left_item is None or right_item[0] < left_item[0]:
+            if not right_matched:
+                yield None, right_item[1]
+            right_item = next(right, None)
+            right_matched = False
+        else:
+            # Several left items may match the same right item
+            yield left_item[1], right_item[1]
+            right_matched = True
+            left_item = next(left, None)
+
+
 def query_yes_no(question, default="yes"):
     """Ask a yes/no question via raw_input() and return their answer.
 
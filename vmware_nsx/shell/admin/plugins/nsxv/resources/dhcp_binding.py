@@ -13,13 +13,15 @@
 #    under the License.
 
 
-import pprint
+import collections
 
+import eventlet
 from neutron_lib import context as n_context
 from oslo_config import cfg
 from oslo_log import log as logging
 
 from vmware_nsx.shell.admin.plugins.common import constants
+from vmware_nsx.shell.admin.plugins.common import formatters
 import vmware_nsx.shell.admin.plugins.common.utils as admin_utils
 import vmware_nsx.shell.admin.plugins.nsxv.resources.utils as utils
 import vmware_nsx.shell.resources as shell
@@ -37,6 +39,8 @@ from vmware_nsx.plugins.nsx_v.vshield import vcns_driver
 
 
 LOG = logging.getLogger(__name__)
+# Default number of edges whose DHCP configuration is read concurrently
+DEFAULT_AUDIT_THREADS = 10
 nsxv = utils.get_nsxv_client()
 neutron_db = utils.NeutronDbClient()
 
@@ -63,43 +67,90 @@ def nsx_get_static_bindings_by_edge(edge_id):
     return nsx_dhcp_static_bindings
 
 
-def neutron_get_static_bindings_by_edge(edge_id):
-    neutron_db_dhcp_bindings = set()
-    for binding in nsxv_db.get_dhcp_static_bindings_by_edge(
-            neutron_db.context.session, edge_id):
-        neutron_db_dhcp_bindings.add(
+def neutron_get_static_bindings_by_edges():
+    """Return the neutron DHCP static bindings of all the edges
+
+    All the bindings are read with one query, and grouped by edge.
+    """
+    neutron_db_dhcp_bindings = collections.defaultdict(set)
+    for binding in nsxv_db.get_dhcp_static_bindings(
+            neutron_db.context.session):
+        neutron_db_dhcp_bindings[binding.edge_id].add(
             (binding.edge_id, binding.mac_address.lower(),
              binding.binding_id.lower()))
     return neutron_db_dhcp_bindings
 
 
-@admin_utils.output_header
-def list_missing_dhcp_bindings(resource, event, trigger, **kwargs):
-    """List missing DHCP bindings from NSXv backend.
+def _binding_diff(edge_id, binding, diff):
+    return {'edge_id': edge_id,
+            'mac_address': binding[1] if binding else None,
+            'binding_id': binding[2] if binding else None,
+            'diff': diff}
 
-    Missing DHCP bindings are those that exist in Neutron DB;
-    but are not present on corresponding NSXv Edge.
+
+def nsx_get_dhcp_edge_ids():
+    """Return the ids of the backend DHCP edges"""
+    return set(edge['id'] for edge in utils.get_nsxv_backend_edges()
+               if (edge.get('name') or '').startswith(
+                   nsxv_constants.DHCP_EDGE_PREFIX))
+
+
+def get_dhcp_bindings_diff(threads=DEFAULT_AUDIT_THREADS):
+    """Compare the DHCP static bindings of the neutron DB and the edges
+
+    The edges with neutron bindings and the backend DHCP edges are
+    audited, and their DHCP configurations are read concurrently. Return a
+    list of differences, each with the edge id, the binding MAC address
+    and id, and one of:
+    - missing: the binding exists in neutron but not on the edge
+    - extra: the binding exists on the edge but not in neutron
+    - edge-not-found: the edge of neutron bindings was not found
     """
-    for (edge_id, count) in nsxv_db.get_nsxv_dhcp_bindings_count_per_edge(
-            neutron_db.context.session):
+    neutron_bindings = neutron_get_static_bindings_by_edges()
+    edge_ids = sorted(set(neutron_bindings) | nsx_get_dhcp_edge_ids())
+    pool = eventlet.GreenPool(threads)
+    diffs = []
+    for edge_id, nsx_bindings in zip(
+            edge_ids, pool.imap(nsx_get_static_bindings_by_edge, edge_ids)):
         LOG.info("%s", "=" * 60)
         LOG.info("For edge: %s", edge_id)
-        nsx_dhcp_static_bindings = nsx_get_static_bindings_by_edge(edge_id)
-        if nsx_dhcp_static_bindings is None:
+        edge_neutron_bindings = neutron_bindings.get(edge_id, set())
+        if nsx_bindings is None:
+            # A backend edge deleted since it was listed is not a difference
+            if edge_neutron_bindings:
+                diffs.append(_binding_diff(edge_id, None, 'edge-not-found'))
             continue
-        neutron_dhcp_static_bindings = \
-            neutron_get_static_bindings_by_edge(edge_id)
         LOG.info("# of DHCP bindings in Neutron DB: %s",
-                 len(neutron_dhcp_static_bindings))
+                 len(edge_neutron_bindings))
         LOG.info("# of DHCP bindings on NSXv backend: %s",
-                 len(nsx_dhcp_static_bindings))
-        missing = neutron_dhcp_static_bindings - nsx_dhcp_static_bindings
-        if not missing:
-            LOG.info("No missing DHCP bindings found.")
-            LOG.info("Neutron DB and NSXv backend are in sync")
-        else:
-            LOG.info("Missing DHCP bindings:")
-            LOG.info("%s", pprint.pformat(missing))
+                 len(nsx_bindings))
+        for binding in sorted(edge_neutron_bindings - nsx_bindings):
+            diffs.append(_binding_diff(edge_id, binding, 'missing'))
+        for binding in sorted(nsx_bindings - edge_neutron_bindings):
+            diffs.append(_binding_diff(edge_id, binding, 'extra'))
+    return diffs
+
+
+@admin_utils.output_header
+def list_missing_dhcp_bindings(resource, event, trigger, **kwargs):
+    """List missing DHCP bindings from NSXv backend.
+
+    Missing DHCP bindings are those that exist in Neutron DB;
+    but are not present on corresponding NSXv Edge.
+    Bindings which exist only on the edge are listed too. With --fmt json
+    the differences are printed as JSON.
+    """
+    threads = DEFAULT_AUDIT_THREADS
+    if kwargs.get('property'):
+        properties = admin_utils.parse_multi_keyval_opt(kwargs['property'])
+        threads = int(properties.get('threads', threads))
+    diffs = get_dhcp_bindings_diff(threads=threads)
+    if not diffs:
+        LOG.info("No missing DHCP bindings found.")
+        LOG.info("Neutron DB and NSXv backend are in sync")
+    LOG.info(formatters.output_formatter(
+        constants.DHCP_BINDING, diffs,
+        ['edge_id', 'mac_address', 'binding_id', 'diff']))
 
 
 @admin_utils.output_header
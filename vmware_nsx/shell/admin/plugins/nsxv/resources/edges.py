@@ -29,17 +29,26 @@ from neutron_lib.callbacks import registry
 from neutron_lib import exceptions
 from oslo_log import log as logging
 
+from vmware_nsx.common import locking
 from vmware_nsx.common import nsxv_constants
 from vmware_nsx.db import nsxv_db
 from vmware_nsx.plugins.nsx_v import availability_zones as nsx_az
 from vmware_nsx.plugins.nsx_v.vshield.common import (
     constants as vcns_const)
 import vmware_nsx.plugins.nsx_v.vshield.common.exceptions as nsxv_exceptions
+from vmware_nsx.plugins.nsx_v.vshield import vcns
 
 
 LOG = logging.getLogger(__name__)
 nsxv = utils.get_nsxv_client()
 
+# Default number of edges updated concurrently by nsx-update-all
+DEFAULT_UPDATE_THREADS = 1
+# Exponential backoff of edge updates failing on concurrent edge access
+UPDATE_CONFLICT_DELAY = 1
+UPDATE_CONFLICT_MAX_DELAY = 30
+UPDATE_CONFLICT_MAX_ATTEMPTS = 5
+
 
 @admin_utils.output_header
 def nsx_list_edges(resource, event, trigger, **kwargs):
@@ -180,19 +189,23 @@ def nsx_list_missing_edges(resource, event, trigger, **kwargs):
         LOG.info(formatters.tabulate_results(data))
 
 
-def change_edge_ha(ha, edge_id):
+def _change_edge_ha(ha, edge_id):
     request = {
         'featureType': 'highavailability_4.0',
         'enabled': ha}
+    nsxv.enable_ha(edge_id, request)
+
+
+def change_edge_ha(ha, edge_id):
     try:
-        nsxv.enable_ha(edge_id, request)
+        _change_edge_ha(ha, edge_id)
     except nsxv_exceptions.ResourceNotFound as e:
         LOG.error("Edge %s not found", edge_id)
     except exceptions.NeutronException as e:
         LOG.error("%s", str(e))
 
 
-def change_edge_syslog(properties):
+def _get_edge_syslog_request(properties):
     request = {
         'featureType': 'syslog',
         'serverAddresses': {'ipAddress': [], 'type': 'IpAddressesDto'}}
@@ -208,6 +221,13 @@ def change_edge_syslog(properties):
     if properties.get('syslog-server2'):
         request['serverAddresses']['ipAddress'].append(
                 properties.get('syslog-server2'))
+    return request
+
+
+def change_edge_syslog(properties):
+    request = _get_edge_syslog_request(properties)
+    if not request:
+        return
 
     edge_id = properties.get('edge-id')
     try:
@@ -227,15 +247,8 @@ def delete_edge_syslog(edge_id):
         LOG.error("%s", str(e))
 
 
-def change_edge_loglevel(properties):
-    """Update log level on edge
-
-    Update log level either for specific module or for all modules.
-    'none' disables logging, any other level enables logging
-    Returns True if found any log level properties (regardless if action
-    succeeded)
-    """
-
+def _get_edge_loglevel_modules(properties):
+    """Return the log level of each edge module set by the properties"""
     modules = {}
     if properties.get('log-level'):
         level = properties.get('log-level')
@@ -247,7 +260,24 @@ def change_edge_loglevel(properties):
             if k.endswith('-log-level'):
                 module = k[:-10]   # module is in parameter prefix
                 modules[module] = v
+    return modules
+
+
+def _change_edge_loglevel(edge_id, modules):
+    for module, level in modules.items():
+        edge_utils.update_edge_loglevel(nsxv, edge_id, module, level)
+
+
+def change_edge_loglevel(properties):
+    """Update log level on edge
+
+    Update log level either for specific module or for all modules.
+    'none' disables logging, any other level enables logging
+    Returns True if found any log level properties (regardless if action
+    succeeded)
+    """
 
+    modules = _get_edge_loglevel_modules(properties)
     if not modules:
         # no log level properties
         return False
@@ -308,6 +338,15 @@ def change_edge_appliance(edge_id):
     configuration is updated, or when the configuration of a specific
     availability zone was updated.
     """
+    try:
+        _change_edge_appliance(edge_id)
+    except nsxv_exceptions.ResourceNotFound as e:
+        LOG.error("Edge %s not found", edge_id)
+    except exceptions.NeutronException as e:
+        LOG.error("%s", str(e))
+
+
+def _change_edge_appliance(edge_id):
     # find out what is the current resource pool & size, so we can keep them
     az_name, size = _get_edge_az_and_size(edge_id)
     az = nsx_az.NsxVAvailabilityZones().get_availability_zone(az_name)
@@ -318,15 +357,9 @@ def change_edge_appliance(edge_id):
         appliances.append({'resourcePoolId': az.resource_pool,
                            'datastoreId': az.ha_datastore_id})
     request = {'appliances': appliances, 'applianceSize': size}
-    try:
-        nsxv.change_edge_appliance(edge_id, request)
-    except nsxv_exceptions.ResourceNotFound as e:
-        LOG.error("Edge %s not found", edge_id)
-    except exceptions.NeutronException as e:
-        LOG.error("%s", str(e))
-    else:
-        # also update the edge_ha of the edge
-        change_edge_ha(az.edge_ha, edge_id)
+    nsxv.change_edge_appliance(edge_id, request)
+    # also update the edge_ha of the edge
+    _change_edge_ha(az.edge_ha, edge_id)
 
 
 def change_edge_appliance_reservations(properties):
@@ -367,15 +400,18 @@ def change_edge_appliance_reservations(properties):
         LOG.error("%s", str(e))
 
 
+def _update_edge_host_groups(cluster_mng, edge_id):
+    az_name, size = _get_edge_az_and_size(edge_id)
+    zones = nsx_az.NsxVAvailabilityZones()
+    az = zones.get_availability_zone(az_name)
+    edge_utils.update_edge_host_groups(nsxv, edge_id, cluster_mng, az,
+                                       validate=True)
+
+
 def _update_host_group_for_edge(nsxv, cluster_mng, edge_id, edge):
     if edge.get('type') == 'gatewayServices':
         try:
-            az_name, size = _get_edge_az_and_size(edge_id)
-            zones = nsx_az.NsxVAvailabilityZones()
-            az = zones.get_availability_zone(az_name)
-            edge_utils.update_edge_host_groups(nsxv, edge_id,
-                                               cluster_mng, az,
-                                               validate=True)
+            _update_edge_host_groups(cluster_mng, edge_id)
         except Exception as e:
             LOG.error("Failed to update edge %(id)s - %(e)s",
                       {'id': edge['id'],
@@ -399,11 +435,12 @@ def change_edge_hostgroup(properties):
             _update_host_group_for_edge(nsxv, cluster_mng,
                                         edge_id, edge)
     elif properties.get('hostgroup').lower() == "all":
-        edges = utils.get_nsxv_backend_edges()
-        for edge in edges:
-            edge_id = edge['id']
-            _update_host_group_for_edge(nsxv, cluster_mng,
-                                        edge_id, edge)
+        edges = [edge for edge in utils.get_nsxv_backend_edges()
+                 if edge.get('type') == 'gatewayServices']
+        _update_all_edges(
+            edges, lambda edge_id: _update_edge_host_groups(cluster_mng,
+                                                            edge_id),
+            properties)
     elif properties.get('hostgroup').lower() == "clean":
         azs = nsx_az.NsxVAvailabilityZones()
         for az in azs.list_availability_zones_objects():
@@ -472,31 +509,82 @@ def nsx_update_edge(resource, event, trigger, **kwargs):
         LOG.error(usage_msg)
 
 
+def update_edges(edge_ids, update_func, threads=DEFAULT_UPDATE_THREADS,
+                 progress_file=None):
+    """Apply update_func to each of the edges
+
+    update_func is called with the edge id under the lock of the edge, and
+    is retried with exponential backoff when the edge is being accessed
+    concurrently. Up to threads edges are updated concurrently.
+    If progress_file is given, the edges it lists are skipped, and the
+    updated edges are added to it, so an interrupted run can be resumed.
+    Return the list of edges which failed to update.
+    """
+    @vcns.retry_upon_exception(nsxv_exceptions.ServiceConflict,
+                               delay=UPDATE_CONFLICT_DELAY,
+                               max_delay=UPDATE_CONFLICT_MAX_DELAY,
+                               max_attempts=UPDATE_CONFLICT_MAX_ATTEMPTS)
+    def _update_edge(edge_id):
+        with locking.LockManager.get_lock(edge_id):
+            update_func(edge_id)
+
+    return admin_utils.update_resources(
+        edge_ids, _update_edge, threads=threads,
+        progress_file=progress_file, resource_type='edges')
+
+
+def _update_all_edges(edges, update_func, properties):
+    failed = update_edges(
+        [edge['id'] for edge in edges], update_func,
+        threads=int(properties.get('threads', DEFAULT_UPDATE_THREADS)),
+        progress_file=properties.get('progress-file'))
+    if failed:
+        LOG.error("%(result)s of %(total)s edges failed to update: "
+                  "%(failed)s", {'result': len(failed),
+                                 'total': len(edges),
+                                 'failed': ', '.join(failed)})
+
+
+def _get_edges_update_func(properties):
+    """Return the function updating an edge according to the properties"""
+    if properties.get('appliances', 'false').lower() == "true":
+        return _change_edge_appliance
+    if properties.get('syslog-server'):
+        if properties['syslog-server'].lower() == "none":
+            return nsxv.delete_edge_syslog
+        request = _get_edge_syslog_request(properties)
+        if request:
+            return lambda edge_id: nsxv.update_edge_syslog(edge_id, request)
+        return
+    modules = _get_edge_loglevel_modules(properties)
+    if modules:
+        return lambda edge_id: _change_edge_loglevel(edge_id, modules)
+
+
 @admin_utils.output_header
 def nsx_update_edges(resource, event, trigger, **kwargs):
     """Update all edges with the given property"""
+    usage_msg = ("Need to specify a property to update all edges. "
+                 "Add --property appliances=<True/False> or "
+                 "--property syslog-server=<ip>|none or log level "
+                 "properties, or --property hostgroup=all. "
+                 "\nOptionally add --property threads=<number> to update "
+                 "edges concurrently and --property progress-file=<path> "
+                 "to resume an interrupted update")
     if not kwargs.get('property'):
-        usage_msg = ("Need to specify a property to update all edges. "
-                     "Add --property appliances=<True/False>")
         LOG.error(usage_msg)
         return
 
-    edges = utils.get_nsxv_backend_edges()
     properties = admin_utils.parse_multi_keyval_opt(kwargs['property'])
-    result = 0
-    for edge in edges:
-        if properties.get('appliances', 'false').lower() == "true":
-            try:
-                change_edge_appliance(edge.get('edge-id'))
-            except Exception as e:
-                result += 1
-                LOG.error("Failed to update edge %(edge)s. Exception: "
-                          "%(e)s", {'edge': edge.get('edge-id'),
-                                    'e': str(e)})
-    if result > 0:
-        total = len(edges)
-        LOG.error("%(result)s of %(total)s edges failed "
-                  "to update.", {'result': result, 'total': total})
+    if properties.get('hostgroup', '').lower() == "all":
+        change_edge_hostgroup(properties)
+        return
+    update_func = _get_edges_update_func(properties)
+    if not update_func:
+        LOG.error(usage_msg)
+        return
+    edges = utils.get_nsxv_backend_edges()
+    _update_all_edges(edges, update_func, properties)
 
 
 registry.subscribe(nsx_list_edges,
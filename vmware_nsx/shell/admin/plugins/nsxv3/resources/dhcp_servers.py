@@ -12,13 +12,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from neutron.db import models_v2
 from neutron_lib.callbacks import registry
 from neutron_lib import context
 from oslo_config import cfg
 from oslo_log import log as logging
+import sqlalchemy as sa
+from sqlalchemy import sql
 
 from vmware_nsx.common import utils as nsx_utils
 from vmware_nsx.db import db as nsx_db
+from vmware_nsx.db import nsx_models
 from vmware_nsx.shell.admin.plugins.common import constants
 from vmware_nsx.shell.admin.plugins.common import formatters
 from vmware_nsx.shell.admin.plugins.common import utils as admin_utils
@@ -27,7 +31,6 @@ import vmware_nsx.shell.resources as shell
 from vmware_nsxlib.v3 import nsx_constants
 
 LOG = logging.getLogger(__name__)
-neutron_client = utils.NeutronDbClient()
 nsxlib = utils.get_connected_nsxlib()
 
 
@@ -42,48 +45,50 @@ def _get_dhcp_profile_uuid(**kwargs):
             cfg.CONF.nsx_v3.dhcp_profile)
 
 
+def _get_dhcp_service_bindings(session):
+    """Iterate over the DHCP service bindings sorted by the DHCP server id
+
+    Each binding tells if its network has a DHCP-enabled subnet. The
+    bindings are read from the DB in batches.
+    """
+    binding = nsx_models.NeutronNsxServiceBinding
+    dhcp_enabled = sa.exists().where(sa.and_(
+        models_v2.Subnet.network_id == binding.network_id,
+        models_v2.Subnet.enable_dhcp == sql.true()))
+    query = (session.query(binding.nsx_service_id,
+                           binding.network_id,
+                           dhcp_enabled.label('dhcp_enabled')).
+             filter(binding.nsx_service_type ==
+                    nsx_constants.SERVICE_DHCP).
+             order_by(binding.nsx_service_id).
+             yield_per(utils.NSX_PAGE_SIZE))
+    for server_id, net_id, enabled in query:
+        yield {'server_id': server_id, 'net_id': net_id,
+               'dhcp_enabled': enabled}
+
+
 def _get_orphaned_dhcp_servers(dhcp_profile_uuid):
     # An orphaned DHCP server means the associated neutron network
     # does not exist or has no DHCP-enabled subnet.
+    # The DHCP servers and the neutron DHCP service bindings are both read
+    # sorted by the DHCP server id and matched in a single pass.
+    dhcp_servers = (
+        dhcp_server for dhcp_server in
+        utils.get_nsx_resources_sorted(nsxlib.dhcp_server)
+        if dhcp_server['dhcp_profile_id'] == dhcp_profile_uuid)
+    bindings = _get_dhcp_service_bindings(context.get_admin_context().session)
 
     orphaned_servers = []
-    server_net_pairs = []
-
-    # Find matching DHCP servers for a given dhcp_profile_uuid.
-    response = nsxlib.dhcp_server.list()
-    for dhcp_server in response['results']:
-        if dhcp_server['dhcp_profile_id'] != dhcp_profile_uuid:
+    for dhcp_server, binding in admin_utils.merge_join(
+            dhcp_servers, bindings,
+            lambda dhcp_server: dhcp_server['id'],
+            lambda binding: binding['server_id']):
+        if not dhcp_server or (binding and binding['dhcp_enabled']):
             continue
-        found = False
-        for tag in dhcp_server['tags']:
-            if tag['scope'] == 'os-neutron-net-id':
-                server_net_pairs.append((dhcp_server, tag['tag']))
-                found = True
-                break
-        if not found:
-            # The associated neutron network is not defined.
-            dhcp_server['neutron_net_id'] = None
-            orphaned_servers.append(dhcp_server)
-
-    # Check if there is DHCP-enabled subnet in each network.
-    for dhcp_server, net_id in server_net_pairs:
-        try:
-            network = neutron_client.get_network(net_id)
-        except Exception:
-            # The associated neutron network is not found in DB.
-            dhcp_server['neutron_net_id'] = None
-            orphaned_servers.append(dhcp_server)
-            continue
-        dhcp_enabled = False
-        for subnet_id in network['subnets']:
-            subnet = neutron_client.get_subnet(subnet_id)
-            if subnet['enable_dhcp']:
-                dhcp_enabled = True
-                break
-        if not dhcp_enabled:
-            dhcp_server['neutron_net_id'] = net_id
-            orphaned_servers.append(dhcp_server)
-
+        # Without a binding the associated neutron network is not found in
+        # DB, or the network is bound to another DHCP server.
+        dhcp_server['neutron_net_id'] = binding['net_id'] if binding else None
+        orphaned_servers.append(dhcp_server)
     return orphaned_servers
 
 
@@ -13,15 +13,14 @@
 #    under the License.
 
 
-from vmware_nsx.db import db as nsx_db
+from vmware_nsx.db import nsx_models
 from vmware_nsx.shell.admin.plugins.common import constants
 from vmware_nsx.shell.admin.plugins.common import formatters
 from vmware_nsx.shell.admin.plugins.common import utils as admin_utils
 from vmware_nsx.shell.admin.plugins.nsxv3.resources import utils
 from vmware_nsx.shell import resources as shell
-from vmware_nsxlib.v3 import exceptions as nsx_exc
 
-from neutron.db import db_base_plugin_v2
+from neutron.db import models_v2
 from neutron_lib.callbacks import registry
 from neutron_lib import context as neutron_context
 from oslo_log import log as logging
@@ -29,35 +28,39 @@ from oslo_log import log as logging
 LOG = logging.getLogger(__name__)
 
 
-def get_network_nsx_id(context, neutron_id):
-    # get the nsx switch id from the DB mapping
-    mappings = nsx_db.get_nsx_switch_ids(context.session, neutron_id)
-    if mappings and len(mappings) > 0:
-        return mappings[0]
+def get_networks_by_nsx_id(session):
+    """Iterate over the neutron networks with a backend network
+
+    The networks are sorted by the id of the logical switch, and read from
+    the DB in batches.
+    """
+    mapping = nsx_models.NeutronNsxNetworkMapping
+    query = (session.query(models_v2.Network.name,
+                           models_v2.Network.id,
+                           mapping.nsx_id).
+             join(mapping, mapping.neutron_id == models_v2.Network.id).
+             order_by(mapping.nsx_id).
+             yield_per(utils.NSX_PAGE_SIZE))
+    for name, neutron_id, nsx_id in query:
+        yield {'name': name, 'neutron_id': neutron_id, 'nsx_id': nsx_id}
 
 
 @admin_utils.output_header
 def list_missing_networks(resource, event, trigger, **kwargs):
     """List neutron networks that are missing the NSX backend network
+
+    The networks and the backend logical switches are both read sorted by
+    the logical switch id and matched in a single pass.
+    External networks have no backend network and are skipped.
     """
-    plugin = db_base_plugin_v2.NeutronDbPluginV2()
     admin_cxt = neutron_context.get_admin_context()
-    neutron_networks = plugin.get_networks(admin_cxt)
-    networks = []
-    for net in neutron_networks:
-        neutron_id = net['id']
-        # get the network nsx id from the mapping table
-        nsx_id = get_network_nsx_id(admin_cxt, neutron_id)
-        if not nsx_id:
-            # skip external networks
-            pass
-        else:
-            try:
-                utils.get_connected_nsxlib().logical_switch.get(nsx_id)
-            except nsx_exc.ResourceNotFound:
-                networks.append({'name': net['name'],
-                                 'neutron_id': neutron_id,
-                                 'nsx_id': nsx_id})
+    nsx_switches = utils.get_nsx_resources_sorted(
+        utils.get_connected_nsxlib().logical_switch)
+    networks = [net for net, nsx_switch in admin_utils.merge_join(
+                    get_networks_by_nsx_id(admin_cxt.session), nsx_switches,
+                    lambda net: net['nsx_id'],
+                    lambda nsx_switch: nsx_switch['id'])
+                if net and not nsx_switch]
     if len(networks) > 0:
         title = ("Found %d internal networks missing from the NSX "
                  "manager:") % len(networks)
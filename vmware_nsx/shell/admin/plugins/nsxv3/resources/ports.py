@@ -12,7 +12,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 from sqlalchemy.orm import exc
@@ -22,7 +24,6 @@ from vmware_nsx.db import db as nsx_db
 from vmware_nsx.db import nsx_models
 from vmware_nsx.dvs import dvs
 from vmware_nsx.plugins.nsx_v3 import plugin
-from vmware_nsx.services.qos.common import utils as qos_utils
 from vmware_nsx.shell.admin.plugins.common import constants
 from vmware_nsx.shell.admin.plugins.common import formatters
 from vmware_nsx.shell.admin.plugins.common import utils as admin_utils
@@ -37,6 +38,7 @@ from neutron.db import allowedaddresspairs_db as addr_pair_db
 from neutron.db import db_base_plugin_v2
 from neutron.db import l3_db
 from neutron.db import portsecurity_db
+from neutron.db.qos import models as qos_models
 from neutron.extensions import allowedaddresspairs
 from neutron_lib.callbacks import registry
 from neutron_lib import constants as const
@@ -45,6 +47,10 @@ from neutron_lib.plugins import directory
 
 LOG = logging.getLogger(__name__)
 
+# Default number of VMs reconfigured concurrently on the vCenter
+DEFAULT_MIGRATE_VMS_THREADS = 10
+OPAQUE_NETWORK_BACKING = 'VirtualEthernetCardOpaqueNetworkBackingInfo'
+
 
 class PortsPlugin(db_base_plugin_v2.NeutronDbPluginV2,
                   portsecurity_db.PortSecurityDbMixin,
@@ -112,16 +118,108 @@ def add_profile_mismatch(problems, neutron_id, nsx_id, prf_id, title):
                      'error': msg})
 
 
+def get_ports_nsx_mappings(session):
+    """Return the NSX mappings and QoS profiles of all the neutron ports
+
+    A single query joins the NSX port mappings with the QoS policy of each
+    port, and with the NSX switch profile of this policy.
+    """
+    port_mapping = nsx_models.NeutronNsxPortMapping
+    qos_binding = qos_models.QosPortPolicyBinding
+    qos_profile = nsx_models.QosPolicySwitchProfile
+    query = (session.query(port_mapping.neutron_id,
+                           port_mapping.nsx_switch_id,
+                           port_mapping.nsx_port_id,
+                           qos_binding.policy_id,
+                           qos_profile.switch_profile_id).
+             outerjoin(qos_binding,
+                       qos_binding.port_id == port_mapping.neutron_id).
+             outerjoin(qos_profile,
+                       qos_profile.qos_policy_id == qos_binding.policy_id))
+    return dict((row[0], {'nsx_switch_id': row[1],
+                          'nsx_port_id': row[2],
+                          'qos_policy_id': row[3],
+                          'qos_profile_id': row[4]})
+                for row in query)
+
+
+class _ListingProgress(object):
+    """Log the progress of the backend logical ports listing"""
+
+    def __init__(self):
+        self.count = 0
+
+    def update(self, page):
+        self.count += len(page.get('results', []))
+        if page.get('result_count'):
+            LOG.info("Read %(count)s logical ports out of %(total)s from "
+                     "the NSX manager",
+                     {'count': self.count, 'total': page['result_count']})
+        else:
+            LOG.info("Read %s logical ports from the NSX manager",
+                     self.count)
+
+
+def _list_logical_ports(port_client, progress, logical_switch_id=None):
+    """Read the logical ports from the NSX manager page by page"""
+    params = ({'logical_switch_id': logical_switch_id}
+              if logical_switch_id else None)
+    nsx_ports = []
+    for page in v3_utils.get_nsx_resources_pages(port_client,
+                                                 params=params):
+        nsx_ports.extend(page.get('results', []))
+        progress.update(page)
+    return nsx_ports
+
+
+def get_logical_ports_snapshot(port_client, logical_switch_ids=None,
+                               threads=1):
+    """Return a dictionary of the backend logical ports by their id
+
+    All the logical ports are listed using paging. If threads is more than
+    1, the logical ports of each of the given logical switches are listed
+    concurrently instead.
+    """
+    progress = _ListingProgress()
+    if threads > 1 and logical_switch_ids:
+        pool = eventlet.GreenPool(threads)
+        pages = pool.imap(
+            lambda switch_id: _list_logical_ports(port_client, progress,
+                                                  switch_id),
+            logical_switch_ids)
+        nsx_ports = [nsx_port for page in pages for nsx_port in page]
+    else:
+        nsx_ports = _list_logical_ports(port_client, progress)
+    return dict((nsx_port['id'], nsx_port) for nsx_port in nsx_ports)
+
+
 @admin_utils.output_header
 def list_missing_ports(resource, event, trigger, **kwargs):
     """List neutron ports that are missing the NSX backend port
     And ports with wrong switch profiles
+
+    The backend logical ports are read once, using paging. The property
+    threads=<number> allows reading the logical ports of several logical
+    switches concurrently.
     """
     admin_cxt = neutron_context.get_admin_context()
+    threads = 1
+    if kwargs.get('property'):
+        properties = admin_utils.parse_multi_keyval_opt(kwargs['property'])
+        threads = int(properties.get('threads', threads))
 
     with PortsPlugin() as plugin:
         neutron_ports = plugin.get_ports(admin_cxt)
         port_client, profile_client = get_port_and_profile_clients()
+        ports_mappings = get_ports_nsx_mappings(admin_cxt.session)
+        logical_switch_ids = set(
+            mapping['nsx_switch_id'] for mapping in ports_mappings.values())
+        if None in logical_switch_ids:
+            # Old mappings without the switch id require the full listing
+            logical_switch_ids = None
+        nsx_ports = get_logical_ports_snapshot(
+            port_client, logical_switch_ids=logical_switch_ids,
+            threads=threads)
 
         # get pre-defined profile ids
         dhcp_profile_id = get_dhcp_profile_id(profile_client)
@@ -133,15 +231,15 @@ def list_missing_ports(resource, event, trigger, **kwargs):
         problems = []
         for port in neutron_ports:
             neutron_id = port['id']
-            # get the network nsx id from the mapping table
-            nsx_id = get_port_nsx_id(admin_cxt.session, neutron_id)
+            # get the port nsx id from the mappings
+            mapping = ports_mappings.get(neutron_id)
+            nsx_id = mapping['nsx_port_id'] if mapping else None
             if not nsx_id:
                 # skip external ports
                 pass
             else:
-                try:
-                    nsx_port = port_client.get(nsx_id)
-                except nsx_exc.ResourceNotFound:
+                nsx_port = nsx_ports.get(nsx_id)
+                if not nsx_port:
                     problems.append({'neutron_id': neutron_id,
                                      'nsx_id': nsx_id,
                                      'error': 'Missing from backend'})
@@ -165,12 +263,9 @@ def list_missing_ports(resource, event, trigger, **kwargs):
                                              prf_id, "DHCP security")
 
                 # Port with QoS policy: a matching profile should be attached
-                qos_policy_id = qos_utils.get_port_policy_id(admin_cxt,
-                                                             neutron_id)
-                if qos_policy_id:
-                    qos_profile_id = nsx_db.get_switch_profile_by_qos_policy(
-                        admin_cxt.session, qos_policy_id)
-                    prf_id = profiles_dict[qos_profile_key]
+                if mapping['qos_policy_id']:
+                    qos_profile_id = mapping['qos_profile_id']
+                    prf_id = profiles_dict.get(qos_profile_key)
                     if prf_id != qos_profile_id:
                         add_profile_mismatch(problems, neutron_id, nsx_id,
                                              prf_id, "QoS")
@@ -196,18 +291,75 @@ def list_missing_ports(resource, event, trigger, **kwargs):
         LOG.info("All internal ports verified on the NSX manager")
 
 
-def get_vm_network_device(vm_mng, vm_moref, mac_address):
-    """Return the network device with MAC 'mac_address'.
+def get_vm_network_devices(vm_mng, vm_moref):
+    """Return the network devices of the VM by their MAC address.
 
     This code was inspired by Nova vif.get_network_device
     """
     hardware_devices = vm_mng.get_vm_interfaces_info(vm_moref)
     if hardware_devices.__class__.__name__ == "ArrayOfVirtualDevice":
         hardware_devices = hardware_devices.VirtualDevice
-    for device in hardware_devices:
-        if hasattr(device, 'macAddress'):
-            if device.macAddress == mac_address:
-                return device
+    return dict((device.macAddress, device) for device in hardware_devices
+                if hasattr(device, 'macAddress'))
+
+
+def get_vm_network_device(vm_mng, vm_moref, mac_address):
+    """Return the network device with MAC 'mac_address'."""
+    return get_vm_network_devices(vm_mng, vm_moref).get(mac_address)
+
+
+def _vm_uses_dvpg(vm_spec):
+    for prop in vm_spec.propSet:
+        if (prop.name == 'network' and
+            hasattr(prop.val, 'ManagedObjectReference')):
+            for net in prop.val.ManagedObjectReference:
+                if net._type == 'DistributedVirtualPortgroup':
+                    return True
+    return False
+
+
+def _migrate_vm_ports(vm_mng, device_id, ports, nsx_net_ids):
+    """Replace the VM interfaces of the ports with OpaqueNetwork ones
+
+    All the interfaces of the VM are replaced by a single reconfiguration.
+    Return False if the VM could not be found on the vCenter.
+    """
+    # get the vm moref & spec from the DVS
+    vm_moref = vm_mng.get_vm_moref_obj(device_id)
+    vm_spec = vm_mng.get_vm_spec(vm_moref) if vm_moref else None
+    if not vm_spec:
+        LOG.error("Failed to get the spec of vm %s", device_id)
+        return False
+
+    if not _vm_uses_dvpg(vm_spec):
+        LOG.info("No need to update the spec of vm %s", device_id)
+        return True
+
+    # find the old interfaces by their mac
+    vm_devices = get_vm_network_devices(vm_mng, vm_moref)
+    devices = []
+    interfaces = []
+    for port in ports:
+        device = vm_devices.get(port['mac_address'])
+        if device is None:
+            LOG.warning("No device with MAC address %s exists on the VM",
+                        port['mac_address'])
+            continue
+        if device.backing.__class__.__name__ == OPAQUE_NETWORK_BACKING:
+            # this interface was already migrated
+            continue
+        devices.append(device)
+        interfaces.append((port['id'], port['mac_address'],
+                           nsx_net_ids.get(port['network_id']),
+                           device.__class__.__name__))
+    if not devices:
+        LOG.info("No interfaces to update on vm %s", device_id)
+        return True
+
+    LOG.info("Replacing %(count)s interfaces of VM %(vm)s",
+             {'count': len(devices), 'vm': device_id})
+    vm_mng.replace_vm_interfaces(vm_moref, devices, interfaces)
+    return True
 
 
 def migrate_compute_ports_vms(resource, event, trigger, **kwargs):
@@ -215,8 +367,19 @@ def migrate_compute_ports_vms(resource, event, trigger, **kwargs):
 
     After using api_replay to migrate the neutron data from NSX-V to NSX-T
     we need to update the VM ports to use OpaqueNetwork instead of
-    DistributedVirtualPortgroup
+    DistributedVirtualPortgroup.
+    Each VM is reconfigured once for all its ports. threads=<number> sets
+    the number of VMs reconfigured concurrently, and
+    progress-file=<path> records the migrated VMs so an interrupted
+    migration can be resumed.
     """
+    threads = DEFAULT_MIGRATE_VMS_THREADS
+    progress_file = None
+    if kwargs.get('property'):
+        properties = admin_utils.parse_multi_keyval_opt(kwargs['property'])
+        threads = int(properties.get('threads', threads))
+        progress_file = properties.get('progress-file')
+
     # Connect to the DVS manager, using the configuration parameters
     try:
         vm_mng = dvs.VMManager()
@@ -231,45 +394,26 @@ def migrate_compute_ports_vms(resource, event, trigger, **kwargs):
     with PortsPlugin() as plugin:
         neutron_ports = plugin.get_ports(admin_cxt, filters=port_filters)
 
+    vms_ports = collections.defaultdict(list)
     for port in neutron_ports:
-        device_id = port.get('device_id')
-
-        # get the vm moref & spec from the DVS
-        vm_moref = vm_mng.get_vm_moref_obj(device_id)
-        vm_spec = vm_mng.get_vm_spec(vm_moref)
-        if not vm_spec:
-            LOG.error("Failed to get the spec of vm %s", device_id)
-            continue
-
-        # Go over the VM interfaces and check if it should be updated
-        update_spec = False
-        for prop in vm_spec.propSet:
-            if (prop.name == 'network' and
-                hasattr(prop.val, 'ManagedObjectReference')):
-                for net in prop.val.ManagedObjectReference:
-                    if net._type == 'DistributedVirtualPortgroup':
-                        update_spec = True
-
-        if not update_spec:
-            LOG.info("No need to update the spec of vm %s", device_id)
-            continue
-
-        # find the old interface by it's mac and delete it
-        device = get_vm_network_device(vm_mng, vm_moref, port['mac_address'])
-        if device is None:
-            LOG.warning("No device with MAC address %s exists on the VM",
-                        port['mac_address'])
-            continue
-        device_type = device.__class__.__name__
-
-        LOG.info("Detaching old interface from VM %s", device_id)
-        vm_mng.detach_vm_interface(vm_moref, device)
-
-        # add the new interface as OpaqueNetwork
-        LOG.info("Attaching new interface to VM %s", device_id)
-        nsx_net_id = get_network_nsx_id(admin_cxt.session, port['network_id'])
-        vm_mng.attach_vm_interface(vm_moref, port['id'], port['mac_address'],
-                                   nsx_net_id, device_type)
+        vms_ports[port.get('device_id')].append(port)
+    # The DB session is not shared between the green threads
+    nsx_net_ids = dict(
+        (net_id, get_network_nsx_id(admin_cxt.session, net_id))
+        for net_id in set(port['network_id'] for port in neutron_ports))
+
+    def _migrate_vm(device_id):
+        return _migrate_vm_ports(vm_mng, device_id, vms_ports[device_id],
+                                 nsx_net_ids)
+
+    failed = admin_utils.update_resources(
+        list(vms_ports), _migrate_vm, threads=threads,
+        progress_file=progress_file, resource_type='VMs')
+    if failed:
+        LOG.error("%(result)s of %(total)s VMs failed to migrate: "
+                  "%(failed)s", {'result': len(failed),
+                                 'total': len(vms_ports),
+                                 'failed': ', '.join(failed)})
 
 
 def migrate_exclude_ports(resource, event, trigger, **kwargs):
@@ -0,0 +1,57 @@
+# Copyright 2018 VMware, Inc.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from neutron.objects.qos import policy as qos_policy
+from neutron_lib.callbacks import registry
+from neutron_lib import context as n_context
+from oslo_log import log as logging
+
+from vmware_nsx.services.qos.nsx_v3 import utils as qos_utils
+from vmware_nsx.shell.admin.plugins.common import constants
+from vmware_nsx.shell.admin.plugins.common import utils as admin_utils
+from vmware_nsx.shell.admin.plugins.nsxv3.resources import utils
+import vmware_nsx.shell.resources as shell
+
+LOG = logging.getLogger(__name__)
+
+
+@admin_utils.output_header
+def nsx_update_qos_policies(resource, event, trigger, **kwargs):
+    """Update the NSX switching profiles of all the QoS policies
+
+    The bandwidth limit and DSCP marking rules of the policies are pushed
+    again to their switching profiles in one batch, for example after a
+    change of the qos_peak_bw_multiplier configuration.
+    """
+    context = n_context.get_admin_context()
+    policies = qos_policy.QosPolicy.get_objects(context)
+    if not policies:
+        LOG.info("No QoS policies found")
+        return
+    policies_rules = [(policy.id,) + qos_utils.get_policy_rules(policy)
+                      for policy in policies]
+    with utils.NsxV3PluginWrapper():
+        failed = qos_utils.QosNotificationsHandler().update_policies_rules(
+            context, policies_rules)
+    if failed:
+        LOG.error("%(result)s QoS policies failed to update: %(failed)s",
+                  {'result': len(failed), 'failed': ', '.join(failed)})
+    else:
+        LOG.info("Updated the switching profiles of %s QoS policies",
+                 len(policies))
+
+
+registry.subscribe(nsx_update_qos_policies,
+                   constants.QOS_POLICIES,
+                   shell.Operations.NSX_UPDATE.value)
@@ -13,16 +13,14 @@
 #    under the License.
 
 
-from vmware_nsx.db import db as nsx_db
+from vmware_nsx.db import nsx_models
 from vmware_nsx.shell.admin.plugins.common import constants
 from vmware_nsx.shell.admin.plugins.common import formatters
 from vmware_nsx.shell.admin.plugins.common import utils as admin_utils
 from vmware_nsx.shell.admin.plugins.nsxv3.resources import utils
 from vmware_nsx.shell import resources as shell
-from vmware_nsxlib.v3 import exceptions as nsx_exc
 
-from neutron.db import db_base_plugin_v2
-from neutron.db import l3_db
+from neutron.db.models import l3 as l3_db_models
 from neutron_lib.callbacks import registry
 from neutron_lib import context as neutron_context
 from oslo_log import log as logging
@@ -31,35 +29,43 @@ LOG = logging.getLogger(__name__)
 nsxlib = utils.get_connected_nsxlib()
 
 
-class RoutersPlugin(db_base_plugin_v2.NeutronDbPluginV2,
-                    l3_db.L3_NAT_db_mixin):
-    pass
+def get_routers_by_nsx_id(session, mapped=True):
+    """Iterate over the neutron routers and their backend router id
+
+    With mapped=True the routers with a backend router are returned sorted
+    by the id of the backend router, otherwise the routers without one.
+    The routers are read from the DB in batches.
+    """
+    mapping = nsx_models.NeutronNsxRouterMapping
+    query = (session.query(l3_db_models.Router.name,
+                           l3_db_models.Router.id,
+                           mapping.nsx_id).
+             outerjoin(mapping, mapping.neutron_id == l3_db_models.Router.id))
+    if mapped:
+        query = (query.filter(mapping.nsx_id.isnot(None)).
+                 order_by(mapping.nsx_id))
+    else:
+        query = query.filter(mapping.nsx_id.is_(None))
+    for name, neutron_id, nsx_id in query.yield_per(utils.NSX_PAGE_SIZE):
+        yield {'name': name, 'neutron_id': neutron_id, 'nsx_id': nsx_id}
 
 
 @admin_utils.output_header
 def list_missing_routers(resource, event, trigger, **kwargs):
     """List neutron routers that are missing the NSX backend router
+
+    The routers and the backend logical routers are both read sorted by
+    the logical router id and matched in a single pass.
     """
-    plugin = RoutersPlugin()
     admin_cxt = neutron_context.get_admin_context()
-    neutron_routers = plugin.get_routers(admin_cxt)
-    routers = []
-    for router in neutron_routers:
-        neutron_id = router['id']
-        # get the network nsx id from the mapping table
-        nsx_id = nsx_db.get_nsx_router_id(admin_cxt.session,
-                                          neutron_id)
-        if not nsx_id:
-            routers.append({'name': router['name'],
-                            'neutron_id': neutron_id,
-                            'nsx_id': None})
-        else:
-            try:
-                nsxlib.logical_router.get(nsx_id)
-            except nsx_exc.ResourceNotFound:
-                routers.append({'name': router['name'],
-                              'neutron_id': neutron_id,
-                              'nsx_id': nsx_id})
+    routers = list(get_routers_by_nsx_id(admin_cxt.session, mapped=False))
+    nsx_routers = utils.get_nsx_resources_sorted(nsxlib.logical_router)
+    routers.extend(
+        router for router, nsx_router in admin_utils.merge_join(
+            get_routers_by_nsx_id(admin_cxt.session), nsx_routers,
+            lambda router: router['nsx_id'],
+            lambda nsx_router: nsx_router['id'])
+        if router and not nsx_router)
     if len(routers) > 0:
         title = ("Found %d routers missing from the NSX "
                  "manager:") % len(routers)
@@ -12,6 +12,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 from neutron.db import api as db_api
 from neutron.db import common_db_mixin as common_db
 from neutron.db.models import securitygroup
@@ -36,6 +38,9 @@ from vmware_nsxlib.v3 import security
 
 LOG = logging.getLogger(__name__)
 
+# Default number of backend resources updated concurrently by the migration
+DEFAULT_MIGRATE_THREADS = 10
+
 
 class NeutronSecurityGroupApi(securitygroups_db.SecurityGroupDbMixin,
                               common_db.CommonDbMixin):
@@ -51,14 +56,15 @@ class NeutronSecurityGroupApi(securitygroups_db.SecurityGroupDbMixin,
         return super(NeutronSecurityGroupApi,
                      self).delete_security_group(self.context, sg_id)
 
-    def get_nsgroup_id(self, sg_id):
-        return nsx_db.get_nsx_security_group_id(
-            self.context.session, sg_id)
-
-    def get_port_security_groups(self, port_id):
-        secgroups_bindings = self._get_port_security_group_bindings(
-            self.context, {'port_id': [port_id]})
-        return [b['security_group_id'] for b in secgroups_bindings]
+    def get_ports_security_groups(self):
+        """Return the security groups ids of all the ports by port id"""
+        bindings = self.context.session.query(
+            securitygroup.SecurityGroupPortBinding.port_id,
+            securitygroup.SecurityGroupPortBinding.security_group_id)
+        ports_sgs = collections.defaultdict(list)
+        for port_id, sg_id in bindings:
+            ports_sgs[port_id].append(sg_id)
+        return ports_sgs
 
     def get_ports_in_security_group(self, security_group_id):
         secgroups_bindings = self._get_port_security_group_bindings(
@@ -96,6 +102,20 @@ class NeutronSecurityGroupApi(securitygroups_db.SecurityGroupDbMixin,
                        for mapp in q]
         return sg_mappings
 
+    def get_nsgroups_ids(self):
+        """Return the NSGroup ids of all the security groups by sg id"""
+        mappings = self.context.session.query(
+            nsx_models.NeutronNsxSecurityGroupMapping.neutron_id,
+            nsx_models.NeutronNsxSecurityGroupMapping.nsx_id)
+        return dict((sg_id, nsgroup_id) for sg_id, nsgroup_id in mappings)
+
+    def get_logical_ports_ids(self):
+        """Return the logical port ids of all the ports by port id"""
+        mappings = self.context.session.query(
+            nsx_models.NeutronNsxPortMapping.neutron_id,
+            nsx_models.NeutronNsxPortMapping.nsx_port_id)
+        return dict((port_id, lport_id) for port_id, lport_id in mappings)
+
     def get_logical_port_id(self, port_id):
         mapping = self.context.session.query(
             nsx_models.NeutronNsxPortMapping).filter_by(
@@ -105,7 +125,6 @@ class NeutronSecurityGroupApi(securitygroups_db.SecurityGroupDbMixin,
 
 
 neutron_sg = NeutronSecurityGroupApi()
-neutron_db = v3_utils.NeutronDbClient()
 nsxlib = v3_utils.get_connected_nsxlib()
 
 
@@ -245,48 +264,93 @@ def fix_security_groups(resource, event, trigger, **kwargs):
             plugin.save_security_group_rule_mappings(context_, rules['rules'])
 
 
-def _update_ports_dynamic_criteria_tags():
+def _update_ports_dynamic_criteria_tags(threads=1, progress_file=None):
+    """Add the security groups criteria tags to the logical ports
+
+    Return the list of ports which failed to update.
+    """
     port_client, _ = ports.get_port_and_profile_clients()
-    for port in neutron_db.get_ports():
-        secgroups = neutron_sg.get_port_security_groups(port['id'])
-        # Nothing to do with ports that are not associated with any sec-group.
-        if not secgroups:
-            continue
-
-        _, lport_id = neutron_db.get_lswitch_and_lport_id(port['id'])
-        criteria_tags = nsxlib.ns_group.get_lport_tags(secgroups)
+    # Ports that are not associated with any sec-group have no bindings
+    ports_sgs = neutron_sg.get_ports_security_groups()
+    lports_ids = neutron_sg.get_logical_ports_ids()
+
+    def _update_port(port_id):
+        lport_id = lports_ids.get(port_id)
+        if not lport_id:
+            LOG.warning("Port %s has no logical port on the backend",
+                        port_id)
+            return
+        criteria_tags = nsxlib.ns_group.get_lport_tags(ports_sgs[port_id])
         port_client.update(lport_id, False, tags_update=criteria_tags)
 
+    return admin_utils.update_resources(
+        list(ports_sgs), _update_port, threads=threads,
+        progress_file=progress_file, resource_type='ports')
+
+
+def _update_security_group_dynamic_criteria(threads=1, progress_file=None):
+    """Replace the NSGroups members with the dynamic criteria
 
-def _update_security_group_dynamic_criteria():
+    Return the list of security groups which failed to update.
+    """
     secgroups = neutron_sg.get_security_groups()
-    for sg in secgroups:
-        nsgroup_id = neutron_sg.get_nsgroup_id(sg['id'])
+    nsgroups_ids = neutron_sg.get_nsgroups_ids()
+
+    def _update_nsgroup(sg_id):
+        nsgroup_id = nsgroups_ids.get(sg_id)
+        if not nsgroup_id:
+            LOG.warning("Security group %s has no NSGroup on the backend",
+                        sg_id)
+            return
         membership_criteria = nsxlib.ns_group.get_port_tag_expression(
-            security.PORT_SG_SCOPE, sg['id'])
-        try:
-            # We want to add the dynamic criteria and remove all direct members
-            # they will be added by the manager using the new criteria.
-            nsxlib.ns_group.update(nsgroup_id,
-                                   membership_criteria=membership_criteria,
-                                   members=[])
-        except Exception as e:
-            LOG.warning("Failed to update membership criteria for nsgroup "
-                        "%(nsgroup_id)s, request to backend returned "
-                        "with error: %(error)s",
-                        {'nsgroup_id': nsgroup_id, 'error': str(e)})
+            security.PORT_SG_SCOPE, sg_id)
+        # We want to add the dynamic criteria and remove all direct members
+        # they will be added by the manager using the new criteria.
+        nsxlib.ns_group.update(nsgroup_id,
+                               membership_criteria=membership_criteria,
+                               members=[])
+
+    return admin_utils.update_resources(
+        [sg['id'] for sg in secgroups], _update_nsgroup, threads=threads,
+        progress_file=progress_file, resource_type='security groups')
 
 
 @admin_utils.output_header
 def migrate_nsgroups_to_dynamic_criteria(resource, event, trigger, **kwargs):
+    """Move the NSGroups membership to dynamic criteria tags
+
+    threads=<number> sets the number of backend resources updated
+    concurrently, and progress-file=<path> records the updated ports and
+    security groups so an interrupted migration can be resumed.
+    """
+    threads = DEFAULT_MIGRATE_THREADS
+    progress_file = None
+    if kwargs.get('property'):
+        properties = admin_utils.parse_multi_keyval_opt(kwargs['property'])
+        threads = int(properties.get('threads', threads))
+        progress_file = properties.get('progress-file')
+
     if not utils.is_nsx_version_1_1_0(nsxlib.get_version()):
         LOG.error("Dynamic criteria grouping feature isn't supported by "
                   "this NSX version.")
         return
     # First, we add the criteria tags for all ports.
-    _update_ports_dynamic_criteria_tags()
+    failed = _update_ports_dynamic_criteria_tags(
+        threads=threads, progress_file=progress_file)
+    if failed:
+        # The direct members must not be removed before all the ports
+        # are tagged, or they would lose their security groups.
+        LOG.error("%(result)s ports failed to update: %(failed)s. "
+                  "Run the migration again to update the security groups",
+                  {'result': len(failed), 'failed': ', '.join(failed)})
+        return
     # Update security-groups with dynamic criteria and remove direct members.
-    _update_security_group_dynamic_criteria()
+    failed = _update_security_group_dynamic_criteria(
+        threads=threads, progress_file=progress_file)
+    if failed:
+        LOG.error("%(result)s security groups failed to update: "
+                  "%(failed)s", {'result': len(failed),
+                                 'failed': ', '.join(failed)})
 
 
 registry.subscribe(migrate_nsgroups_to_dynamic_criteria,
@@ -25,6 +25,11 @@ from vmware_nsxlib.v3 import nsx_constants
 
 _NSXLIB = None
 
+# Number of resources to read from the NSX manager in each page
+NSX_PAGE_SIZE = 1000
+# The NSX manager marks the last page with a cursor starting with this prefix
+NSX_NULL_CURSOR_PREFIX = '0000'
+
 
 def get_nsxv3_client(nsx_username=None, nsx_password=None,
                      use_basic_auth=False):
@@ -48,6 +53,40 @@ def get_connected_nsxlib(nsx_username=None, nsx_password=None,
     return _NSXLIB
 
 
+def get_nsx_resources_pages(resource_client, params=None, sort_by=None):
+    """Read the resources of an nsxlib resource client page by page
+
+    params is a dictionary of additional query parameters. If sort_by is
+    given, the NSX manager returns the resources sorted by this attribute.
+    """
+    query = [('page_size', NSX_PAGE_SIZE)]
+    if sort_by:
+        query += [('sort_by', sort_by), ('sort_ascending', 'true')]
+    if params:
+        query += sorted(params.items())
+    uri = '%s?%s' % (resource_client.uri_segment,
+                     '&'.join('%s=%s' % param for param in query))
+    cursor = None
+    while True:
+        page = resource_client.client.url_get(
+            uri + '&cursor=%s' % cursor if cursor else uri)
+        yield page
+        cursor = page.get('cursor')
+        if not cursor or cursor.startswith(NSX_NULL_CURSOR_PREFIX):
+            return
+
+
+def get_nsx_resources_sorted(resource_client, params=None):
+    """Iterate over the resources of an nsxlib client sorted by their id
+
+    Only a single page of resources is kept in memory.
+    """
+    for page in get_nsx_resources_pages(resource_client, params=params,
+                                        sort_by='id'):
+        for resource in page.get('results', []):
+            yield resource
+
+
 class NeutronDbClient(db_base_plugin_v2.NeutronDbPluginV2):
     def __init__(self):
         super(NeutronDbClient, self).__init__()
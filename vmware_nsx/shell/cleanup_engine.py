@@ -0,0 +1,111 @@
+# Copyright 2018 VMware Inc
+# All Rights Reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Concurrent deletion engine shared by the NSX devstack cleanup tools.
+
+The cleanup is a list of steps, run one after the other so that the
+dependency order between the backend objects is kept (for example edges
+are deleted before the logical switches they are attached to). Each step
+is a list of (resource type, list function, delete function) of
+independent resources: they are all listed and deleted concurrently.
+The delete function gets a resource, as returned by the list function,
+and returns True when it was deleted.
+
+The callers should monkey patch eventlet, for the HTTP requests to run
+concurrently.
+"""
+
+import eventlet
+from oslo_log import log as logging
+from oslo_utils import timeutils
+import requests
+from requests import adapters
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_THREADS = 10
+
+
+def get_session(threads=DEFAULT_THREADS):
+    """Return an HTTP session keeping the backend connections alive"""
+    session = requests.Session()
+    adapter = adapters.HTTPAdapter(pool_connections=1, pool_maxsize=threads)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class CleanupEngine(object):
+    """Delete backend resources concurrently, in dependency order"""
+
+    def __init__(self, threads=DEFAULT_THREADS):
+        self.threads = threads
+
+    def _delete(self, resource_type, delete_func, resource):
+        try:
+            return delete_func(resource)
+        except Exception as e:
+            LOG.error("Failed to delete %(type)s: %(e)s",
+                      {'type': resource_type, 'e': e})
+            return False
+
+    def run_step(self, step):
+        """Delete all the resources of a step
+
+        Return the number of deleted resources.
+        """
+        pool = eventlet.GreenPool(self.threads)
+        deleted = 0
+        with timeutils.StopWatch() as watch:
+            listings = [(resource_type, pool.spawn(list_func), delete_func)
+                        for resource_type, list_func, delete_func in step]
+            deletions = []
+            for resource_type, listing, delete_func in listings:
+                resources = listing.wait() or []
+                LOG.info("Number of %(type)s to be deleted: %(count)s",
+                         {'type': resource_type, 'count': len(resources)})
+                deletions.append(
+                    (resource_type, len(resources),
+                     [pool.spawn(self._delete, resource_type, delete_func, r)
+                      for r in resources]))
+            for resource_type, total, threads in deletions:
+                count = len([t for t in threads if t.wait()])
+                LOG.info("Deleted %(count)s of %(total)s %(type)s",
+                         {'count': count, 'total': total,
+                          'type': resource_type})
+                deleted += count
+        LOG.info("Deleted %(count)s resources in %(time).2f seconds "
+                 "(%(rate).2f per second)",
+                 {'count': deleted, 'time': watch.elapsed(),
+                  'rate': self._rate(deleted, watch)})
+        return deleted
+
+    def run(self, steps):
+        """Run the cleanup steps in order"""
+        deleted = 0
+        with timeutils.StopWatch() as watch:
+            for step in steps:
+                deleted += self.run_step(step)
+        LOG.info("Cleanup done: deleted %(count)s resources in %(time).2f "
+                 "seconds (%(rate).2f per second)",
+                 {'count': deleted, 'time': watch.elapsed(),
+                  'rate': self._rate(deleted, watch)})
+        return deleted
+
+    @staticmethod
+    def _rate(count, watch):
+        elapsed = watch.elapsed()
+        return count / elapsed if elapsed else 0.0
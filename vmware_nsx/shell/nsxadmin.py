@@ -37,7 +37,9 @@ from oslo_config import cfg
 from oslo_log import _options
 from oslo_log import log as logging
 
+from vmware_nsx.plugins.nsx_v.vshield import vcns
 from vmware_nsx.shell.admin.plugins.common import constants
+from vmware_nsx.shell.admin.plugins.common import formatters
 from vmware_nsx.shell.admin import version
 from vmware_nsx.shell import resources
 
@@ -100,6 +102,25 @@ def _validate_op_choice(choice, nsx_plugin):
             sys.exit(1)
 
 
+def _log_nsxv_requests_stats():
+    requests_stats = []
+    for endpoint, stats in sorted(vcns.get_request_stats().items()):
+        latency = stats['latency']
+        requests_stats.append({
+            'endpoint': endpoint,
+            'requests': stats['requests'],
+            'retries': stats['retries'],
+            'errors': stats['errors'],
+            'bytes_sent': stats['bytes_sent'],
+            'bytes_received': stats['bytes_received'],
+            'avg_latency': '%.3f' % (latency['total'] / latency['count']),
+            'max_latency': '%.3f' % latency['max']})
+    LOG.info(formatters.output_formatter(
+        'NSX-V requests', requests_stats,
+        ['endpoint', 'requests', 'retries', 'errors', 'bytes_sent',
+         'bytes_received', 'avg_latency', 'max_latency']))
+
+
 def main(argv=sys.argv[1:]):
     _init_cfg()
     nsx_plugin_in_use = resources.get_plugin()
@@ -115,6 +136,10 @@ def main(argv=sys.argv[1:]):
                     force=cfg.CONF.force, property=cfg.CONF.property,
                     verbose=cfg.CONF.verbose)
 
+    if cfg.CONF.verbose and nsx_plugin_in_use == 'nsxv':
+        # Report the NSX requests done by the operation
+        _log_nsxv_requests_stats()
+
 
 if __name__ == "__main__":
     sys.exit(main(sys.argv[1:]))
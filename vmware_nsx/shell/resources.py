@@ -106,7 +106,9 @@ nsxv3_resources = {
                                      Operations.IMPORT.value,
                                      Operations.NSX_LIST.value]),
     constants.CONFIG: Resource(constants.CONFIG,
-                               [Operations.VALIDATE.value])
+                               [Operations.VALIDATE.value]),
+    constants.QOS_POLICIES: Resource(constants.QOS_POLICIES,
+                                     [Operations.NSX_UPDATE.value])
 }
 
 # Add supported NSX-V resources in this dictionary
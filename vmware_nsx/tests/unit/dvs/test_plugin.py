@@ -132,6 +132,90 @@ class DvsTestCase(base.BaseTestCase):
         fake_get_spec.assert_called_once_with(net_id, vlan, trunk_mode=False)
 
 
+class VMManagerTestCase(base.BaseTestCase):
+
+    @mock.patch.object(dvs_utils, 'dvs_create_session',
+                       return_value=fake_session())
+    def setUp(self, mock_session):
+        super(VMManagerTestCase, self).setUp()
+        cfg.CONF.set_override('vm_moref_cache_size', 2, group='dvs')
+        self._vm = dvs.VMManager()
+
+    def _vm_ref(self, moref):
+        vm_ref = mock.Mock()
+        vm_ref.value = moref
+        return vm_ref
+
+    def test_get_vm_moref_cached(self):
+        with mock.patch.object(self._vm, 'get_vm_moref_obj',
+                               return_value=self._vm_ref('vm-1')) as get_obj:
+            self.assertEqual('vm-1', self._vm.get_vm_moref('uuid-1'))
+            self.assertEqual('vm-1', self._vm.get_vm_moref('uuid-1'))
+            get_obj.assert_called_once_with('uuid-1')
+
+    def test_get_vm_moref_not_found_not_cached(self):
+        with mock.patch.object(self._vm, 'get_vm_moref_obj',
+                               return_value=None) as get_obj:
+            self.assertIsNone(self._vm.get_vm_moref('uuid-1'))
+            self.assertIsNone(self._vm.get_vm_moref('uuid-1'))
+            self.assertEqual(2, get_obj.call_count)
+
+    def test_get_vm_moref_validate(self):
+        with mock.patch.object(self._vm, 'get_vm_moref_obj',
+                               side_effect=[self._vm_ref('vm-1'),
+                                            self._vm_ref('vm-2')]):
+            self.assertEqual('vm-1', self._vm.get_vm_moref('uuid-1'))
+            self.assertEqual('vm-2', self._vm.get_vm_moref(
+                'uuid-1', use_cache=False))
+            self.assertEqual('vm-2', self._vm.get_vm_moref('uuid-1'))
+
+    def test_get_vm_moref_lru_eviction(self):
+        with mock.patch.object(self._vm, 'get_vm_moref_obj',
+                               side_effect=lambda uuid: self._vm_ref(
+                                   'vm-%s' % uuid)) as get_obj:
+            self._vm.get_vm_moref('1')
+            self._vm.get_vm_moref('2')
+            # Use the first VM so the second is the least recently used
+            self._vm.get_vm_moref('1')
+            self._vm.get_vm_moref('3')
+            self.assertEqual(3, get_obj.call_count)
+            self._vm.get_vm_moref('1')
+            self.assertEqual(3, get_obj.call_count)
+            self._vm.get_vm_moref('2')
+            self.assertEqual(4, get_obj.call_count)
+
+    def test_replace_vm_interfaces(self):
+        self._vm._session = mock.Mock()
+        self._vm._session.vim.client.factory.create.side_effect = (
+            lambda obj_type: mock.Mock())
+        vm_moref = self._vm_ref('vm-1')
+        devices = [mock.Mock(), mock.Mock()]
+        interfaces = [('port-1', 'mac-1', 'ls-1', 'VirtualVmxnet3'),
+                      ('port-2', 'mac-2', 'ls-2', 'VirtualVmxnet3')]
+        self._vm.replace_vm_interfaces(vm_moref, devices, interfaces)
+        # A single reconfiguration task for all the interfaces
+        self._vm._session.invoke_api.assert_called_once_with(
+            self._vm._session.vim, 'ReconfigVM_Task', vm_moref,
+            spec=mock.ANY)
+        spec = self._vm._session.invoke_api.call_args[1]['spec']
+        self.assertEqual(['remove', 'remove', 'add', 'add'],
+                         [change.operation for change in spec.deviceChange])
+        self.assertEqual(devices, [change.device for change in
+                                   spec.deviceChange[:2]])
+        self.assertEqual([-47, -48], [change.device.key for change in
+                                      spec.deviceChange[2:]])
+        self._vm._session.wait_for_task.assert_called_once_with(
+            self._vm._session.invoke_api.return_value)
+
+    def test_invalidate_vm_moref(self):
+        with mock.patch.object(self._vm, 'get_vm_moref_obj',
+                               return_value=self._vm_ref('vm-1')) as get_obj:
+            self._vm.get_vm_moref('uuid-1')
+            self._vm.invalidate_vm_moref('uuid-1')
+            self._vm.get_vm_moref('uuid-1')
+            self.assertEqual(2, get_obj.call_count)
+
+
 class NeutronSimpleDvsTest(test_plugin.NeutronDbPluginV2TestCase):
 
     @mock.patch.object(dvs_utils, 'dvs_create_session',
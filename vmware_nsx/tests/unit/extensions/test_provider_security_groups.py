@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 import mock
+from oslo_config import cfg
+from sqlalchemy import event
 import webob.exc
 
 from neutron.api.v2 import attributes as attr
@@ -21,6 +23,7 @@ from neutron.db import db_base_plugin_v2
 from neutron.db import securitygroups_db
 from neutron.tests.unit.extensions import test_securitygroup
 from neutron_lib import context
+from neutron_lib.plugins import directory
 
 from vmware_nsx.db import extended_security_group
 from vmware_nsx.extensions import providersecuritygroup as provider_sg
@@ -67,7 +70,7 @@ class ProviderSecurityGroupTestPlugin(
         port_data = port['port']
 
         with db_api.context_manager.writer.using(context):
-            self._ensure_default_security_group_on_port(context, port)
+            self._ensure_tenant_default_security_group_on_port(context, port)
             (sgids, provider_groups) = self._get_port_security_groups_lists(
                 context, port)
 
@@ -351,6 +354,96 @@ class ProviderSecurityGroupExtTestCase(
         self.assertEqual(webob.exc.HTTPForbidden.code, res.status_int)
 
 
+class ProviderSecurityGroupCacheTestCase(ProviderSecurityGroupExtTestCase):
+    def setUp(self, plugin=PLUGIN_NAME, ext_mgr=None):
+        super(ProviderSecurityGroupCacheTestCase, self).setUp(
+            plugin=plugin, ext_mgr=ext_mgr)
+        cfg.CONF.set_override('tenant_security_groups_cache_ttl', 600)
+        directory.get_plugin()._init_tenant_security_groups_cache()
+
+    def _count_create_port_queries(self, net_id):
+        statements = []
+
+        def _count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db_api.context_manager.writer.get_engine()
+        event.listen(engine, 'after_cursor_execute', _count_statement)
+        try:
+            port = self.deserialize(self.fmt, self._create_port(
+                self.fmt, net_id, tenant_id=self._tenant_id))
+        finally:
+            event.remove(engine, 'after_cursor_execute', _count_statement)
+        return port, len(statements)
+
+    def test_create_port_queries_reduced(self):
+        self._create_provider_security_group()
+        with self.network(tenant_id=self._tenant_id) as net:
+            net_id = net['network']['id']
+            port1, queries1 = self._count_create_port_queries(net_id)
+            port2, queries2 = self._count_create_port_queries(net_id)
+        self.assertEqual(port1['port']['provider_security_groups'],
+                         port2['port']['provider_security_groups'])
+        self.assertEqual(port1['port']['security_groups'],
+                         port2['port']['security_groups'])
+        # The tenant default and provider security groups are cached
+        self.assertLess(queries2, queries1)
+
+    def test_create_provider_sg_invalidates_cache(self):
+        provider_secgroup1 = self._create_provider_security_group()
+        with self.port(tenant_id=self._tenant_id) as p:
+            self.assertEqual([provider_secgroup1['security_group']['id']],
+                             p['port']['provider_security_groups'])
+        provider_secgroup2 = self._create_provider_security_group()
+        with self.port(tenant_id=self._tenant_id) as p:
+            self.assertEqual(
+                sorted([provider_secgroup1['security_group']['id'],
+                        provider_secgroup2['security_group']['id']]),
+                sorted(p['port']['provider_security_groups']))
+
+    def test_delete_provider_sg_invalidates_cache(self):
+        provider_secgroup = self._create_provider_security_group()
+        with self.port(tenant_id=self._tenant_id) as p:
+            self.assertEqual([provider_secgroup['security_group']['id']],
+                             p['port']['provider_security_groups'])
+            self._delete('ports', p['port']['id'])
+        self._delete('security-groups',
+                     provider_secgroup['security_group']['id'])
+        with self.port(tenant_id=self._tenant_id) as p:
+            self.assertEqual([], p['port']['provider_security_groups'])
+
+    def test_default_sg_cached_after_commit(self):
+        plugin = directory.get_plugin()
+        ctx = context.get_admin_context()
+        with db_api.context_manager.writer.using(ctx):
+            sg_id = plugin._get_tenant_default_security_group(
+                ctx, self._tenant_id)
+            self.assertIsNone(
+                plugin._tenant_sgs_cache.get_default(self._tenant_id))
+        self.assertEqual(
+            sg_id, plugin._tenant_sgs_cache.get_default(self._tenant_id))
+
+    def test_default_sg_not_cached_on_rollback(self):
+        plugin = directory.get_plugin()
+        ctx = context.get_admin_context()
+        try:
+            with db_api.context_manager.writer.using(ctx):
+                plugin._get_tenant_default_security_group(
+                    ctx, self._tenant_id)
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertIsNone(
+            plugin._tenant_sgs_cache.get_default(self._tenant_id))
+        # A later transaction of the same session does not cache it either
+        with db_api.context_manager.writer.using(ctx):
+            ctx.session.query(
+                extended_security_group.NsxExtendedSecurityGroupProperties
+            ).all()
+        self.assertIsNone(
+            plugin._tenant_sgs_cache.get_default(self._tenant_id))
+
+
 class TestNSXv3ProviderSecurityGrp(test_nsxv3_plugin.NsxV3PluginTestCaseMixin,
                                    ProviderSecurityGroupExtTestCase):
     pass
@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import mock
 from neutron.db import models_v2
 from neutron.tests.unit import testlib_api
 from neutron_lib import context
@@ -47,3 +48,40 @@ class NsxDBTestCase(testlib_api.SqlTestCase):
                           nsx_db.add_neutron_nsx_port_mapping,
                           self.ctx.session, neutron_port_id,
                           nsx_switch_id, nsx_port_id)
+
+    def test_call_after_commit(self):
+        func = mock.Mock()
+        with self.ctx.session.begin(subtransactions=True):
+            nsx_db.call_after_commit(self.ctx.session, func, 'arg')
+            with self.ctx.session.begin(subtransactions=True):
+                nsx_db.call_after_commit(self.ctx.session, func, 'arg2')
+            func.assert_not_called()
+        func.assert_has_calls([mock.call('arg'), mock.call('arg2')])
+
+    def test_call_after_commit_no_transaction(self):
+        func = mock.Mock()
+        nsx_db.call_after_commit(self.ctx.session, func, 'arg')
+        func.assert_called_once_with('arg')
+
+    def test_call_after_commit_rollback(self):
+        func = mock.Mock()
+        try:
+            with self.ctx.session.begin(subtransactions=True):
+                nsx_db.call_after_commit(self.ctx.session, func, 'arg')
+                raise ValueError()
+        except ValueError:
+            pass
+        # A later transaction does not call the dropped callback
+        with self.ctx.session.begin(subtransactions=True):
+            pass
+        func.assert_not_called()
+
+    def test_call_after_commit_listeners_registered_once(self):
+        func = mock.Mock()
+        with mock.patch.object(nsx_db.sa_event, 'listen',
+                               wraps=nsx_db.sa_event.listen) as listen:
+            for i in range(3):
+                with self.ctx.session.begin(subtransactions=True):
+                    nsx_db.call_after_commit(self.ctx.session, func, i)
+        self.assertEqual(2, listen.call_count)
+        self.assertEqual(3, func.call_count)
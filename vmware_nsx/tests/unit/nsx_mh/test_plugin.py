@@ -453,6 +453,69 @@ class TestSecurityGroup(ext_sg.TestSecurityGroups, SecurityGroupsTestCase):
         self.skipTest('not supported')
 
 
+class TestSecurityGroupCachedRules(TestSecurityGroup):
+
+    def setUp(self):
+        super(TestSecurityGroupCachedRules, self).setUp()
+        cfg.CONF.set_override('cache_security_profile_rules', True, 'NSX')
+
+    def _create_rule(self, security_group_id, port):
+        rule = self._build_security_group_rule(
+            security_group_id, 'ingress', constants.PROTO_NAME_TCP,
+            port, port)
+        return self._create_security_group_rule(self.fmt, rule)
+
+    def test_create_security_group_rules_uses_cache(self):
+        with self.security_group() as sg:
+            sg_id = sg['security_group']['id']
+            res = self._create_rule(sg_id, '22')
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            with mock.patch.object(
+                self.plugin, 'get_security_group_rules') as get_rules,\
+                mock.patch.object(
+                    nsxlib.secgroup,
+                    'update_security_group_rules') as update_rules:
+                res = self._create_rule(sg_id, '80')
+                self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+                get_rules.assert_not_called()
+                nsx_rules = update_rules.call_args[0][2]
+                ports = [r.get('port_range_min') for r in
+                         nsx_rules['logical_port_egress_rules']]
+                self.assertIn(22, ports)
+                self.assertIn(80, ports)
+
+    def test_create_security_group_rules_stale_cache(self):
+        with self.security_group() as sg:
+            sg_id = sg['security_group']['id']
+            rule = self.deserialize(self.fmt, self._create_rule(sg_id, '22'))
+            self._delete('security-group-rules',
+                         rule['security_group_rule']['id'])
+            with mock.patch.object(
+                nsxlib.secgroup,
+                'update_security_group_rules') as update_rules:
+                res = self._create_rule(sg_id, '80')
+                self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+                nsx_rules = update_rules.call_args[0][2]
+                ports = [r.get('port_range_min') for r in
+                         nsx_rules['logical_port_egress_rules']]
+                self.assertNotIn(22, ports)
+                self.assertIn(80, ports)
+
+    def test_create_security_group_rules_backend_failure(self):
+        with self.security_group() as sg:
+            sg_id = sg['security_group']['id']
+            with mock.patch.object(
+                nsxlib.secgroup, 'update_security_group_rules',
+                side_effect=api_exc.NsxApiException):
+                res = self._create_rule(sg_id, '22')
+                self.assertEqual(webob.exc.HTTPInternalServerError.code,
+                                 res.status_int)
+            rules = self.plugin.get_security_group_rules(
+                context.get_admin_context(),
+                {'security_group_id': [sg_id], 'port_range_min': [22]})
+            self.assertEqual([], rules)
+
+
 class TestL3ExtensionManager(object):
 
     def get_resources(self):
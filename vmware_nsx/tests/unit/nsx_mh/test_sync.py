@@ -18,6 +18,7 @@ import contextlib
 import sys
 import time
 
+import eventlet
 import mock
 from neutron_lib import constants
 from neutron_lib import context
@@ -244,6 +245,50 @@ class CacheTestCase(base.BaseTestCase):
             self._verify_delete(resource, hit=False, deleted=deleted)
 
 
+class StatusCacheTestCase(base.BaseTestCase):
+    """Test suite providing coverage for the status cache."""
+
+    def test_read_through_coalesces_requests(self):
+        status_cache = sync.NsxStatusCache()
+        fetch = mock.Mock(return_value=constants.PORT_STATUS_ACTIVE)
+
+        def _slow_fetch():
+            eventlet.sleep(0.01)
+            return fetch()
+
+        pool = eventlet.GreenPool()
+        results = list(pool.imap(
+            lambda i: status_cache.read_through('port-1', _slow_fetch),
+            range(5)))
+        self.assertEqual([constants.PORT_STATUS_ACTIVE] * 5, results)
+        self.assertEqual(1, fetch.call_count)
+
+    def test_read_through_ttl(self):
+        status_cache = sync.NsxStatusCache(ttl=60)
+        fetch = mock.Mock(return_value=constants.PORT_STATUS_DOWN)
+        for i in range(3):
+            self.assertEqual(constants.PORT_STATUS_DOWN,
+                             status_cache.read_through('port-1', fetch))
+        self.assertEqual(1, fetch.call_count)
+        with mock.patch.object(time, 'time', return_value=time.time() + 61):
+            status_cache.read_through('port-1', fetch)
+        self.assertEqual(2, fetch.call_count)
+
+    def test_read_through_no_ttl(self):
+        status_cache = sync.NsxStatusCache()
+        fetch = mock.Mock(return_value=constants.PORT_STATUS_DOWN)
+        status_cache.read_through('port-1', fetch)
+        status_cache.read_through('port-1', fetch)
+        self.assertEqual(2, fetch.call_count)
+
+    def test_read_through_failure(self):
+        status_cache = sync.NsxStatusCache(ttl=60)
+        fetch = mock.Mock(side_effect=api_exc.RequestTimeout)
+        self.assertRaises(api_exc.RequestTimeout,
+                          status_cache.read_through, 'port-1', fetch)
+        self.assertIsNone(status_cache.get('port-1'))
+
+
 class SyncLoopingCallTestCase(base.BaseTestCase):
 
     def test_looping_calls(self):
@@ -646,6 +691,56 @@ class SyncTestCase(testlib_api.SqlTestCase):
             self.assertEqual(constants.PORT_STATUS_DOWN,
                              q_port_data['status'])
 
+    def test_synchronize_port_on_get_cached(self):
+        cfg.CONF.set_override('always_read_status', True, 'NSX_SYNC')
+        ctx = context.get_admin_context()
+        self._plugin._synchronizer._port_status_cache._ttl = 60
+        with self._populate_data(ctx):
+            lp_uuid = list(self.fc._fake_lswitch_lport_dict)[0]
+            lport = self.fc._fake_lswitch_lport_dict[lp_uuid]
+            q_port_id = self._get_tag_dict(lport['tags'])['q_port_id']
+            lport['status'] = 'false'
+            with mock.patch.object(
+                sync.switchlib, 'get_port',
+                side_effect=sync.switchlib.get_port) as get_port:
+                for i in range(3):
+                    q_port_data = self._plugin.get_port(ctx, q_port_id)
+                    self.assertEqual(constants.PORT_STATUS_DOWN,
+                                     q_port_data['status'])
+                self.assertEqual(1, get_port.call_count)
+
+    def test_synchronize_ports_on_list(self):
+        cfg.CONF.set_override('always_read_status', True, 'NSX_SYNC')
+        cfg.CONF.set_override('status_cache_ttl', 60, 'NSX_SYNC')
+        ctx = context.get_admin_context()
+        self._plugin._synchronizer._port_status_cache._ttl = 60
+        with self._populate_data(ctx):
+            # Put a port down to verify the list synchronization
+            lp_uuid = list(self.fc._fake_lswitch_lport_dict)[0]
+            lport = self.fc._fake_lswitch_lport_dict[lp_uuid]
+            q_port_id = self._get_tag_dict(lport['tags'])['q_port_id']
+            lport['status'] = 'false'
+            with mock.patch.object(sync.switchlib, 'get_port') as get_port:
+                q_ports = self._plugin.get_ports(ctx, fields=['id', 'status'])
+                # No punctual NSX request is needed for listed ports
+                self.assertFalse(get_port.called)
+            for q_port in q_ports:
+                if q_port['id'] == q_port_id:
+                    self.assertEqual(constants.PORT_STATUS_DOWN,
+                                     q_port['status'])
+                self.assertEqual(set(['id', 'status']), set(q_port))
+
+    def test_synchronize_ports_on_list_no_cache(self):
+        cfg.CONF.set_override('always_read_status', True, 'NSX_SYNC')
+        ctx = context.get_admin_context()
+        with self._populate_data(ctx):
+            with mock.patch.object(
+                self._plugin._synchronizer,
+                'read_ports_status') as read_ports_status:
+                self._plugin.get_ports(ctx)
+                # Without a status cache the ports are not synchronized
+                self.assertFalse(read_ports_status.called)
+
     def test_synchronize_routernot_found_in_db_no_raise(self):
         ctx = context.get_admin_context()
         with self._populate_data(ctx):
@@ -13,15 +13,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import eventlet
 import mock
 from neutron.db import api as db_api
 from neutron.extensions import multiprovidernet as mpnet
 from neutron.tests import base
 from neutron_lib.api.definitions import provider_net as pnet
+from oslo_config import cfg
 from oslo_utils import uuidutils
 
 from vmware_nsx.api_client import exception as api_exc
 from vmware_nsx.common import exceptions as nsx_exc
+from vmware_nsx.common import locking
 from vmware_nsx.common import nsx_utils
 from vmware_nsx.common import utils
 from vmware_nsx.db import nsx_models
@@ -362,6 +365,96 @@ class NsxUtilsTestCase(base.BaseTestCase):
         self._verify_nsx_transport_zones(results)
 
 
+class InitStagesTestCase(base.BaseTestCase):
+
+    def test_run_init_stages_dependencies(self):
+        order = []
+
+        def _stage(name):
+            def _run():
+                # Yield so the other stages can run concurrently
+                eventlet.sleep(0)
+                order.append(name)
+            return _run
+
+        utils.run_init_stages([
+            ('first', _stage('first'), []),
+            ('second', _stage('second'), ['first']),
+            ('third', _stage('third'), ['first', 'second']),
+            ('independent', _stage('independent'), [])])
+        self.assertEqual(4, len(order))
+        self.assertLess(order.index('first'), order.index('second'))
+        self.assertLess(order.index('second'), order.index('third'))
+
+    def test_run_init_stages_failure(self):
+        other_stage = mock.Mock()
+        self.assertRaises(
+            nsx_exc.NsxPluginException, utils.run_init_stages,
+            [('failed', mock.Mock(side_effect=nsx_exc.NsxPluginException(
+                err_msg='fake')), []),
+             ('other', other_stage, [])])
+        # The other stages still run to completion
+        other_stage.assert_called_once_with()
+
+    def test_run_init_stages_unknown_dependency(self):
+        first_stage = mock.Mock()
+        self.assertRaises(ValueError, utils.run_init_stages,
+                          [('first', first_stage, []),
+                           ('stage', mock.Mock(), ['unknown'])])
+        # No stage is started when the dependencies are not valid
+        eventlet.sleep(0)
+        first_stage.assert_not_called()
+
+
+class LockManagerTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(LockManagerTestCase, self).setUp()
+        locking.LockManager.reset_lock_stats()
+        self.addCleanup(locking.LockManager.reset_lock_stats)
+        self.lock = mock.MagicMock()
+        mock.patch.object(locking.LockManager, '_get_lock_local',
+                          return_value=self.lock).start()
+
+    def _take_lock(self, times, name='fake-lock'):
+        with mock.patch.object(locking.timeutils, 'now', side_effect=times):
+            with locking.LockManager.get_lock(name):
+                pass
+
+    def test_lock_stats(self):
+        self._take_lock([0, 0.5, 2.5])
+        self._take_lock([10, 10, 10.05])
+        stats = locking.LockManager.get_lock_stats()['fake-lock']
+        self.assertEqual(2, stats['acquired'])
+        self.assertEqual(0.5, stats['wait_time']['total'])
+        self.assertEqual(2.0, stats['hold_time']['max'])
+        self.assertEqual(
+            [0, 0, 1, 0, 1, 0, 0],
+            [count for _bound, count in stats['hold_time']['buckets']])
+        self.assertEqual(2, self.lock.__enter__.call_count)
+        self.assertEqual(2, self.lock.__exit__.call_count)
+
+    def test_lock_stats_by_kind(self):
+        for name in ('port-update-%s' % uuidutils.generate_uuid(),
+                     'port-update-%s' % uuidutils.generate_uuid(),
+                     uuidutils.generate_uuid(), 'edge-1', 'edge-12', '5',
+                     'nsx-edge-pool'):
+            self._take_lock([0, 0, 0], name=name)
+        stats = locking.LockManager.get_lock_stats()
+        self.assertEqual(
+            {'port-update-{id}': 2, '{id}': 4, 'nsx-edge-pool': 1},
+            dict((kind, kind_stats['acquired'])
+                 for kind, kind_stats in stats.items()))
+
+    def test_lock_held_past_threshold(self):
+        cfg.CONF.set_override('locking_hold_time_threshold', 1)
+        with mock.patch.object(locking.LOG, 'warning') as mock_warning:
+            self._take_lock([0, 0, 0.5])
+            mock_warning.assert_not_called()
+            self._take_lock([0, 0, 2])
+            mock_warning.assert_called_once_with(mock.ANY, mock.ANY)
+
+
 class ClusterManagementTestCase(nsx_base.NsxlibTestCase):
 
     def test_cluster_in_readonly_mode(self):
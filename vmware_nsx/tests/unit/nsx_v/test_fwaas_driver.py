@@ -16,6 +16,10 @@
 import copy
 import mock
 
+from neutron_fwaas.extensions import firewall as fw_ext
+from oslo_config import cfg
+
+from vmware_nsx.plugins.nsx_v.vshield import vcns
 from vmware_nsx.services.fwaas.nsx_v import edge_fwaas_driver
 from vmware_nsx.tests.unit.nsx_v import test_plugin as test_v_plugin
 
@@ -157,6 +161,78 @@ class NsxvFwaasTestCase(test_v_plugin.NsxVPluginV2TestCase):
             allow_ext = update_fw.call_args[1]['allow_external']
             self.assertEqual(False, allow_ext)
 
+    def test_create_firewall_multiple_edges_failure(self):
+        apply_list = self._fake_apply_list(router_count=3)
+        firewall = self._fake_firewall(self._fake_rules_v4())
+        edges = ['edge-1', 'edge-2', 'edge-3']
+
+        def fake_update(edge_id, *args, **kwargs):
+            if edge_id == 'edge-2':
+                raise Exception('fake failure')
+
+        with mock.patch.object(self.firewall._nsxv, "update_firewall",
+                               side_effect=fake_update) as update_fw,\
+            mock.patch.object(self.firewall,
+                              "_get_routers_edges", return_value=edges):
+            self.assertRaises(fw_ext.FirewallInternalDriverError,
+                              self.firewall.create_firewall,
+                              'nsx', apply_list, firewall)
+            # all the edges should be updated despite the failure
+            self.assertEqual(3, update_fw.call_count)
+            self.assertEqual(
+                set(edges),
+                set([call[0][0] for call in update_fw.call_args_list]))
+
+    def test_create_firewall_multiple_edges_read_failure(self):
+        apply_list = self._fake_apply_list(router_count=3)
+        firewall = self._fake_firewall(self._fake_rules_v4())
+        edges = ['edge-1', 'edge-2', 'edge-3']
+
+        def fake_get_rules(context, edge_id):
+            if edge_id == 'edge-2':
+                raise Exception('fake failure')
+            return [], []
+
+        with mock.patch.object(self.firewall._nsxv,
+                               "update_firewall") as update_fw,\
+            mock.patch.object(self.firewall, "_get_other_backend_rules",
+                              side_effect=fake_get_rules),\
+            mock.patch.object(self.firewall,
+                              "_get_routers_edges", return_value=edges):
+            self.assertRaises(fw_ext.FirewallInternalDriverError,
+                              self.firewall.create_firewall,
+                              'nsx', apply_list, firewall)
+            # the other edges should be updated despite the failure
+            self.assertEqual(
+                set(['edge-1', 'edge-3']),
+                set([call[0][0] for call in update_fw.call_args_list]))
+
+    def test_update_firewall_backend_rules_cache(self):
+        cfg.CONF.set_override('fwaas_backend_rules_cache_ttl', 60, 'nsxv')
+        apply_list = self._fake_apply_list()
+        firewall = self._fake_firewall(self._fake_rules_v4())
+        edge_id = 'edge-1'
+
+        def fake_update(edge_id, *args, **kwargs):
+            vcns._edge_firewall_generations[edge_id] += 1
+
+        with mock.patch.object(self.firewall._nsxv, "update_firewall",
+                               side_effect=fake_update) as update_fw,\
+            mock.patch.object(self.firewall, "_get_other_backend_rules",
+                              return_value=([], [])) as get_rules,\
+            mock.patch.object(self.firewall,
+                              "_get_routers_edges", return_value=[edge_id]):
+            self.firewall.update_firewall('nsx', apply_list, firewall)
+            self.firewall.update_firewall('nsx', apply_list, firewall)
+            self.assertEqual(2, update_fw.call_count)
+            self.assertEqual(1, get_rules.call_count)
+
+            # A change of the edge firewall by another component should
+            # invalidate the cached rules
+            vcns._edge_firewall_generations[edge_id] += 1
+            self.firewall.update_firewall('nsx', apply_list, firewall)
+            self.assertEqual(2, get_rules.call_count)
+
     def test_delete_firewall(self):
         apply_list = self._fake_apply_list()
         firewall = self._fake_firewall_no_rule()
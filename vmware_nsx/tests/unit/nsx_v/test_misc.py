@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import mock
 from neutron.tests import base
 
 from vmware_nsx.plugins.nsx_v.vshield.common import exceptions
@@ -77,3 +78,159 @@ class TestMisc(base.BaseTestCase):
             exceptions.RequestBad, [1],
             max_attempts=10)(success_on_fifth_attempt)
         self.assertRaises(exceptions.RequestBad, should_raise)
+
+
+class TestVcnsGetEdges(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestVcnsGetEdges, self).setUp()
+        self.vcns = vcns.Vcns('fake-address', None, None, None, True)
+        self.addCleanup(vcns._edges_list_cache.clear)
+
+    def _get_edges_page(self, start_index=0):
+        count = 25
+        data = [{'id': 'edge-%s' % i}
+                for i in range(start_index, min(start_index + 10, count))]
+        return {}, {'edgePage': {'data': data,
+                                 'pagingInfo': {'pageSize': 10,
+                                                'totalCount': count}}}
+
+    def test_get_edges_all_pages(self):
+        with mock.patch.object(self.vcns, '_get_edges',
+                               side_effect=self._get_edges_page) as get_page:
+            edges = self.vcns.get_edges()
+        self.assertEqual(['edge-%s' % i for i in range(25)],
+                         [edge['id'] for edge in edges])
+        get_page.assert_has_calls([mock.call(), mock.call(10),
+                                   mock.call(20)], any_order=True)
+        self.assertEqual(3, get_page.call_count)
+
+    def test_get_edges_cached(self):
+        with mock.patch.object(self.vcns, '_get_edges',
+                               side_effect=self._get_edges_page) as get_page:
+            self.vcns.get_edges()
+            edges = self.vcns.get_edges(use_cache=True)
+            self.assertEqual(25, len(edges))
+            self.assertEqual(3, get_page.call_count)
+            # without use_cache the edges are read again
+            self.vcns.get_edges()
+            self.assertEqual(6, get_page.call_count)
+
+    def test_get_edges_cache_invalidated(self):
+        with mock.patch.object(self.vcns, '_get_edges',
+                               side_effect=self._get_edges_page) as get_page,\
+                mock.patch.object(self.vcns, 'do_request'):
+            self.vcns.get_edges()
+            self.vcns.delete_edge('edge-1')
+            self.vcns.get_edges(use_cache=True)
+            self.assertEqual(6, get_page.call_count)
+
+    def test_get_edges_not_cached_during_edge_change(self):
+        # a list read while an edge is deployed is not cached
+        def _deploy_edge(*args, **kwargs):
+            self.vcns.get_edges()
+
+        with mock.patch.object(self.vcns, '_get_edges',
+                               side_effect=self._get_edges_page) as get_page,\
+                mock.patch.object(self.vcns, 'do_request',
+                                  side_effect=_deploy_edge):
+            self.vcns.deploy_edge({})
+            self.assertEqual(3, get_page.call_count)
+            self.vcns.get_edges(use_cache=True)
+            self.assertEqual(6, get_page.call_count)
+
+
+class TestVcnsInventorySnapshot(base.BaseTestCase):
+
+    SCOPING_OBJECTS = (
+        '<list>'
+        '<object><objectId>datacenter-1</objectId>'
+        '<objectTypeName>Datacenter</objectTypeName><name>dc</name></object>'
+        '<object><objectId>network-1</objectId>'
+        '<objectTypeName>Network</objectTypeName><name>net</name></object>'
+        '</list>')
+    OBJECT_IDS = '<list><item><objectId>%s</objectId></item></list>'
+
+    def setUp(self):
+        super(TestVcnsInventorySnapshot, self).setUp()
+        self.vcns = vcns.Vcns('fake-address', None, None, None, True)
+
+    def _do_request(self, method, uri, **kwargs):
+        if uri.endswith('scopingobjects'):
+            return {}, self.SCOPING_OBJECTS
+        if uri.endswith('scopes'):
+            return {}, self.OBJECT_IDS % 'vdnscope-1'
+        return {}, self.OBJECT_IDS % 'dvs-1'
+
+    def test_inventory_read_once(self):
+        with mock.patch.object(self.vcns, 'do_request',
+                               side_effect=self._do_request) as do_request:
+            snapshot = self.vcns.get_inventory_snapshot()
+            for i in range(3):
+                self.assertTrue(
+                    snapshot.validate_datacenter_moid('datacenter-1'))
+                self.assertFalse(
+                    snapshot.validate_datacenter_moid('network-1'))
+                self.assertTrue(snapshot.validate_network('network-1'))
+                self.assertTrue(snapshot.validate_network_name(
+                    'network-1', 'net'))
+                self.assertFalse(snapshot.validate_network_name(
+                    'network-1', 'other'))
+                self.assertTrue(snapshot.validate_vdn_scope('vdnscope-1'))
+                self.assertFalse(snapshot.validate_vdn_scope('vdnscope-2'))
+                self.assertTrue(snapshot.validate_dvs('dvs-1'))
+                self.assertFalse(snapshot.validate_dvs('dvs-2'))
+            self.assertEqual(3, do_request.call_count)
+
+    def test_validate_without_snapshot(self):
+        with mock.patch.object(self.vcns, 'do_request',
+                               side_effect=self._do_request) as do_request:
+            self.assertTrue(self.vcns.validate_network('network-1'))
+            self.assertTrue(self.vcns.validate_network('network-1'))
+            self.assertEqual(2, do_request.call_count)
+
+
+class TestVcnsRequestStats(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestVcnsRequestStats, self).setUp()
+        vcns.reset_request_stats()
+        self.addCleanup(vcns.reset_request_stats)
+        self.vcns = vcns.Vcns('fake-address', None, None, None, True)
+
+    def test_request_stats(self):
+        with mock.patch.object(self.vcns.jsonapi_client, 'request',
+                               return_value=({}, '{"id": "x"}')) as request:
+            self.vcns.do_request(vcns.HTTP_PUT,
+                                 '/api/4.0/edges/edge-1?async=true',
+                                 {'name': 'a'})
+            self.vcns.do_request(vcns.HTTP_PUT, '/api/4.0/edges/edge-2',
+                                 {'name': 'b'})
+        # The body is encoded once before the request
+        request.assert_called_with(vcns.HTTP_PUT, '/api/4.0/edges/edge-2',
+                                   '{"name": "b"}', None, False)
+        stats = vcns.get_request_stats()
+        self.assertEqual(['PUT /api/4.0/edges/{id}'], list(stats))
+        stats = stats['PUT /api/4.0/edges/{id}']
+        self.assertEqual(2, stats['requests'])
+        self.assertEqual(0, stats['retries'])
+        self.assertEqual(0, stats['errors'])
+        self.assertEqual(26, stats['bytes_sent'])
+        self.assertEqual(22, stats['bytes_received'])
+        self.assertEqual(2, stats['latency']['count'])
+
+    def test_request_stats_retries_and_errors(self):
+        with mock.patch.object(
+                self.vcns.jsonapi_client, 'request',
+                side_effect=[exceptions.ServiceConflict(uri='', response=''),
+                             ({}, ''),
+                             exceptions.RequestBad(uri='', response='')]),\
+                mock.patch('time.sleep'):
+            self.vcns.do_request(vcns.HTTP_DELETE, '/api/4.0/edges/edge-1')
+            self.assertRaises(exceptions.RequestBad, self.vcns.do_request,
+                              vcns.HTTP_DELETE, '/api/4.0/edges/edge-2')
+        stats = vcns.get_request_stats()['DELETE /api/4.0/edges/{id}']
+        self.assertEqual(2, stats['requests'])
+        self.assertEqual(1, stats['retries'])
+        self.assertEqual(1, stats['errors'])
+        self.assertEqual(0, stats['bytes_sent'])
@@ -58,8 +58,10 @@ import webob.exc
 from vmware_nsx._i18n import _
 from vmware_nsx.common import config
 from vmware_nsx.common import exceptions as nsxv_exc
+from vmware_nsx.common import locking
 from vmware_nsx.common import nsx_constants
 from vmware_nsx.common import utils as c_utils
+from vmware_nsx.db import db as nsx_db
 from vmware_nsx.db import nsxv_db
 from vmware_nsx.dvs import dvs
 from vmware_nsx.dvs import dvs_utils
@@ -80,6 +82,7 @@ from vmware_nsx.plugins.nsx_v.vshield.common import exceptions as vcns_exc
 from vmware_nsx.plugins.nsx_v.vshield import edge_appliance_driver
 from vmware_nsx.plugins.nsx_v.vshield import edge_firewall_driver
 from vmware_nsx.plugins.nsx_v.vshield import edge_utils
+from vmware_nsx.services.qos.common import utils as qos_com_utils
 from vmware_nsx.services.qos.nsx_v import utils as qos_utils
 from vmware_nsx.tests import unit as vmware
 from vmware_nsx.tests.unit.extensions import test_vnic_index
@@ -185,6 +188,7 @@ class NsxVPluginV2TestCase(test_plugin.NeutronDbPluginV2TestCase):
                 plugin=plugin,
                 ext_mgr=ext_mgr)
         self.addCleanup(self.fc2.reset_all)
+        self.addCleanup(qos_com_utils.clear_policy_binding_cache)
         plugin_instance = directory.get_plugin()
         plugin_instance.real_get_edge = plugin_instance._get_edge_id_by_rtr_id
         plugin_instance._get_edge_id_by_rtr_id = mock.Mock()
@@ -705,6 +709,17 @@ class TestNetworksV2(test_plugin.TestNetworksV2, NsxVPluginV2TestCase):
                          net['availability_zones'])
 
 
+class TestInitStages(NsxVPluginV2TestCase):
+
+    def test_backend_stages_depend_on_config_validation(self):
+        # the stages creating backend objects run only with a valid config
+        stages = dict((name, dependencies) for name, func, dependencies in
+                      directory.get_plugin()._get_init_stages())
+        for name in ('edge_manager', 'security_group_container',
+                     'cluster_default_fw_section', 'security_groups_logging'):
+            self.assertIn('config_validation', stages[name])
+
+
 class TestVnicIndex(NsxVPluginV2TestCase,
                     test_vnic_index.VnicIndexDbTestCase):
     def test_update_port_twice_with_the_same_index(self):
@@ -3593,6 +3608,90 @@ class NsxVTestSecurityGroup(ext_sg.TestSecurityGroups,
         sg = self._plugin_update_security_group(_context, sg['id'], True)
         self.assertTrue(sg['logging'])
 
+    def test_update_security_group_name_locked(self):
+        # the NSX security group is updated under the lock of its members
+        # updates
+        _context = context.get_admin_context()
+        sg = self._plugin_create_security_group(_context)
+        nsx_sg_id = nsx_db.get_nsx_security_group_id(_context.session,
+                                                     sg['id'])
+        lock_name = 'neutron-security-ops' + str(nsx_sg_id)
+        held_locks = []
+        get_lock = locking.LockManager.get_lock
+
+        @contextlib.contextmanager
+        def _get_lock(name, *args, **kwargs):
+            with get_lock(name, *args, **kwargs):
+                held_locks.append(name)
+                try:
+                    yield
+                finally:
+                    held_locks.remove(name)
+
+        def _update_security_group(*args):
+            self.assertIn(lock_name, held_locks)
+
+        with mock.patch.object(locking.LockManager, 'get_lock',
+                               side_effect=_get_lock),\
+            mock.patch.object(self.plugin.nsx_v.vcns,
+                              'update_security_group',
+                              side_effect=_update_security_group) as update:
+            self.plugin.update_security_group(
+                _context, sg['id'], {'security_group': {'name': 'new'}})
+            update.assert_called_once_with(nsx_sg_id, mock.ANY, mock.ANY)
+
+    def test_get_sections_to_update_logging(self):
+        _context = context.get_admin_context()
+        sg = self._plugin_create_security_group(_context)
+        logged_sg = self._plugin_create_security_group(_context, logging=True)
+        # The rules were created without logging
+        sections = self.plugin._get_sections_to_update_logging(_context,
+                                                               False)
+        self.assertNotIn(sg['id'], [sg_id for sg_id, _u, _s in sections])
+        sections = self.plugin._get_sections_to_update_logging(_context,
+                                                               True)
+        sg_ids = [sg_id for sg_id, _u, _s in sections]
+        self.assertIn(sg['id'], sg_ids)
+        self.assertNotIn(logged_sg['id'], sg_ids)
+
+    def test_update_section_logging_section_changed(self):
+        _context = context.get_admin_context()
+        sg = self._plugin_create_security_group(_context)
+        sections = self.plugin._get_sections_to_update_logging(_context,
+                                                               True)
+        section_uri, section = [(uri, section)
+                                for sg_id, uri, section in sections
+                                if sg_id == sg['id']][0]
+
+        # Another server adds a rule after the DFW configuration was read
+        h, c = self.fc2.get_section(section_uri)
+        changed = self.plugin.nsx_sg_utils.parse_section(c)
+        changed.append(self.plugin.nsx_sg_utils.parse_section(
+            '<rule logged="false"><name>new</name></rule>'))
+        self.fc2.update_section(
+            section_uri, self.plugin.nsx_sg_utils.to_xml_string(changed), h)
+
+        update_section = self.fc2.update_section
+
+        def _update_section(uri, request, h):
+            # Enforce the etag like the NSX does
+            if h['etag'] != self.fc2.get_section(uri)[0]['etag']:
+                raise vcns_exc.VcnsApiException(status=412, uri=uri,
+                                                header={}, response='')
+            return update_section(uri, request, h)
+
+        with mock.patch.object(self.fc2, 'update_section',
+                               side_effect=_update_section) as update:
+            self.plugin._update_section_logging(sg['id'], section_uri,
+                                                section, True)
+        self.assertEqual(2, update.call_count)
+        h, c = self.fc2.get_section(section_uri)
+        rules = self.plugin.nsx_sg_utils.parse_section(c).findall('rule')
+        # The new rule was kept, and all the rules are logged
+        self.assertIn('new', [rule.findtext('name') for rule in rules])
+        self.assertEqual(set(['true']),
+                         set(rule.attrib['logged'] for rule in rules))
+
 
 class TestVdrTestCase(L3NatTest, L3NatTestCaseBase,
                       test_l3_plugin.L3NatDBIntTestCase,
@@ -4129,6 +4228,30 @@ class TestNSXPortSecurity(test_psec.TestPortSecurity,
                 else:
                     self.assertFalse(exclude_list_del.called)
 
+    def test_update_vm_exclude_list_stale_moref(self):
+        plugin = self._get_core_plugin_with_dvs()
+        update_func = mock.Mock(side_effect=[
+            vcns_exc.RequestBad(uri='fake_uri', response='fake'), None])
+        with mock.patch.object(plugin._vcm, 'get_vm_moref',
+                               return_value='new_moref') as get_moref:
+            plugin._update_vm_exclude_list('fake_device', 'old_moref',
+                                           update_func)
+            get_moref.assert_called_once_with('fake_device',
+                                              use_cache=False)
+            update_func.assert_has_calls([mock.call('old_moref'),
+                                          mock.call('new_moref')])
+
+    def test_update_vm_exclude_list_valid_moref_failure(self):
+        plugin = self._get_core_plugin_with_dvs()
+        update_func = mock.Mock(side_effect=vcns_exc.RequestBad(
+            uri='fake_uri', response='fake'))
+        with mock.patch.object(plugin._vcm, 'get_vm_moref',
+                               return_value='moref'):
+            self.assertRaises(vcns_exc.RequestBad,
+                              plugin._update_vm_exclude_list,
+                              'fake_device', 'moref', update_func)
+            update_func.assert_called_once_with('moref')
+
     def test_update_port_no_security_with_vnic(self):
         device_id = _uuid()
         # create a compute port without port security
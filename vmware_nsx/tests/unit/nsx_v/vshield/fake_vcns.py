@@ -410,7 +410,7 @@ class FakeVcns(object):
         }
         return (header, response)
 
-    def get_edges(self):
+    def get_edges(self, use_cache=False):
         edges = []
         for edge_id in self._edges:
             edges.append({
@@ -1027,9 +1027,11 @@ class FakeVcns(object):
     def _get_section(self, section_id):
         section_rules = (
             b''.join(self._sections[section_id]['rules'].values()))
-        response = ('<section id="%s" name="%s">%s</section>'
+        response = ('<section id="%s" name="%s" generationNumber="%s">'
+                    '%s</section>'
                     % (section_id,
                        self._sections[section_id]['name'],
+                       self._sections[section_id]['etag'],
                        section_rules))
         headers = {'status': 200,
                    'etag': self._sections[section_id]['etag']}
@@ -1084,6 +1086,22 @@ class FakeVcns(object):
             headers = {'status': 200}
         return (headers, response)
 
+    def update_security_group_members(self, security_group_id,
+                                      add_members, remove_members):
+        if security_group_id not in self._securitygroups:
+            msg = ("The requested object : %s could not be found."
+                   "Object identifiers are "
+                   "case sensitive.") % security_group_id
+            response = self._get_bad_req_response(msg, 202, 'core-services')
+            headers = {'status': 404}
+        else:
+            members = self._securitygroups[security_group_id]['members']
+            members.difference_update(remove_members)
+            members.update(add_members)
+            response = ''
+            headers = {'status': 200}
+        return (headers, response)
+
     def remove_member_from_security_group(self, security_group_id, member_id):
         if security_group_id not in self._securitygroups:
             msg = ("The requested object : %s could not be found."
@@ -1173,6 +1191,9 @@ class FakeVcns(object):
         self._dhcp_bindings = {}
         self._ipam_pools = {}
 
+    def get_inventory_snapshot(self):
+        return self
+
     def validate_datacenter_moid(self, object_id):
         return True
 
@@ -336,7 +336,7 @@ class EdgeManagerTestCase(EdgeUtilsTestCaseMixin):
                 nsxv_constants.LARGE: {'minimum_pooled_edges': 1,
                                        'maximum_pooled_edges': 3}}}}
 
-    def check_edge_active_at_backend(self, edge_id):
+    def check_edge_active_at_backend(self, edge_id, use_cache=False):
         # workaround to let edge_id None pass since we wrapped router binding
         # db update op.
         if edge_id is None:
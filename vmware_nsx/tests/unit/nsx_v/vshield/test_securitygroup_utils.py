@@ -0,0 +1,76 @@
+# Copyright 2017 VMware, Inc.
+# All Rights Reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import mock
+
+from neutron.tests import base
+
+from vmware_nsx.plugins.nsx_v.vshield import securitygroup_utils
+
+FAKE_SG_ID = 'securitygroup-1'
+
+
+class NsxSecurityGroupMembershipTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(NsxSecurityGroupMembershipTestCase, self).setUp()
+        self.vcns = mock.Mock()
+        self.membership = securitygroup_utils.NsxSecurityGroupMembership(
+            self.vcns)
+
+    def test_single_change(self):
+        self.membership.add_member(FAKE_SG_ID, 'vnic-1')
+        self.membership.remove_member(FAKE_SG_ID, 'vnic-2')
+        self.vcns.add_member_to_security_group.assert_called_once_with(
+            FAKE_SG_ID, 'vnic-1')
+        self.vcns.remove_member_from_security_group.assert_called_once_with(
+            FAKE_SG_ID, 'vnic-2')
+        self.vcns.update_security_group_members.assert_not_called()
+
+    def test_concurrent_changes_are_batched(self):
+        # The first update yields so the other changes are queued
+        self.vcns.add_member_to_security_group.side_effect = (
+            lambda *args: eventlet.sleep(0))
+        pool = eventlet.GreenPool()
+        pool.spawn(self.membership.add_member, FAKE_SG_ID, 'vnic-1')
+        pool.spawn(self.membership.add_member, FAKE_SG_ID, 'vnic-2')
+        pool.spawn(self.membership.remove_member, FAKE_SG_ID, 'vnic-3')
+        pool.spawn(self.membership.add_member, FAKE_SG_ID, 'vnic-3')
+        pool.waitall()
+        self.vcns.add_member_to_security_group.assert_called_once_with(
+            FAKE_SG_ID, 'vnic-1')
+        # The last change of vnic-3 wins
+        self.vcns.update_security_group_members.assert_called_once_with(
+            FAKE_SG_ID, ['vnic-2', 'vnic-3'], [])
+
+    def test_batch_failure_raised_to_all_callers(self):
+        self.vcns.add_member_to_security_group.side_effect = (
+            lambda *args: eventlet.sleep(0))
+        self.vcns.update_security_group_members.side_effect = (
+            Exception('fake error'))
+        results = []
+
+        def _add_member(member_id):
+            try:
+                self.membership.add_member(FAKE_SG_ID, member_id)
+            except Exception:
+                results.append(member_id)
+
+        pool = eventlet.GreenPool()
+        for member_id in ('vnic-1', 'vnic-2', 'vnic-3'):
+            pool.spawn(_add_member, member_id)
+        pool.waitall()
+        self.assertEqual(['vnic-2', 'vnic-3'], sorted(results))
@@ -380,6 +380,27 @@ class VcnsDriverTestCase(base.BaseTestCase):
         status = self.vcns_driver.get_edge_status(self.edge_id)
         self.assertEqual(vcns_const.RouterStatus.ROUTER_STATUS_ACTIVE, status)
 
+    def test_get_edge_status_from_cached_edges(self):
+        self._deploy_edge()
+        self.vcns_driver.vcns.get_edge_status.reset_mock()
+        status = self.vcns_driver.get_edge_status(self.edge_id,
+                                                  use_cache=True)
+        self.assertEqual(vcns_const.RouterStatus.ROUTER_STATUS_ACTIVE, status)
+        self.vcns_driver.vcns.get_edges.assert_called_once_with(
+            use_cache=True)
+        self.assertFalse(self.vcns_driver.vcns.get_edge_status.called)
+
+    def test_get_edge_status_missing_from_cached_edges(self):
+        # an edge which is not in the summaries is read from the backend
+        self._deploy_edge()
+        with mock.patch.object(self.vcns_driver.vcns, 'get_edges',
+                               return_value=[]):
+            status = self.vcns_driver.get_edge_status(self.edge_id,
+                                                      use_cache=True)
+        self.assertEqual(vcns_const.RouterStatus.ROUTER_STATUS_ACTIVE, status)
+        self.vcns_driver.vcns.get_edge_status.assert_called_with(
+            self.edge_id)
+
     def test_update_nat_rules(self):
         self._deploy_edge()
         snats = [{
@@ -46,6 +46,7 @@ from oslo_utils import uuidutils
 from vmware_nsx.api_client import exception as api_exc
 from vmware_nsx.common import utils
 from vmware_nsx.plugins.nsx_v3 import plugin as nsx_plugin
+from vmware_nsx.services.qos.common import utils as qos_com_utils
 from vmware_nsx.tests import unit as vmware
 from vmware_nsx.tests.unit.extensions import test_metadata
 from vmware_nsxlib.tests.unit.v3 import mocks as nsx_v3_mocks
@@ -179,6 +180,7 @@ class NsxV3PluginTestCaseMixin(test_plugin.NeutronDbPluginV2TestCase,
         self.mock_plugin_methods()
         super(NsxV3PluginTestCaseMixin, self).setUp(plugin=plugin,
                                                     ext_mgr=ext_mgr)
+        self.addCleanup(qos_com_utils.clear_policy_binding_cache)
 
         self.maxDiff = None
 
@@ -23,7 +23,10 @@ from neutron_dynamic_routing.tests.unit.db import test_bgp_db
 from neutron_lib import context
 from neutron_lib import exceptions as n_exc
 from neutron_lib.plugins import directory
+from oslo_config import cfg
 
+from vmware_nsx.common import nsxv_constants
+from vmware_nsx.db import nsxv_db
 from vmware_nsx.services.dynamic_routing import bgp_plugin
 from vmware_nsx.services.dynamic_routing.nsx_v import driver as bgp_driver
 from vmware_nsx.tests.unit.nsx_v import test_plugin
@@ -94,6 +97,57 @@ class TestNSXvBgpPlugin(test_plugin.NsxVPluginV2TestCase,
                 bgp_peer = self.bgp_plugin.get_bgp_peer(self.context, peer_id)
                 self.assertEqual(edge_id, bgp_peer['esg_id'])
 
+    def test_get_dynamic_routing_edges(self):
+        driver = self.bgp_plugin.nsxv_driver
+        routers = {'router-1': (False, '172.24.4.10'),
+                   'router-2': (True, '172.24.4.11'),
+                   'router-3': (False, '172.24.4.12'),
+                   'router-4': (False, '172.24.4.13')}
+        # router-1 and router-2 share an edge, router-4 has no edge
+        edge_bindings = [
+            {'router_id': 'router-1', 'edge_id': 'edge-1',
+             'edge_type': nsxv_constants.SERVICE_EDGE},
+            {'router_id': 'router-2', 'edge_id': 'edge-1',
+             'edge_type': nsxv_constants.SERVICE_EDGE},
+            {'router_id': 'router-3', 'edge_id': 'edge-2',
+             'edge_type': nsxv_constants.SERVICE_EDGE}]
+        subnets = {'router-1': [{'id': 'subnet-1', 'cidr': '10.0.1.0/24'}],
+                   'router-3': [{'id': 'subnet-3', 'cidr': '10.0.3.0/24'}]}
+        with mock.patch.object(driver, '_get_routers_gateway_ips',
+                               return_value=routers),\
+            mock.patch.object(nsxv_db, 'get_nsxv_router_bindings',
+                              return_value=edge_bindings),\
+            mock.patch.object(driver, '_get_routers_interface_subnets',
+                              return_value=subnets) as get_subnets:
+            edges = driver._get_dynamic_routing_edges(
+                self.context, 'ext-net', 'speaker-1')
+        self.assertEqual(['router-1', 'router-3'],
+                         sorted(get_subnets.call_args[0][1]))
+        self.assertEqual(set(['edge-1', 'edge-2']), set(edges))
+        self.assertEqual(['router-1'], edges['edge-1']['no_snat_routers'])
+        self.assertEqual([{'id': 'subnet-1', 'cidr': '10.0.1.0/24'}],
+                         edges['edge-1']['subnets'])
+        self.assertEqual('172.24.4.12', edges['edge-2']['bgp_identifier'])
+        self.assertFalse(edges['edge-2']['advertise_static_routes'])
+
+    def test_get_speaker_dynamic_routing_edges_memoized(self):
+        cfg.CONF.set_override('bgp_routes_cache_ttl', 60, 'nsxv')
+        driver = self.bgp_plugin.nsxv_driver
+        with mock.patch.object(driver, '_get_dynamic_routing_edges',
+                               return_value={}) as get_edges:
+            driver._get_speaker_dynamic_routing_edges(
+                self.context, 'ext-net', 'speaker-1')
+            driver._get_speaker_dynamic_routing_edges(
+                self.context, 'ext-net', 'speaker-1')
+            self.assertEqual(1, get_edges.call_count)
+            # A router gateway change should invalidate the cached edges
+            self.bgp_plugin.router_gateway_callback(
+                None, None, None, context=self.context,
+                router_id='router-1', network_id='other-net')
+            driver._get_speaker_dynamic_routing_edges(
+                self.context, 'ext-net', 'speaker-1')
+            self.assertEqual(2, get_edges.call_count)
+
     def test_create_bgp_peer_md5_auth_no_password(self):
         # TODO(roeyc): Test requires a minor fix in base class.
         pass
@@ -12,9 +12,13 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import xml.etree.ElementTree as et
+
+import eventlet
 import mock
 from oslo_config import cfg
 from oslo_utils import importutils
+from oslo_utils import uuidutils
 
 from vmware_nsx.services.flowclassifier.nsx_v import driver as nsx_v_driver
 from vmware_nsx.tests import unit as vmware
@@ -294,3 +298,80 @@ class TestNsxvFlowClassifierDriver(
                 section = mock_update_section.call_args[0][0]
                 # make sure the rule is not there
                 self.assertIsNone(section.find('rule'))
+
+    def test_create_flow_classifiers_batched(self):
+        section = et.Element('section')
+
+        def get_section():
+            # let the other requests queue their changes
+            eventlet.sleep(0)
+            return section
+
+        fc_contexts = []
+        for i in range(5):
+            fc = dict(self._fc, id=uuidutils.generate_uuid(),
+                      name='fc%s' % i, ethertype='IPv4')
+            fc_contexts.append(fc_ctx.FlowClassifierContext(
+                self.flowclassifier_plugin, self.ctx, fc))
+        with mock.patch.object(
+            self.driver, 'get_redirect_fw_section_from_backend',
+            side_effect=get_section) as mock_get_section,\
+            mock.patch.object(
+                self.driver,
+                'update_redirect_section_in_backed') as mock_update_section:
+            pool = eventlet.GreenPool()
+            for fc_context in fc_contexts:
+                pool.spawn(self.driver.create_flow_classifier, fc_context)
+            pool.waitall()
+            # The first request is written alone, and the rest are folded
+            # into a second update
+            self.assertEqual(2, mock_get_section.call_count)
+            self.assertEqual(2, mock_update_section.call_count)
+            self.assertEqual(5, len(section.findall('rule')))
+
+    def test_update_flow_classifier_missing_rule(self):
+        fc = dict(self._fc, id=uuidutils.generate_uuid(), ethertype='IPv4')
+        fc_context = fc_ctx.FlowClassifierContext(
+            self.flowclassifier_plugin, self.ctx, fc)
+        with mock.patch.object(
+            self.driver,
+            'update_redirect_section_in_backed') as mock_update_section:
+            self.assertRaises(fc_exc.FlowClassifierException,
+                              self.driver.update_flow_classifier,
+                              fc_context)
+            self.assertFalse(mock_update_section.called)
+
+    def test_create_flow_classifier_failure_in_batch(self):
+        section = et.Element('section')
+
+        def get_section():
+            # let the other requests queue their changes
+            eventlet.sleep(0)
+            return section
+
+        fc_contexts = []
+        for i in range(3):
+            # The rule of the second flow classifier fails to build
+            fc = dict(self._fc, id=uuidutils.generate_uuid(),
+                      name='fc%s' % i, ethertype='IPv4' if i != 1 else None)
+            fc_contexts.append(fc_ctx.FlowClassifierContext(
+                self.flowclassifier_plugin, self.ctx, fc))
+        with mock.patch.object(
+            self.driver, 'get_redirect_fw_section_from_backend',
+            side_effect=get_section),\
+            mock.patch.object(
+                self.driver,
+                'update_redirect_section_in_backed') as mock_update_section:
+            pool = eventlet.GreenPool()
+            threads = [pool.spawn(self.driver.create_flow_classifier,
+                                  fc_context)
+                       for fc_context in fc_contexts]
+            threads[0].wait()
+            self.assertRaises(AttributeError, threads[1].wait)
+            threads[2].wait()
+            self.assertEqual(2, mock_update_section.call_count)
+            # No partial rule was added to the section
+            self.assertEqual(
+                ['fc0', 'fc2'],
+                [rule.find('name').text.split('-')[0]
+                 for rule in section.findall('rule')])
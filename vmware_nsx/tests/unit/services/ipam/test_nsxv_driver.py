@@ -12,8 +12,12 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import mock
+from neutron.tests import base
 from oslo_config import cfg
 
+from vmware_nsx.plugins.nsx_v.vshield.common import exceptions as vc_exc
+from vmware_nsx.services.ipam.nsx_v import driver
 from vmware_nsx.tests.unit.nsx_v import test_plugin
 
 from neutron_lib.api.definitions import provider_net as pnet
@@ -112,3 +116,101 @@ class TestNsxvIpamPorts(test_plugin.TestPortsV2):
             "ipam_driver",
             "vmware_nsx.services.ipam.nsx_v.driver.NsxvIpamDriver")
         super(TestNsxvIpamPorts, self).setUp()
+
+
+class TestNsxvIpamPrefetchSubnets(TestNsxvIpamSubnets):
+    """Run the nsxv ipam driver tests with addresses reserved ahead"""
+    def setUp(self):
+        cfg.CONF.set_override('ipam_prefetch_size', 8, group='nsxv')
+        mock.patch.object(driver.loopingcall,
+                          'FixedIntervalLoopingCall').start()
+        super(TestNsxvIpamPrefetchSubnets, self).setUp()
+        self.addCleanup(driver._prefetch_pools.clear)
+
+    def _allocated_ips(self, subnet):
+        # all the backend pools of the test are in fc2
+        for pool in self.fc2._ipam_pools.values():
+            if pool['request']['name'] == 'subnet_' + subnet['id']:
+                return pool['allocated']
+
+    def test_prefetched_ips_reserved_on_backend(self):
+        with self.provider_net() as net:
+            with self.subnet(network=net, cidr='10.10.10.0/24',
+                             enable_dhcp=False) as subnet:
+                fixed_ips = [{'subnet_id': subnet['subnet']['id']}]
+                port_res = self._create_port(
+                    self.fmt, net['network']['id'], fixed_ips=fixed_ips)
+                port = self.deserialize('json', port_res)
+                # one port uses an ip, and the rest of the block is reserved
+                self.assertEqual(
+                    8, len(self._allocated_ips(subnet['subnet'])))
+                self.assertIn(port['port']['fixed_ips'][0]['ip_address'],
+                              self._allocated_ips(subnet['subnet']))
+
+                driver.release_prefetched_ips()
+                self.assertEqual(
+                    [port['port']['fixed_ips'][0]['ip_address']],
+                    self._allocated_ips(subnet['subnet']))
+
+    def test_bulk_ports_on_large_subnet(self):
+        # Benchmark the backend round trips of a bulk port creation on a /16
+        num_ports = 40
+        reserve_block = driver.NsxvIpamPrefetchPool._reserve_block
+        with self.provider_net() as net:
+            with self.subnet(network=net, cidr='10.0.0.0/16',
+                             enable_dhcp=False) as subnet:
+                fixed_ips = [{'subnet_id': subnet['subnet']['id']}]
+                with mock.patch.object(
+                    driver.NsxvIpamPrefetchPool, '_reserve_block',
+                    autospec=True, side_effect=reserve_block) as reserve:
+                    res = self._create_port_bulk(
+                        self.fmt, num_ports, net['network']['id'],
+                        'test', True, fixed_ips=fixed_ips)
+                    ports = self.deserialize(self.fmt, res)['ports']
+                self.assertEqual(num_ports, len(ports))
+                self.assertEqual(num_ports // 8, reserve.call_count)
+                ips = set(p['fixed_ips'][0]['ip_address'] for p in ports)
+                self.assertEqual(num_ports, len(ips))
+
+
+class TestNsxvIpamPrefetchPorts(TestNsxvIpamPorts):
+    """Run the nsxv plugin ports tests with addresses reserved ahead"""
+    def setUp(self):
+        cfg.CONF.set_override('ipam_prefetch_size', 8, group='nsxv')
+        mock.patch.object(driver.loopingcall,
+                          'FixedIntervalLoopingCall').start()
+        super(TestNsxvIpamPrefetchPorts, self).setUp()
+        self.addCleanup(driver._prefetch_pools.clear)
+
+
+class TestNsxvIpamPrefetchPool(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNsxvIpamPrefetchPool, self).setUp()
+        self.vcns = mock.Mock()
+        self.pool = driver.NsxvIpamPrefetchPool(self.vcns, 'ipaddresspool-1',
+                                                4)
+
+    def _allocated(self, ip_address):
+        return ({}, '<allocatedIpAddress><ipAddress>%s</ipAddress>'
+                    '<prefixLength>24</prefixLength></allocatedIpAddress>' %
+                ip_address)
+
+    def test_reserve_block(self):
+        self.vcns.allocate_ipam_ip_from_pool.side_effect = [
+            self._allocated('10.0.0.%s' % i) for i in range(2, 6)]
+        self.assertEqual('10.0.0.2', self.pool.pop())
+        self.assertEqual(3, len(self.pool))
+
+    def test_reserve_block_failure_releases_allocated(self):
+        self.vcns.allocate_ipam_ip_from_pool.side_effect = [
+            self._allocated('10.0.0.2'), self._allocated('10.0.0.3'),
+            vc_exc.VcnsApiException(status=500, header={}, uri='fake_uri',
+                                    response='<error/>'),
+            self._allocated('10.0.0.4')]
+        self.assertRaises(vc_exc.VcnsApiException, self.pool.pop)
+        self.assertEqual(0, len(self.pool))
+        self.vcns.release_ipam_ip_to_pool.assert_has_calls(
+            [mock.call('ipaddresspool-1', '10.0.0.%s' % i)
+             for i in range(2, 5)], any_order=True)
+        self.assertEqual(3, self.vcns.release_ipam_ip_to_pool.call_count)
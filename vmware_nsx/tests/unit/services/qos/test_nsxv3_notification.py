@@ -325,3 +325,59 @@ class TestQosNsxV3Notification(base.BaseQosTestCase,
         ) as delete_profile:
             self.qos_plugin.delete_policy(self.ctxt, self.policy.id)
             delete_profile.assert_called_once_with(self.fake_profile_id)
+
+    def _get_policies_rules(self, count):
+        policies_rules = []
+        profiles = {}
+        for i in range(count):
+            policy_id = uuidutils.generate_uuid()
+            policies_rules.append((policy_id, None, self.dscp_rule))
+            profiles[policy_id] = 'profile-%s' % i
+        return policies_rules, profiles
+
+    def test_policies_rules_batch_update(self):
+        # test the switch profiles update of several policies together
+        policies_rules, profiles = self._get_policies_rules(3)
+        with mock.patch.object(
+            nsx_db, 'get_switch_profiles_by_qos_policies',
+            return_value=profiles) as get_profiles,\
+            mock.patch(
+                'vmware_nsxlib.v3.core_resources.NsxLibQosSwitchingProfile.'
+                'update_shaping') as update_profile:
+            failed = qos_utils.QosNotificationsHandler().update_policies_rules(
+                self.ctxt, policies_rules)
+
+            self.assertEqual([], failed)
+            # all the profiles are found with a single query
+            get_profiles.assert_called_once_with(
+                self.ctxt.session, [p[0] for p in policies_rules])
+            self.assertEqual(len(policies_rules), update_profile.call_count)
+            updated = sorted(call[0][0]
+                             for call in update_profile.call_args_list)
+            self.assertEqual(sorted(profiles.values()), updated)
+
+    def test_policies_rules_batch_update_failures(self):
+        # test that the failed policies are returned, and do not stop the
+        # update of the others
+        policies_rules, profiles = self._get_policies_rules(3)
+        missing_policy = policies_rules[0][0]
+        failed_policy = policies_rules[1][0]
+        del profiles[missing_policy]
+
+        def _update_shaping(profile_id, **kwargs):
+            if profile_id == profiles[failed_policy]:
+                raise Exception('backend error')
+
+        with mock.patch.object(
+            nsx_db, 'get_switch_profiles_by_qos_policies',
+            return_value=profiles),\
+            mock.patch(
+                'vmware_nsxlib.v3.core_resources.NsxLibQosSwitchingProfile.'
+                'update_shaping',
+                side_effect=_update_shaping) as update_profile:
+            failed = qos_utils.QosNotificationsHandler().update_policies_rules(
+                self.ctxt, policies_rules)
+
+            self.assertEqual(sorted([missing_policy, failed_policy]),
+                             sorted(failed))
+            self.assertEqual(2, update_profile.call_count)
@@ -25,6 +25,7 @@ from neutron.services.qos import qos_plugin
 from neutron.tests.unit.services.qos import base
 from neutron_lib.plugins import directory
 
+from vmware_nsx.common import exceptions as nsx_exc
 from vmware_nsx.dvs import dvs
 from vmware_nsx.dvs import dvs_utils
 from vmware_nsx.services.qos.common import utils as qos_com_utils
@@ -281,3 +282,50 @@ class TestQosNsxVNotification(test_plugin.NsxVPluginV2TestCase,
         is deleted
         """
         self._test_dscp_rule_action_notification('delete')
+
+    def _mock_network_mappings(self, context, net_id):
+        return [('fake_dvs', 'moref-%s' % net_id)]
+
+    @mock.patch.object(dvs.DvsManager, 'update_port_groups_config')
+    def test_update_policy_multiple_networks(self, dvs_update_mock):
+        """Test that the QoS rules of a policy bound to several networks are
+        translated once, and all the port groups are updated
+        """
+        net_ids = [uuidutils.generate_uuid() for i in range(5)]
+        with mock.patch.object(self.policy, 'get_bound_networks',
+                               return_value=net_ids),\
+            mock.patch.object(self._core_plugin,
+                              '_get_qos_backend_network_mappings',
+                              side_effect=self._mock_network_mappings),\
+            mock.patch.object(qos_utils, 'NsxVQosRule') as rule_mock:
+            qos_driver.DRIVER.update_policy(self.ctxt, self.policy)
+            rule_mock.assert_called_once_with(
+                context=self.ctxt, qos_policy_id=self.policy.id)
+            self.assertEqual(len(net_ids), dvs_update_mock.call_count)
+            updated_morefs = set(call[0][2] for call in
+                                 dvs_update_mock.call_args_list)
+            self.assertEqual(set('moref-%s' % net_id for net_id in net_ids),
+                             updated_morefs)
+
+    @mock.patch.object(dvs.DvsManager, 'update_port_groups_config')
+    def test_update_policy_network_failure(self, dvs_update_mock):
+        """Test that a failure on one network does not stop the update of
+        the other networks bound to the policy
+        """
+        net_ids = [uuidutils.generate_uuid() for i in range(3)]
+
+        def _update_port_groups(dvs_id, net_id, *args):
+            if net_id == net_ids[1]:
+                raise nsx_exc.DvsNotFound(dvs=dvs_id)
+
+        dvs_update_mock.side_effect = _update_port_groups
+        with mock.patch.object(self.policy, 'get_bound_networks',
+                               return_value=net_ids),\
+            mock.patch.object(self._core_plugin,
+                              '_get_qos_backend_network_mappings',
+                              side_effect=self._mock_network_mappings),\
+            mock.patch.object(qos_utils, 'NsxVQosRule'):
+            self.assertRaises(nsx_exc.NsxPluginException,
+                              qos_driver.DRIVER.update_policy,
+                              self.ctxt, self.policy)
+            self.assertEqual(len(net_ids), dvs_update_mock.call_count)
@@ -0,0 +1,115 @@
+# Copyright 2017 VMware, Inc.
+# All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import mock
+
+from neutron.objects.qos import policy as qos_policy
+from neutron.tests import base
+from oslo_config import cfg
+
+from vmware_nsx.services.qos.common import utils as qos_com_utils
+
+
+class TestQosBindingCache(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestQosBindingCache, self).setUp()
+        cfg.CONF.set_override('qos_binding_cache_ttl', 10, 'NSX')
+        self.ctx = mock.Mock()
+        self.ctx.session.is_active = False
+        self.policy = mock.Mock(id='policy-1')
+        qos_com_utils.clear_policy_binding_cache()
+        self.addCleanup(qos_com_utils.clear_policy_binding_cache)
+
+    def test_get_port_policy_id_cached(self):
+        with mock.patch.object(qos_policy.QosPolicy, 'get_port_policy',
+                               return_value=self.policy) as get_policy:
+            for i in range(3):
+                self.assertEqual(
+                    'policy-1',
+                    qos_com_utils.get_port_policy_id(self.ctx, 'port-1'))
+            get_policy.assert_called_once_with(self.ctx, 'port-1')
+
+    def test_get_network_policy_id_no_policy_cached(self):
+        with mock.patch.object(qos_policy.QosPolicy, 'get_network_policy',
+                               return_value=None) as get_policy:
+            for i in range(3):
+                self.assertIsNone(
+                    qos_com_utils.get_network_policy_id(self.ctx, 'net-1'))
+            get_policy.assert_called_once_with(self.ctx, 'net-1')
+
+    def test_update_port_policy_binding_invalidates_cache(self):
+        new_policy = mock.Mock(id='policy-2')
+        with mock.patch.object(qos_policy.QosPolicy, 'get_port_policy',
+                               return_value=self.policy) as get_policy,\
+            mock.patch.object(qos_policy.QosPolicy, 'get_object',
+                              return_value=new_policy):
+            qos_com_utils.get_port_policy_id(self.ctx, 'port-1')
+            qos_com_utils.update_port_policy_binding(
+                self.ctx, 'port-1', 'policy-2')
+            self.policy.detach_port.assert_called_once_with('port-1')
+            new_policy.attach_port.assert_called_once_with('port-1')
+            # the binding is read again from the DB after the update
+            get_policy.reset_mock()
+            get_policy.return_value = new_policy
+            self.assertEqual(
+                'policy-2',
+                qos_com_utils.get_port_policy_id(self.ctx, 'port-1'))
+            get_policy.assert_called_once_with(self.ctx, 'port-1')
+
+    def test_update_port_policy_binding_invalidates_after_commit(self):
+        after_commit = []
+        self.ctx.session.is_active = True
+        with mock.patch.object(qos_policy.QosPolicy, 'get_port_policy',
+                               return_value=self.policy) as get_policy,\
+            mock.patch.object(qos_policy.QosPolicy, 'get_object',
+                              return_value=None),\
+            mock.patch.object(
+                qos_com_utils.nsx_db, 'call_after_commit',
+                side_effect=lambda session, func, *args:
+                after_commit.append((func, args))):
+            qos_com_utils.update_port_policy_binding(
+                self.ctx, 'port-1', None)
+            # a concurrent read outside of the transaction caches the
+            # binding which is not committed yet
+            other_ctx = mock.Mock()
+            other_ctx.session.is_active = False
+            qos_com_utils.get_port_policy_id(other_ctx, 'port-1')
+            # the transaction commits
+            for func, args in after_commit:
+                func(*args)
+            get_policy.reset_mock()
+            get_policy.return_value = None
+            self.assertIsNone(
+                qos_com_utils.get_port_policy_id(other_ctx, 'port-1'))
+            get_policy.assert_called_once_with(other_ctx, 'port-1')
+
+    def test_get_port_policy_id_in_transaction_not_cached(self):
+        # a binding read inside a transaction may be rolled back
+        self.ctx.session.is_active = True
+        with mock.patch.object(qos_policy.QosPolicy, 'get_port_policy',
+                               return_value=self.policy) as get_policy:
+            qos_com_utils.get_port_policy_id(self.ctx, 'port-1')
+            self.ctx.session.is_active = False
+            qos_com_utils.get_port_policy_id(self.ctx, 'port-1')
+            qos_com_utils.get_port_policy_id(self.ctx, 'port-1')
+            self.assertEqual(2, get_policy.call_count)
+
+    def test_cache_disabled_by_default(self):
+        cfg.CONF.clear_override('qos_binding_cache_ttl', 'NSX')
+        with mock.patch.object(qos_policy.QosPolicy, 'get_port_policy',
+                               return_value=self.policy) as get_policy:
+            qos_com_utils.get_port_policy_id(self.ctx, 'port-1')
+            qos_com_utils.get_port_policy_id(self.ctx, 'port-1')
+            self.assertEqual(2, get_policy.call_count)
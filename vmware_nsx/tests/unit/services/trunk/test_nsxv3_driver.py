@@ -15,6 +15,7 @@
 
 import mock
 
+from neutron.services.trunk import constants as trunk_consts
 from neutron.tests import base
 
 from neutron_lib import context
@@ -22,9 +23,11 @@ from oslo_config import cfg
 from oslo_utils import importutils
 
 from vmware_nsx.common import nsx_constants
+from vmware_nsx.db import db as nsx_db
 from vmware_nsx.services.trunk.nsx_v3 import driver as trunk_driver
 from vmware_nsx.tests.unit.nsx_v3 import test_constants as test_consts
 from vmware_nsx.tests.unit.nsx_v3 import test_plugin as test_nsx_v3_plugin
+from vmware_nsxlib.v3 import exceptions as nsxlib_exc
 
 
 class TestNsxV3TrunkHandler(test_nsx_v3_plugin.NsxV3PluginTestCaseMixin,
@@ -34,7 +37,13 @@ class TestNsxV3TrunkHandler(test_nsx_v3_plugin.NsxV3PluginTestCaseMixin,
         self.context = context.get_admin_context()
         self.core_plugin = importutils.import_object(test_consts.PLUGIN_NAME)
         self.handler = trunk_driver.NsxV3TrunkHandler(self.core_plugin)
-        self.handler._update_port_at_backend = mock.Mock()
+        self.handler._update_subport_at_backend = mock.Mock()
+        mock.patch.object(
+            self.core_plugin, 'get_ports',
+            side_effect=self._fake_get_ports).start()
+        mock.patch.object(
+            nsx_db, 'get_nsx_port_ids_by_neutron_ids',
+            side_effect=self._fake_get_nsx_port_ids).start()
         self.trunk_1 = mock.Mock()
         self.trunk_1.port_id = "parent_port_1"
 
@@ -56,117 +65,121 @@ class TestNsxV3TrunkHandler(test_nsx_v3_plugin.NsxV3PluginTestCaseMixin,
         self.sub_port_3.trunk_id = "trunk-2"
         self.sub_port_3.port_id = "sub_port_3"
 
+    def _fake_get_ports(self, context, filters=None):
+        return [{'id': port_id} for port_id in filters['id']]
+
+    def _fake_get_nsx_port_ids(self, session, neutron_ids):
+        return dict((port_id, 'nsx_' + port_id) for port_id in neutron_ids)
+
+    def _subport_call(self, parent_port_id, subport):
+        return mock.call(parent_port_id, subport, {'id': subport.port_id},
+                         'nsx_' + subport.port_id)
+
+    def _assert_subports_updated(self, parent_port_id, subports):
+        calls = [self._subport_call(parent_port_id, subport)
+                 for subport in subports]
+        self.handler._update_subport_at_backend.assert_has_calls(
+            calls, any_order=True)
+
     def test_trunk_created(self):
         # Create trunk with no subport
         self.trunk_1.sub_ports = []
         self.handler.trunk_created(self.context, self.trunk_1)
-        self.handler._update_port_at_backend.assert_not_called()
+        self.handler._update_subport_at_backend.assert_not_called()
+        self.trunk_1.update.assert_called_with(
+            status=trunk_consts.ACTIVE_STATUS)
 
         # Create trunk with 1 subport
         self.trunk_1.sub_ports = [self.sub_port_1]
         self.handler.trunk_created(self.context, self.trunk_1)
-        self.handler._update_port_at_backend.assert_called_with(
-            self.context,
-            self.trunk_1.port_id,
-            self.sub_port_1)
+        self._assert_subports_updated(self.trunk_1.port_id,
+                                      [self.sub_port_1])
 
         # Create trunk with multiple subports
         self.trunk_2.sub_ports = [self.sub_port_2, self.sub_port_3]
         self.handler.trunk_created(self.context, self.trunk_2)
-        calls = [mock.call._update_port_at_backend(
-                     self.context,
-                     self.trunk_2.port_id,
-                     self.sub_port_2),
-                 mock.call._update_port_at_backend(
-                     self.context,
-                     self.trunk_2.port_id,
-                     self.sub_port_3)]
-        self.handler._update_port_at_backend.assert_has_calls(
-            calls, any_order=True)
+        self._assert_subports_updated(self.trunk_2.port_id,
+                                      [self.sub_port_2, self.sub_port_3])
+        self.trunk_2.update.assert_called_with(
+            status=trunk_consts.ACTIVE_STATUS)
+
+    def test_trunk_created_subport_failure(self):
+        def fake_update(parent_port_id, subport, child_port,
+                        nsx_child_port_id):
+            if subport.port_id == self.sub_port_2.port_id:
+                raise nsxlib_exc.ManagerError(details='fake')
+
+        self.handler._update_subport_at_backend.side_effect = fake_update
+        self.trunk_2.sub_ports = [self.sub_port_2, self.sub_port_3]
+        self.handler.trunk_created(self.context, self.trunk_2)
+        # All the subports should be handled despite the failure
+        self._assert_subports_updated(self.trunk_2.port_id,
+                                      [self.sub_port_2, self.sub_port_3])
+        self.trunk_2.update.assert_called_with(
+            status=trunk_consts.DEGRADED_STATUS)
+
+        self.trunk_2.sub_ports = [self.sub_port_2]
+        self.handler.trunk_created(self.context, self.trunk_2)
+        self.trunk_2.update.assert_called_with(
+            status=trunk_consts.ERROR_STATUS)
 
     def test_trunk_deleted(self):
         # Delete trunk with no subport
         self.trunk_1.sub_ports = []
         self.handler.trunk_deleted(self.context, self.trunk_1)
-        self.handler._update_port_at_backend.assert_not_called()
+        self.handler._update_subport_at_backend.assert_not_called()
 
         # Delete trunk with 1 subport
         self.trunk_1.sub_ports = [self.sub_port_1]
         self.handler.trunk_deleted(self.context, self.trunk_1)
-        self.handler._update_port_at_backend.assert_called_with(
-            context=self.context,
-            parent_port_id=None,
-            subport=self.sub_port_1)
+        self._assert_subports_updated(None, [self.sub_port_1])
 
         # Delete trunk with multiple subports
         self.trunk_2.sub_ports = [self.sub_port_2, self.sub_port_3]
         self.handler.trunk_deleted(self.context, self.trunk_2)
-        calls = [mock.call._update_port_at_backend(
-                     context=self.context,
-                     parent_port_id=None,
-                     subport=self.sub_port_2),
-                 mock.call._update_port_at_backend(
-                     context=self.context,
-                     parent_port_id=None,
-                     subport=self.sub_port_3)]
-        self.handler._update_port_at_backend.assert_has_calls(
-            calls, any_order=True)
+        self._assert_subports_updated(None,
+                                      [self.sub_port_2, self.sub_port_3])
 
     def test_subports_added(self):
         # Update trunk with no subport
         sub_ports = []
         self.handler.subports_added(self.context, self.trunk_1, sub_ports)
-        self.handler._update_port_at_backend.assert_not_called()
+        self.handler._update_subport_at_backend.assert_not_called()
 
         # Update trunk with 1 subport
         sub_ports = [self.sub_port_1]
         self.handler.subports_added(self.context, self.trunk_1, sub_ports)
-        self.handler._update_port_at_backend.assert_called_with(
-            self.context,
-            self.trunk_1.port_id,
-            self.sub_port_1)
+        self._assert_subports_updated(self.trunk_1.port_id, sub_ports)
 
         # Update trunk with multiple subports
         sub_ports = [self.sub_port_2, self.sub_port_3]
         self.handler.subports_added(self.context, self.trunk_2, sub_ports)
-        calls = [mock.call._update_port_at_backend(
-                     self.context,
-                     self.trunk_2.port_id,
-                     self.sub_port_2),
-                 mock.call._update_port_at_backend(
-                     self.context,
-                     self.trunk_2.port_id,
-                     self.sub_port_3)]
-        self.handler._update_port_at_backend.assert_has_calls(
-            calls, any_order=True)
+        self._assert_subports_updated(self.trunk_2.port_id, sub_ports)
+
+    def test_subports_added_missing_mapping(self):
+        nsx_db.get_nsx_port_ids_by_neutron_ids.side_effect = None
+        nsx_db.get_nsx_port_ids_by_neutron_ids.return_value = {}
+        sub_ports = [self.sub_port_1]
+        self.handler.subports_added(self.context, self.trunk_1, sub_ports)
+        self.handler._update_subport_at_backend.assert_not_called()
+        self.trunk_1.update.assert_called_with(
+            status=trunk_consts.ERROR_STATUS)
 
     def test_subports_deleted(self):
         # Update trunk to remove no subport
         sub_ports = []
         self.handler.subports_deleted(self.context, self.trunk_1, sub_ports)
-        self.handler._update_port_at_backend.assert_not_called()
+        self.handler._update_subport_at_backend.assert_not_called()
 
         # Update trunk to remove 1 subport
         sub_ports = [self.sub_port_1]
         self.handler.subports_deleted(self.context, self.trunk_1, sub_ports)
-        self.handler._update_port_at_backend.assert_called_with(
-            context=self.context,
-            parent_port_id=None,
-            subport=self.sub_port_1)
+        self._assert_subports_updated(None, sub_ports)
 
         # Update trunk to remove multiple subports
         sub_ports = [self.sub_port_2, self.sub_port_3]
         self.handler.subports_deleted(self.context, self.trunk_2, sub_ports)
-        calls = [mock.call._update_port_at_backend(
-                     context=self.context,
-                     parent_port_id=None,
-                     subport=self.sub_port_2),
-                 mock.call._update_port_at_backend(
-                     context=self.context,
-                     parent_port_id=None,
-                     subport=self.sub_port_3)]
-        self.handler._update_port_at_backend.assert_has_calls(
-            calls, any_order=True)
+        self._assert_subports_updated(None, sub_ports)
 
 
 class TestNsxV3TrunkDriver(base.BaseTestCase):
@@ -14,12 +14,17 @@
 #    under the License.
 
 import abc
+import os
+import tempfile
+
+import eventlet
 import mock
 import six
 
 from oslo_config import cfg
 from oslo_log import _options
 from oslo_log import log as logging
+from oslo_utils import importutils
 from oslo_utils import uuidutils
 
 from neutron.common import config as neutron_config
@@ -32,7 +37,14 @@ from vmware_nsx._i18n import _
 from vmware_nsx.common import config  # noqa
 from vmware_nsx.db import nsxv_db
 from vmware_nsx.dvs import dvs_utils
+from vmware_nsx.plugins.nsx_v.vshield.common import exceptions as vcns_exc
+from vmware_nsx.shell.admin.plugins.common import utils as admin_utils
+from vmware_nsx.shell.admin.plugins.nsxv.resources import dhcp_binding as \
+    nsxv_dhcp_binding
+from vmware_nsx.shell.admin.plugins.nsxv.resources import edges as nsxv_edges
 from vmware_nsx.shell.admin.plugins.nsxv.resources import utils as nsxv_utils
+from vmware_nsx.shell.admin.plugins.nsxv3.resources import ports as \
+    nsxv3_ports
 from vmware_nsx.shell.admin.plugins.nsxv3.resources import utils as nsxv3_utils
 from vmware_nsx.shell import resources
 from vmware_nsx.tests import unit as vmware
@@ -194,6 +206,17 @@ class TestNsxvAdminUtils(AbstractTestAdminUtils,
                                              "syslog-proto=tcp",
                                              "log-level=debug"])
 
+    def test_edges_nsx_update_all(self):
+        """Test edges/nsx-update-all utility with different inputs."""
+        for params in (["appliances=true"],
+                       ["appliances=true", "threads=5"],
+                       ["hostgroup=all"],
+                       ["syslog-server=1.1.1.1", "syslog-proto=tcp"],
+                       ["syslog-server=none"],
+                       ["log-level=debug"]):
+            self._test_resource('edges', 'nsx-update-all',
+                                property=params)
+
     def test_bad_args(self):
         args = {'property': ["xxx"]}
         errors = self._test_resource_with_errors(
@@ -250,6 +273,13 @@ class TestNsxv3AdminUtils(AbstractTestAdminUtils,
                                return_value={'id': uuidutils.generate_uuid()})
             self._patch_object(cls, 'update')
 
+        # the backend resources are listed page by page with the client
+        for cls in (nsx_v3_resources.LogicalPort,
+                    nsx_v3_resources.LogicalDhcpServer,
+                    nsx_v3_resources.LogicalRouter):
+            self._patch_object(cls, 'client', create=True,
+                               new=mock.Mock(url_get=mock.Mock(
+                                   return_value={'results': []})))
         self._patch_object(nsx_v3_resources.SwitchingProfile,
                            'find_by_display_name',
                            return_value=[{'id': uuidutils.generate_uuid()}])
@@ -283,3 +313,378 @@ class TestNsxv3AdminUtils(AbstractTestAdminUtils,
                     # Run all utilities with backend objects
                     self._test_resources_with_args(
                         resources.nsxv3_resources, args)
+
+
+class TestAdminUpdateResources(base.BaseTestCase):
+
+    def test_update_resources_concurrently(self):
+        update_func = mock.Mock()
+        failed = admin_utils.update_resources(
+            ['res-1', 'res-2', 'res-3'], update_func, threads=3)
+        self.assertEqual([], failed)
+        self.assertEqual(3, update_func.call_count)
+
+    def test_update_resources_failures(self):
+        update_func = mock.Mock(side_effect=[False, Exception('fake'), None])
+        failed = admin_utils.update_resources(
+            ['res-1', 'res-2', 'res-3'], update_func)
+        self.assertEqual(['res-1', 'res-2'], failed)
+
+    def test_read_progress_file_missing(self):
+        self.assertEqual(set(), admin_utils.read_progress_file(
+            '/nonexistent/progress-file'))
+
+
+class TestAdminMergeJoin(base.BaseTestCase):
+
+    def _merge_join(self, left, right):
+        return list(admin_utils.merge_join(
+            left, right, lambda item: item, lambda item: item))
+
+    def test_merge_join(self):
+        self.assertEqual(
+            [('a', None), ('b', 'b'), (None, 'c'), ('d', 'd'), (None, 'e')],
+            self._merge_join(['a', 'b', 'd'], ['b', 'c', 'd', 'e']))
+
+    def test_merge_join_empty(self):
+        self.assertEqual([(None, 'a')], self._merge_join([], ['a']))
+        self.assertEqual([('a', None)], self._merge_join(['a'], []))
+
+    def test_merge_join_duplicate_left_keys(self):
+        self.assertEqual([('a', 'a'), ('a', 'a'), (None, 'b')],
+                         self._merge_join(['a', 'a'], ['a', 'b']))
+
+    def test_merge_join_not_sorted(self):
+        self.assertRaises(ValueError, self._merge_join, ['b', 'a'], ['a'])
+
+
+class TestNsxv3ResourcesListing(base.BaseTestCase):
+
+    def test_get_nsx_resources_sorted(self):
+        resource_client = mock.Mock(uri_segment='logical-switches')
+        resource_client.client.url_get.side_effect = [
+            {'results': [{'id': 'ls1'}, {'id': 'ls2'}], 'cursor': 'next'},
+            {'results': [{'id': 'ls3'}], 'cursor': '0000abcd'}]
+        self.assertEqual(
+            ['ls1', 'ls2', 'ls3'],
+            [ls['id'] for ls in nsxv3_utils.get_nsx_resources_sorted(
+                resource_client)])
+        uri = ('logical-switches?page_size=1000&sort_by=id&'
+               'sort_ascending=true')
+        resource_client.client.url_get.assert_has_calls([
+            mock.call(uri), mock.call(uri + '&cursor=next')])
+
+
+class TestNsxv3PortsSnapshot(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNsxv3PortsSnapshot, self).setUp()
+        self.port_client = mock.Mock(uri_segment='logical-ports')
+
+    def test_snapshot_pages(self):
+        self.port_client.client.url_get.side_effect = [
+            {'results': [{'id': 'port1'}, {'id': 'port2'}],
+             'result_count': 3, 'cursor': 'next'},
+            {'results': [{'id': 'port3'}], 'cursor': '0000abcd'}]
+        snapshot = nsxv3_ports.get_logical_ports_snapshot(self.port_client)
+        self.assertEqual(['port1', 'port2', 'port3'], sorted(snapshot))
+        self.port_client.client.url_get.assert_has_calls([
+            mock.call('logical-ports?page_size=1000'),
+            mock.call('logical-ports?page_size=1000&cursor=next')])
+
+    def test_snapshot_by_logical_switch(self):
+        def _url_get(url):
+            switch_id = url.split('logical_switch_id=')[1]
+            return {'results': [{'id': 'port-%s' % switch_id}]}
+
+        self.port_client.client.url_get.side_effect = _url_get
+        snapshot = nsxv3_ports.get_logical_ports_snapshot(
+            self.port_client, logical_switch_ids=['ls1', 'ls2'], threads=2)
+        self.assertEqual(['port-ls1', 'port-ls2'], sorted(snapshot))
+        self.assertEqual(2, self.port_client.client.url_get.call_count)
+
+
+class TestNsxv3MigrateVmPorts(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNsxv3MigrateVmPorts, self).setUp()
+        self.vm_mng = mock.Mock()
+        net = mock.Mock(_type='DistributedVirtualPortgroup')
+        prop = mock.Mock(val=mock.Mock(ManagedObjectReference=[net]))
+        prop.name = 'network'
+        self.vm_mng.get_vm_spec.return_value = mock.Mock(propSet=[prop])
+        self.devices = [mock.Mock(macAddress='mac-1'),
+                        mock.Mock(macAddress='mac-2')]
+        self.vm_mng.get_vm_interfaces_info.return_value = self.devices
+        self.ports = [{'id': 'port-1', 'mac_address': 'mac-1',
+                       'network_id': 'net-1'},
+                      {'id': 'port-2', 'mac_address': 'mac-2',
+                       'network_id': 'net-2'}]
+        self.nsx_net_ids = {'net-1': 'ls-1', 'net-2': 'ls-2'}
+
+    def test_migrate_vm_ports_single_reconfig(self):
+        self.assertTrue(nsxv3_ports._migrate_vm_ports(
+            self.vm_mng, 'vm-1', self.ports, self.nsx_net_ids))
+        self.vm_mng.replace_vm_interfaces.assert_called_once_with(
+            self.vm_mng.get_vm_moref_obj.return_value, self.devices,
+            [('port-1', 'mac-1', 'ls-1', 'Mock'),
+             ('port-2', 'mac-2', 'ls-2', 'Mock')])
+
+    def test_migrate_vm_ports_vm_not_found(self):
+        self.vm_mng.get_vm_moref_obj.return_value = None
+        self.assertFalse(nsxv3_ports._migrate_vm_ports(
+            self.vm_mng, 'vm-1', self.ports, self.nsx_net_ids))
+        self.vm_mng.replace_vm_interfaces.assert_not_called()
+
+    def test_migrate_vm_ports_already_migrated(self):
+        self.vm_mng.get_vm_spec.return_value = mock.Mock(propSet=[])
+        self.assertTrue(nsxv3_ports._migrate_vm_ports(
+            self.vm_mng, 'vm-1', self.ports, self.nsx_net_ids))
+        self.vm_mng.replace_vm_interfaces.assert_not_called()
+
+
+class TestNsxvUpdateEdges(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNsxvUpdateEdges, self).setUp()
+        mock.patch.object(nsxv_edges, 'UPDATE_CONFLICT_DELAY', 0).start()
+
+    def test_update_edges_concurrently(self):
+        edge_ids = ['edge-1', 'edge-2', 'edge-3']
+        update_func = mock.Mock()
+        failed = nsxv_edges.update_edges(edge_ids, update_func, threads=3)
+        self.assertEqual([], failed)
+        update_func.assert_has_calls(
+            [mock.call(edge_id) for edge_id in edge_ids], any_order=True)
+
+    def test_update_edges_retry_on_conflict(self):
+        update_func = mock.Mock(side_effect=[
+            vcns_exc.ServiceConflict(uri='fake_uri'), None])
+        failed = nsxv_edges.update_edges(['edge-1'], update_func)
+        self.assertEqual([], failed)
+        self.assertEqual(2, update_func.call_count)
+
+    def test_update_edges_failure(self):
+        update_func = mock.Mock(side_effect=[Exception('fake error'), None])
+        failed = nsxv_edges.update_edges(['edge-1', 'edge-2'], update_func)
+        self.assertEqual(['edge-1'], failed)
+        self.assertEqual(2, update_func.call_count)
+
+    def test_update_edges_resume(self):
+        fd, progress_file = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, progress_file)
+        with open(progress_file, 'w') as f:
+            f.write('edge-1\n')
+        update_func = mock.Mock()
+        failed = nsxv_edges.update_edges(['edge-1', 'edge-2'], update_func,
+                                         progress_file=progress_file)
+        self.assertEqual([], failed)
+        update_func.assert_called_once_with('edge-2')
+        with open(progress_file) as f:
+            self.assertEqual(['edge-1', 'edge-2'], f.read().split())
+
+
+class TestNsxvDhcpBindingsDiff(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNsxvDhcpBindingsDiff, self).setUp()
+        self.nsxv = mock.patch.object(nsxv_dhcp_binding, 'nsxv').start()
+        mock.patch.object(nsxv_dhcp_binding, 'neutron_db').start()
+        self.neutron_bindings = [
+            mock.Mock(edge_id='edge-1', mac_address='FA:16:3E:00:00:01',
+                      binding_id='Binding-1'),
+            mock.Mock(edge_id='edge-1', mac_address='fa:16:3e:00:00:02',
+                      binding_id='binding-2'),
+            mock.Mock(edge_id='edge-2', mac_address='fa:16:3e:00:00:03',
+                      binding_id='binding-3')]
+        mock.patch.object(nsxv_db, 'get_dhcp_static_bindings',
+                          return_value=self.neutron_bindings).start()
+        self.nsx_bindings = {
+            'edge-1': [{'macAddress': 'fa:16:3e:00:00:01',
+                        'bindingId': 'binding-1'},
+                       {'macAddress': 'fa:16:3e:00:00:04',
+                        'bindingId': 'binding-4'}],
+            'edge-2': [{'macAddress': 'fa:16:3e:00:00:03',
+                        'bindingId': 'binding-3'}]}
+        self.nsxv.query_dhcp_configuration.side_effect = (
+            self._query_dhcp_configuration)
+        self.backend_edges = [
+            {'id': 'edge-1', 'name': 'dhcp-1'},
+            {'id': 'edge-2', 'name': 'dhcp-2'},
+            {'id': 'edge-10', 'name': 'router-10'}]
+        mock.patch.object(nsxv_dhcp_binding.utils, 'get_nsxv_backend_edges',
+                          return_value=self.backend_edges).start()
+
+    def _query_dhcp_configuration(self, edge_id):
+        if edge_id not in self.nsx_bindings:
+            raise vcns_exc.ResourceNotFound(uri='fake_uri')
+        return ({}, {'staticBindings': {
+            'staticBindings': self.nsx_bindings[edge_id]}})
+
+    def test_neutron_get_static_bindings_by_edges(self):
+        self.assertEqual(
+            {'edge-1': set([('edge-1', 'fa:16:3e:00:00:01', 'binding-1'),
+                            ('edge-1', 'fa:16:3e:00:00:02', 'binding-2')]),
+             'edge-2': set([('edge-2', 'fa:16:3e:00:00:03', 'binding-3')])},
+            nsxv_dhcp_binding.neutron_get_static_bindings_by_edges())
+
+    def test_get_dhcp_bindings_diff(self):
+        self.neutron_bindings.append(
+            mock.Mock(edge_id='edge-3', mac_address='fa:16:3e:00:00:05',
+                      binding_id='binding-5'))
+        self.assertEqual(
+            [{'edge_id': 'edge-1', 'mac_address': 'fa:16:3e:00:00:02',
+              'binding_id': 'binding-2', 'diff': 'missing'},
+             {'edge_id': 'edge-1', 'mac_address': 'fa:16:3e:00:00:04',
+              'binding_id': 'binding-4', 'diff': 'extra'},
+             {'edge_id': 'edge-3', 'mac_address': None,
+              'binding_id': None, 'diff': 'edge-not-found'}],
+            nsxv_dhcp_binding.get_dhcp_bindings_diff())
+
+    def test_get_dhcp_bindings_diff_backend_dhcp_edges(self):
+        # the bindings of backend DHCP edges without neutron bindings are
+        # extra, and the other backend edges are not audited
+        self.backend_edges.extend([{'id': 'edge-3', 'name': 'dhcp-3'},
+                                   {'id': 'edge-4', 'name': 'dhcp-4'}])
+        self.nsx_bindings['edge-3'] = [{'macAddress': 'fa:16:3e:00:00:06',
+                                        'bindingId': 'binding-6'}]
+        del self.neutron_bindings[1]
+        del self.nsx_bindings['edge-1'][1]
+        self.assertEqual(
+            [{'edge_id': 'edge-3', 'mac_address': 'fa:16:3e:00:00:06',
+              'binding_id': 'binding-6', 'diff': 'extra'}],
+            nsxv_dhcp_binding.get_dhcp_bindings_diff())
+        self.nsxv.query_dhcp_configuration.assert_has_calls(
+            [mock.call('edge-1'), mock.call('edge-2'), mock.call('edge-3'),
+             mock.call('edge-4')], any_order=True)
+        self.assertEqual(4, self.nsxv.query_dhcp_configuration.call_count)
+
+    def test_get_dhcp_bindings_diff_in_sync(self):
+        del self.neutron_bindings[1]
+        del self.nsx_bindings['edge-1'][1]
+        self.assertEqual([], nsxv_dhcp_binding.get_dhcp_bindings_diff())
+
+    def test_get_dhcp_bindings_diff_concurrent_fetch(self):
+        running = []
+        max_running = []
+        edge_ids = ['edge-%s' % i for i in range(1, 6)]
+        for edge_id in edge_ids[2:]:
+            self.nsx_bindings[edge_id] = []
+
+        def _query_dhcp_configuration(edge_id):
+            running.append(edge_id)
+            max_running.append(len(running))
+            eventlet.sleep(0.01)
+            running.remove(edge_id)
+            return self._query_dhcp_configuration(edge_id)
+
+        self.nsxv.query_dhcp_configuration.side_effect = (
+            _query_dhcp_configuration)
+        del self.neutron_bindings[1]
+        del self.nsx_bindings['edge-1'][1]
+        self.neutron_bindings.extend(
+            mock.Mock(edge_id=edge_id, mac_address='fa:16:3e:00:00:05',
+                      binding_id='binding-5') for edge_id in edge_ids[2:])
+        diffs = nsxv_dhcp_binding.get_dhcp_bindings_diff(threads=2)
+        # The diffs are ordered by edge
+        self.assertEqual(
+            edge_ids[2:], [diff['edge_id'] for diff in diffs])
+        self.assertEqual(2, max(max_running))
+        self.nsxv.query_dhcp_configuration.assert_has_calls(
+            [mock.call(edge_id) for edge_id in edge_ids], any_order=True)
+        self.assertEqual(5, self.nsxv.query_dhcp_configuration.call_count)
+
+    def test_list_missing_dhcp_bindings_no_diff_output(self):
+        with mock.patch.object(nsxv_dhcp_binding, 'get_dhcp_bindings_diff',
+                               return_value=[]),\
+            mock.patch.object(nsxv_dhcp_binding.formatters,
+                              'output_formatter') as output_formatter,\
+            mock.patch.object(nsxv_dhcp_binding.LOG, 'info') as log_info:
+            nsxv_dhcp_binding.list_missing_dhcp_bindings(
+                'dhcp-binding', 'list-missing', 'nsxadmin')
+        output_formatter.assert_called_once_with(
+            mock.ANY, [], mock.ANY)
+        log_info.assert_any_call(output_formatter.return_value)
+
+
+class TestNsxv3MigrateNsgroupsToDynamicCriteria(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNsxv3MigrateNsgroupsToDynamicCriteria, self).setUp()
+        # The module connects to the NSX manager when it is first imported
+        with mock.patch.object(nsxv3_utils, 'get_connected_nsxlib'):
+            self.securitygroups = importutils.import_module(
+                'vmware_nsx.shell.admin.plugins.nsxv3.resources.'
+                'securitygroups')
+        self.nsxlib = mock.patch.object(self.securitygroups,
+                                        'nsxlib').start()
+        self.nsxlib.ns_group.get_lport_tags.side_effect = (
+            lambda sg_ids: [{'scope': 'os-security-group', 'tag': sg_id}
+                            for sg_id in sg_ids])
+        self.neutron_sg = mock.patch.object(self.securitygroups,
+                                            'neutron_sg').start()
+        self.neutron_sg.get_ports_security_groups.return_value = {
+            'port-1': ['sg-1'], 'port-2': ['sg-1', 'sg-2']}
+        self.neutron_sg.get_logical_ports_ids.return_value = {
+            'port-1': 'lport-1', 'port-2': 'lport-2'}
+        self.neutron_sg.get_security_groups.return_value = [
+            {'id': 'sg-1'}, {'id': 'sg-2'}]
+        self.neutron_sg.get_nsgroups_ids.return_value = {
+            'sg-1': 'nsgroup-1', 'sg-2': 'nsgroup-2'}
+        self.port_client = mock.Mock()
+        mock.patch.object(self.securitygroups.ports,
+                          'get_port_and_profile_clients',
+                          return_value=(self.port_client, None)).start()
+        mock.patch.object(self.securitygroups.utils, 'is_nsx_version_1_1_0',
+                          return_value=True).start()
+        self.log_warning = mock.patch.object(self.securitygroups.LOG,
+                                             'warning').start()
+
+    def _migrate(self):
+        self.securitygroups.migrate_nsgroups_to_dynamic_criteria(
+            'nsgroups', 'migrate-to-dynamic-criteria', 'nsxadmin',
+            property=['threads=2'])
+
+    def test_migrate(self):
+        self._migrate()
+        self.port_client.update.assert_has_calls([
+            mock.call('lport-1', False, tags_update=[
+                {'scope': 'os-security-group', 'tag': 'sg-1'}]),
+            mock.call('lport-2', False, tags_update=[
+                {'scope': 'os-security-group', 'tag': 'sg-1'},
+                {'scope': 'os-security-group', 'tag': 'sg-2'}])],
+            any_order=True)
+        self.nsxlib.ns_group.update.assert_has_calls([
+            mock.call('nsgroup-1', membership_criteria=mock.ANY, members=[]),
+            mock.call('nsgroup-2', membership_criteria=mock.ANY,
+                      members=[])], any_order=True)
+        # The mappings are read with one query each, and not per resource
+        self.neutron_sg.get_ports_security_groups.assert_called_once_with()
+        self.neutron_sg.get_logical_ports_ids.assert_called_once_with()
+        self.neutron_sg.get_nsgroups_ids.assert_called_once_with()
+        self.neutron_sg.get_logical_port_id.assert_not_called()
+        self.neutron_sg.get_ports_in_security_group.assert_not_called()
+
+    def test_migrate_port_failure_skips_nsgroups(self):
+        def _update(lport_id, *args, **kwargs):
+            if lport_id == 'lport-2':
+                raise Exception('fake failure')
+
+        self.port_client.update.side_effect = _update
+        self._migrate()
+        self.assertEqual(2, self.port_client.update.call_count)
+        # The NSGroups keep their direct members
+        self.neutron_sg.get_security_groups.assert_not_called()
+        self.nsxlib.ns_group.update.assert_not_called()
+
+    def test_migrate_missing_backend_resources(self):
+        del self.neutron_sg.get_logical_ports_ids.return_value['port-2']
+        del self.neutron_sg.get_nsgroups_ids.return_value['sg-2']
+        self._migrate()
+        self.port_client.update.assert_called_once_with(
+            'lport-1', False, tags_update=mock.ANY)
+        self.nsxlib.ns_group.update.assert_called_once_with(
+            'nsgroup-1', membership_criteria=mock.ANY, members=[])
+        self.log_warning.assert_has_calls([
+            mock.call(mock.ANY, 'port-2'), mock.call(mock.ANY, 'sg-2')])
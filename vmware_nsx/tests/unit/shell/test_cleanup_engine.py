@@ -0,0 +1,250 @@
+# Copyright 2018 VMware, Inc.
+# All Rights Reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import imp
+import os
+import threading
+
+import eventlet
+import mock
+from neutron.tests import base
+from oslo_serialization import jsonutils
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+from six.moves.urllib import parse as urlparse
+
+from vmware_nsx.shell import cleanup_engine
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         '..', '..', '..', '..', 'devstack', 'tools')
+
+
+class CleanupEngineTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(CleanupEngineTestCase, self).setUp()
+        self.engine = cleanup_engine.CleanupEngine(threads=3)
+        self.deleted = []
+
+    def _delete(self, resource):
+        # Yield so the other deletions run concurrently
+        eventlet.sleep(0)
+        self.deleted.append(resource)
+        return True
+
+    def test_run_steps_in_order(self):
+        deleted = self.engine.run([
+            [('sections', lambda: ['section-1', 'section-2'], self._delete)],
+            [('groups', lambda: ['group-1', 'group-2', 'group-3'],
+              self._delete),
+             ('policies', lambda: ['policy-1'], self._delete)],
+            [('switches', lambda: ['switch-1'], self._delete)]])
+        self.assertEqual(7, deleted)
+        self.assertEqual(set(['section-1', 'section-2']),
+                         set(self.deleted[:2]))
+        self.assertEqual(set(['group-1', 'group-2', 'group-3', 'policy-1']),
+                         set(self.deleted[2:6]))
+        self.assertEqual('switch-1', self.deleted[6])
+
+    def test_run_step_lists_after_previous_step(self):
+        # The resources of a step are listed once the previous step ended
+        list_func = mock.Mock(side_effect=lambda: list(self.deleted))
+        self.engine.run([[('sections', lambda: ['section-1'], self._delete)],
+                         [('groups', list_func, self._delete)]])
+        self.assertEqual(['section-1', 'section-1'], self.deleted)
+
+    def test_run_step_failures(self):
+        def _delete(resource):
+            if resource == 'bad':
+                return False
+            if resource == 'error':
+                raise Exception('fake error')
+            return self._delete(resource)
+
+        deleted = self.engine.run_step(
+            [('groups', lambda: ['good', 'bad', 'error'], _delete),
+             ('policies', lambda: None, _delete)])
+        self.assertEqual(1, deleted)
+        self.assertEqual(['good'], self.deleted)
+
+    def test_run_step_threads(self):
+        running = []
+        max_running = []
+
+        def _delete(resource):
+            running.append(resource)
+            max_running.append(len(running))
+            eventlet.sleep(0.01)
+            running.remove(resource)
+            return True
+
+        self.engine.run_step([('groups', lambda: list(range(10)), _delete)])
+        self.assertLessEqual(max(max_running), 3)
+
+    def test_get_session(self):
+        session = cleanup_engine.get_session(threads=5)
+        adapter = session.get_adapter('https://1.1.1.1/api')
+        self.assertIs(adapter, session.get_adapter('http://1.1.1.1/api'))
+        self.assertEqual(5, adapter._pool_maxsize)
+
+
+class FakeVSMBackend(object):
+    """The NSX-V manager resources used by the cleanup tool"""
+
+    PAGE_SIZE = 2
+
+    # (uri prefix, collection, id attribute, deletion status code)
+    DELETE_URIS = [
+        ('/api/4.0/firewall/globalroot-0/config/layer3sections/',
+         'sections', 'id', 204),
+        ('/api/2.0/services/securitygroup/', 'security_groups', 'objectId',
+         200),
+        ('/api/4.0/services/spoofguard/policies/', 'spoofguard_policies',
+         'policyId', 204),
+        ('/api/4.0/edges/', 'edges', 'id', 204),
+        ('/api/2.0/vdn/virtualwires/', 'virtualwires', 'objectId', 200)]
+
+    def __init__(self):
+        self.sections = [{'id': '1001', 'name': 'SG Section: sg1'},
+                         {'id': '1002', 'name': 'Default Section Layer3'}]
+        self.security_groups = [
+            {'objectId': 'securitygroup-1', 'name': 'sg1'},
+            {'objectId': 'securitygroup-2',
+             'name': 'Activity Monitoring Data Collection'}]
+        self.spoofguard_policies = [
+            {'policyId': 'spoofguardpolicy-1', 'name': 'net1'},
+            {'policyId': 'spoofguardpolicy-2', 'name': 'Default Policy'}]
+        self.edges = [{'id': 'edge-%s' % i, 'name': 'router-%s' % i}
+                      for i in range(1, 6)]
+        self.virtualwires = [{'objectId': 'virtualwire-1', 'name': 'net1'}]
+        self.failing = set()
+        self.deleted = []
+
+    def _page(self, page_name, items, query):
+        start = int(query.get('startindex', ['0'])[0])
+        return {page_name: {
+            'pagingInfo': {'pageSize': self.PAGE_SIZE,
+                           'totalCount': len(items)},
+            'data': items[start:start + self.PAGE_SIZE]}}
+
+    def get(self, path, query):
+        if path == '/api/4.0/firewall/globalroot-0/config':
+            return 200, {'layer3Sections': {'layer3Sections': self.sections}}
+        if path == '/api/2.0/services/securitygroup/scope/globalroot-0':
+            return 200, self.security_groups
+        if path == '/api/4.0/services/spoofguard/policies/':
+            return 200, {'policies': self.spoofguard_policies}
+        if path == '/api/4.0/edges':
+            return 200, self._page('edgePage', self.edges, query)
+        if path == '/api/2.0/vdn/scopes':
+            return 200, {'allScopes': [{'objectId': 'vdnscope-1'}]}
+        if path == '/api/2.0/vdn/scopes/vdnscope-1/virtualwires':
+            return 200, self._page('dataPage', self.virtualwires, query)
+        return 404, None
+
+    def delete(self, path):
+        for prefix, collection, id_attr, status in self.DELETE_URIS:
+            if not path.startswith(prefix):
+                continue
+            resource_id = path[len(prefix):]
+            if resource_id in self.failing:
+                return 500
+            items = getattr(self, collection)
+            for item in items:
+                if item[id_attr] == resource_id:
+                    items.remove(item)
+                    self.deleted.append(resource_id)
+                    return status
+        return 404
+
+
+class FakeVSMHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def _send(self, status, body=None):
+        data = (jsonutils.dumps(body).encode('utf-8') if body is not None
+                else b'')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        self._send(*self.server.backend.get(url.path,
+                                            urlparse.parse_qs(url.query)))
+
+    def do_DELETE(self):
+        url = urlparse.urlparse(self.path)
+        self._send(self.server.backend.delete(url.path))
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeVSMServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class VSMClientCleanupTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(VSMClientCleanupTestCase, self).setUp()
+        self.backend = FakeVSMBackend()
+        server = FakeVSMServer(('127.0.0.1', 0), FakeVSMHandler)
+        server.backend = self.backend
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        nsxv_cleanup = imp.load_source(
+            'nsxv_cleanup', os.path.join(TOOLS_DIR, 'nsxv_cleanup.py'))
+        self.client = nsxv_cleanup.VSMClient(
+            '127.0.0.1:%s' % server.server_port, 'admin', 'default', '',
+            False, threads=3)
+        self.client.secure = False
+
+    def test_cleanup_all(self):
+        deleted = self.client.cleanup_all()
+
+        self.assertEqual(9, deleted)
+        # the default and system resources are kept
+        self.assertEqual(['1002'], [s['id'] for s in self.backend.sections])
+        self.assertEqual(['securitygroup-2'],
+                         [sg['objectId']
+                          for sg in self.backend.security_groups])
+        self.assertEqual(['spoofguardpolicy-2'],
+                         [p['policyId']
+                          for p in self.backend.spoofguard_policies])
+        self.assertEqual([], self.backend.edges)
+        self.assertEqual([], self.backend.virtualwires)
+        # the steps run in the dependency order
+        self.assertEqual('1001', self.backend.deleted[0])
+        self.assertEqual(set(['securitygroup-1', 'spoofguardpolicy-1']),
+                         set(self.backend.deleted[1:3]))
+        self.assertEqual(set('edge-%s' % i for i in range(1, 6)),
+                         set(self.backend.deleted[3:8]))
+        self.assertEqual('virtualwire-1', self.backend.deleted[8])
+
+    def test_cleanup_all_delete_failure(self):
+        self.backend.failing.add('edge-3')
+
+        deleted = self.client.cleanup_all()
+
+        self.assertEqual(8, deleted)
+        self.assertEqual(['edge-3'], [e['id'] for e in self.backend.edges])
+        self.assertEqual([], self.backend.virtualwires)